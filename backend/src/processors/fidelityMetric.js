@@ -39,7 +39,7 @@ class FidelityMetric {
           COUNT(sp.SpecimenID) as specimen_count
         FROM surveillance_sessions sv
         LEFT JOIN specimens sp ON sv.SessionID = sp.SessionID
-        WHERE strftime('%Y-%m', sv.SessionCollectionDate) = ?
+        WHERE sv.year_month = ?
         GROUP BY sv.SessionID
       `;
 
@@ -211,7 +211,7 @@ class FidelityMetric {
         SELECT DISTINCT sp.SessionCollectorName
         FROM specimens sp
         INNER JOIN surveillance_sessions sv ON sp.SessionID = sv.SessionID
-        WHERE strftime('%Y-%m', sv.SessionCollectionDate) = ?
+        WHERE sv.year_month = ?
           AND sp.SessionCollectorTitle = 'Village Health Team (VHT)'
           AND sp.SessionCollectorName IS NOT NULL 
           AND sp.SessionCollectorName != ''
@@ -229,7 +229,7 @@ class FidelityMetric {
         SELECT DISTINCT sp.SessionCollectorName
         FROM specimens sp
         INNER JOIN surveillance_sessions sv ON sp.SessionID = sv.SessionID
-        WHERE strftime('%Y-%m', sv.SessionCollectionDate) = ?
+        WHERE sv.year_month = ?
           AND sp.SessionCollectorTitle = 'Village Health Team (VHT)'
           AND sp.SessionCollectorName IS NOT NULL 
           AND sp.SessionCollectorName != ''
@@ -9,6 +9,15 @@ const Database = require('better-sqlite3');
 const path = require('path');
 const logger = require('../utils/logger');
 
+/**
+ * Epoch seconds (UTC) for a date filter; date-only strings are UTC midnight.
+ * Date filters compare against the loader's integer *Epoch columns, which
+ * are indexed, instead of the TEXT timestamps.
+ */
+function toEpochSeconds(value) {
+  return Math.floor(new Date(value).getTime() / 1000);
+}
+
 class DatabaseService {
   constructor() {
     const dbPath = path.join(__dirname, '../../data/vectorinsight.db');
@@ -26,12 +35,12 @@ class DatabaseService {
 
     // Date range filter
     if (filters.startDate) {
-      query += ' AND SessionCollectionDate >= ?';
-      params.push(filters.startDate);
+      query += ' AND SessionCollectionDateEpoch >= ?';
+      params.push(toEpochSeconds(filters.startDate));
     }
     if (filters.endDate) {
-      query += ' AND SessionCollectionDate <= ?';
-      params.push(filters.endDate);
+      query += ' AND SessionCollectionDateEpoch <= ?';
+      params.push(toEpochSeconds(filters.endDate));
     }
 
     // ✅ FIX: District filter - properly handle array
@@ -66,12 +75,12 @@ class DatabaseService {
 
     // Date range filter
     if (filters.startDate) {
-      query += ' AND sv.SessionCollectionDate >= ?';
-      params.push(filters.startDate);
+      query += ' AND sv.SessionCollectionDateEpoch >= ?';
+      params.push(toEpochSeconds(filters.startDate));
     }
     if (filters.endDate) {
-      query += ' AND sv.SessionCollectionDate <= ?';
-      params.push(filters.endDate);
+      query += ' AND sv.SessionCollectionDateEpoch <= ?';
+      params.push(toEpochSeconds(filters.endDate));
     }
 
     // ✅ FIX: District filter
@@ -0,0 +1,290 @@
+"""
+VectorInsight Benchmarks
+Times pipeline stages on synthetic data of increasing size
+
+Usage:
+    python benchmark.py report --sizes 100000 1000000 4000000
+    python benchmark.py db --sizes 10000 100000
+    python benchmark.py metrics --sizes 1000000 4000000
+"""
+import argparse
+import logging
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Add modules to path
+sys.path.append(str(Path(__file__).parent))
+
+import config
+from modules.report_builder import build_vectorcam_report
+from modules.database import VectorInsightDB
+from modules.bootstrap import density_intervals
+from modules.metrics_cache import MetricsCache
+from modules.metrics_calculator import MetricsCalculator, calculate_metrics
+from modules.schema import categorize, observed_counts
+from modules.species import SpeciesNormalizer
+
+
+SPECIES = [
+    'Anopheles gambiae', 'Anopheles funestus', 'Anopheles other', 'Culex',
+    'Aedes', 'Mansonia', 'Non-Mosquito', 'Unknown'
+]
+SEXES = ['Male', 'Female', 'N/A']
+ABDOMEN_STATUSES = ['Unfed', 'Fully Fed', 'Half Gravid', 'Gravid', 'N/A']
+DISTRICTS = ['Kanungu', 'Koboko', 'Mayuge', 'Namayingo', 'Busia']
+METHODS = ['Pyrethrum Spray Catch (PSC)', 'CDC Light Trap', 'Human Landing Catch (HLC)']
+
+
+def make_synthetic_data(n_specimens: int, specimens_per_session: int = 10, seed: int = 42):
+    """
+    Build surveillance/specimens frames shaped like the cleaned VectorCam exports
+
+    Args:
+        n_specimens: Number of specimen rows
+        specimens_per_session: Average specimens per house
+        seed: Random seed
+
+    Returns:
+        Tuple of (surveillance_df, specimens_df)
+    """
+    rng = np.random.default_rng(seed)
+    n_sessions = max(1, n_specimens // specimens_per_session)
+
+    session_ids = np.arange(1, n_sessions + 1)
+    collection_dates = (
+        pd.Timestamp('2024-01-01', tz='UTC')
+        + pd.to_timedelta(rng.integers(0, 730 * 24 * 3600, n_sessions), unit='s')
+    )
+    surveillance = pd.DataFrame({
+        'ID': session_ids,
+        'SessionID': session_ids,
+        'SessionCollectorName': rng.choice([f'Collector {i}' for i in range(200)], n_sessions),
+        'SessionCollectorTitle': 'Village Health Team (VHT)',
+        'SessionCollectionDate': collection_dates,
+        'SessionCollectionMethod': rng.choice(METHODS, n_sessions),
+        'SessionType': 'SURVEILLANCE',
+        'NumPeopleSleptInHouse': rng.integers(1, 10, n_sessions),
+        'WasIrsConducted': rng.choice(['Yes', 'No'], n_sessions),
+        'MonthsSinceIrs': rng.integers(0, 12, n_sessions).astype(float),
+        'NumLlinsAvailable': rng.integers(0, 5, n_sessions),
+        'LlinType': rng.choice(['Pyrethroid only', 'Pyrethroid + PBO', 'Unknown'], n_sessions),
+        'LlinBrand': rng.choice(['Royal Guard', 'PermaNet', 'Unknown'], n_sessions),
+        'NumPeopleSleptUnderLlin': rng.integers(0, 8, n_sessions).astype(float),
+        'SiteID': rng.integers(12, 80, n_sessions).astype(float),
+        'SiteDistrict': rng.choice(DISTRICTS, n_sessions),
+        'SiteHealthCenter': 'Health Centre III',
+        'SiteParish': rng.choice([f'Parish {i}' for i in range(40)], n_sessions),
+        'ProgramCountry': 'Uganda',
+    })
+
+    owner = rng.integers(0, n_sessions, n_specimens)
+    specimens = pd.DataFrame({
+        'SpecimenID': [f'S{i:08d}' for i in range(n_specimens)],
+        'ImageID': np.arange(1, n_specimens + 1),
+        'SessionID': session_ids[owner],
+        'Species': rng.choice(SPECIES, n_specimens),
+        'Sex': rng.choice(SEXES, n_specimens),
+        'AbdomenStatus': rng.choice(ABDOMEN_STATUSES, n_specimens),
+        'CapturedAt': collection_dates[owner],
+        'SessionCollectionMethod': surveillance['SessionCollectionMethod'].to_numpy()[owner],
+        'SiteDistrict': surveillance['SiteDistrict'].to_numpy()[owner],
+    })
+    return surveillance, specimens
+
+
+def _time(func, repeat: int = 3) -> float:
+    """Best wall time of `repeat` calls, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_report(sizes):
+    """Time build_vectorcam_report across specimen counts"""
+    print(f"{'specimens':>12} {'sessions':>10} {'seconds':>10} {'us/specimen':>12}")
+    for n in sizes:
+        surveillance, specimens = make_synthetic_data(n)
+        seconds = _time(lambda: build_vectorcam_report(surveillance, specimens))
+        print(f"{n:>12,} {len(surveillance):>10,} {seconds:>10.3f} {seconds / n * 1e6:>12.3f}")
+
+
+class PerCallDB(VectorInsightDB):
+    """VectorInsightDB without connection reuse: a new, untuned connection per call"""
+
+    def connect(self):
+        return sqlite3.connect(str(self.db_path))
+
+
+def _db_timings(db: VectorInsightDB, surveillance: pd.DataFrame, specimens: pd.DataFrame,
+                calls: int = 200) -> dict:
+    """Seconds per operation (best of 3) on a freshly loaded database"""
+    start = time.perf_counter()
+    db.create_tables()
+    db.insert_surveillance_data(surveillance)
+    db.insert_specimens_data(specimens)
+    timings = {'load': time.perf_counter() - start}
+
+    session_ids = surveillance['SessionID'].to_numpy()[:calls].tolist()
+    metric_rows = [(f'metric_{i}', float(i), None, 'bench') for i in range(40)]
+
+    def point_queries():
+        for session_id in session_ids:
+            db.query("SELECT COUNT(*) AS n FROM specimens WHERE SessionID = ?", (session_id,))
+
+    def watermark_reads():
+        for _ in range(calls):
+            db.get_watermark('surveillance')
+
+    def metric_writes():
+        for i in range(calls // 10):
+            db.insert_metrics(f'2025-{i % 12 + 1:02d}', metric_rows)
+
+    timings['query'] = _time(point_queries) / len(session_ids)
+    timings['watermark'] = _time(watermark_reads) / calls
+    timings['insert_metrics'] = _time(metric_writes) / (calls // 10)
+    timings['scan'] = _time(db.get_specimens_data)
+    db.close()
+    return timings
+
+
+def bench_db(sizes):
+    """Compare per-call connections with reused, PRAGMA-tuned ones"""
+    print(f"{'specimens':>12} {'operation':>15} {'per-call ms':>12} {'managed ms':>12} {'speedup':>8}")
+    for n in sizes:
+        surveillance, specimens = make_synthetic_data(n)
+        with tempfile.TemporaryDirectory() as tmp:
+            before = _db_timings(PerCallDB(Path(tmp) / 'per_call.db'), surveillance, specimens)
+            after = _db_timings(VectorInsightDB(Path(tmp) / 'managed.db'), surveillance, specimens)
+        for operation in before:
+            print(f"{n:>12,} {operation:>15} {before[operation] * 1e3:>12.3f} "
+                  f"{after[operation] * 1e3:>12.3f} {before[operation] / after[operation]:>7.1f}x")
+
+
+class RowScanMetricsCalculator(MetricsCalculator):
+    """MetricsCalculator without the shared count table: every specimen metric rescans the rows"""
+
+    def _anopheles_rows(self) -> pd.DataFrame:
+        return self.specimens[self.specimens['Species'].str.contains('Anopheles', na=False, case=False)]
+
+    def _specimen_label_counts(self, column, anopheles_only=False):
+        rows = self._anopheles_rows() if anopheles_only else self.specimens
+        return observed_counts(rows[column])
+
+    def _specimen_totals(self, column):
+        return self.specimens.groupby(column, observed=True).size()
+
+    def _fed_count(self, anopheles_only=False):
+        rows = self._anopheles_rows() if anopheles_only else self.specimens
+        return rows['IsFed'].sum()
+
+    def _specimen_crosstab(self, index, columns):
+        return self.specimens.groupby([index, columns], observed=True).size().unstack(fill_value=0).to_dict()
+
+
+def _cleaned(surveillance: pd.DataFrame, specimens: pd.DataFrame):
+    """Add the columns DataProcessor derives and categorize labels, as the pipeline passes them"""
+    collected = surveillance['SessionCollectionDate']
+    surveillance = surveillance.assign(
+        CollectionYear=collected.dt.year,
+        CollectionQuarter=collected.dt.quarter,
+        CollectionYearMonth=collected.dt.strftime('%Y-%m'),
+        LlinUsageRate=surveillance['NumPeopleSleptUnderLlin'] / surveillance['NumPeopleSleptInHouse'],
+        DataQualityFlag='OK',
+    )
+    specimens = specimens.assign(
+        CaptureYearMonth=specimens['CapturedAt'].dt.strftime('%Y-%m'),
+        SpeciesGroup=SpeciesNormalizer().groups(specimens['Species']),
+        IsFed=specimens['AbdomenStatus'].isin(['Fully Fed', 'Half Gravid', 'Gravid']),
+        IsUnfed=specimens['AbdomenStatus'] == 'Unfed',
+    )
+    return categorize(surveillance, 'surveillance'), categorize(specimens, 'specimens')
+
+
+def bench_metrics(sizes):
+    """Time calculate_all_metrics with the shared count table against rescanning rows per metric"""
+    print(f"{'specimens':>12} {'row scans s':>12} {'one pass s':>11} {'speedup':>8}")
+    for n in sizes:
+        surveillance, specimens = _cleaned(*make_synthetic_data(n))
+        before = _time(lambda: RowScanMetricsCalculator(surveillance, specimens).calculate_all_metrics())
+        after = _time(lambda: MetricsCalculator(surveillance, specimens).calculate_all_metrics())
+        print(f"{n:>12,} {before:>12.3f} {after:>11.3f} {before / after:>7.1f}x")
+
+
+def bench_metrics_cache(sizes):
+    """Time calculate_metrics uncached, on a cache miss and on a cache hit"""
+    print(f"{'specimens':>12} {'uncached s':>11} {'miss s':>8} {'hit s':>8} {'speedup':>8}")
+    for n in sizes:
+        surveillance, specimens = _cleaned(*make_synthetic_data(n))
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = MetricsCache(Path(tmp))
+            uncached = _time(lambda: calculate_metrics(surveillance, specimens, use_cache=False))
+            miss = _time(lambda: calculate_metrics(surveillance, specimens, cache=cache), repeat=1)
+            hit = _time(lambda: calculate_metrics(surveillance, specimens, cache=cache))
+        print(f"{n:>12,} {uncached:>11.3f} {miss:>8.3f} {hit:>8.3f} {uncached / hit:>7.1f}x")
+
+
+def _loop_density_intervals(mosquitoes, anopheles, districts, months, n_resamples: int = 1000):
+    """Bootstrap one group and one resample at a time, as a plain Python loop would"""
+    rng = np.random.default_rng(config.BOOTSTRAP_SEED)
+    groups = [mosquitoes, anopheles]
+    groups += [mosquitoes[(districts == d).to_numpy()] for d in districts.dropna().unique()]
+    groups += [mosquitoes[(months == m).to_numpy()] for m in months.dropna().unique()]
+    return [
+        np.quantile([rng.choice(values, len(values)).mean() for _ in range(n_resamples)], [0.025, 0.975])
+        for values in groups
+    ]
+
+
+def bench_bootstrap(sizes):
+    """Time the indoor density confidence intervals: per-group histograms against a per-resample loop"""
+    print(f"{'specimens':>12} {'PSC houses':>11} {'loop s':>8} {'batched s':>10} {'speedup':>8}")
+    for n in sizes:
+        surveillance, specimens = _cleaned(*make_synthetic_data(n))
+        psc = surveillance[surveillance['SessionCollectionMethod'].str.contains('PSC', na=False)]
+        mosquitoes = psc['SessionID'].map(specimens['SessionID'].value_counts()).fillna(0).to_numpy()
+        anopheles = psc['SessionID'].map(
+            specimens.loc[specimens['Species'].str.contains('Anopheles', na=False), 'SessionID'].value_counts()
+        ).fillna(0).to_numpy()
+        districts, months = psc['SiteDistrict'], psc['CollectionYearMonth']
+        loop = _time(lambda: _loop_density_intervals(mosquitoes, anopheles, districts, months), repeat=1)
+        batched = _time(lambda: density_intervals(mosquitoes, anopheles, districts, months))
+        print(f"{n:>12,} {len(psc):>11,} {loop:>8.3f} {batched:>10.3f} {loop / batched:>7.1f}x")
+
+
+BENCHMARKS = {
+    'report': bench_report,
+    'db': bench_db,
+    'metrics': bench_metrics,
+    'metrics_cache': bench_metrics_cache,
+    'bootstrap': bench_bootstrap,
+}
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='VectorInsight benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='Benchmark to run')
+    parser.add_argument(
+        '--sizes',
+        type=int,
+        nargs='+',
+        default=[10_000, 100_000, 1_000_000],
+        help='Specimen counts to benchmark'
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    BENCHMARKS[args.benchmark](args.sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -16,17 +16,66 @@ PROJECT_ROOT = Path(__file__).parent
 API_BASE_URL = os.getenv('API_BASE_URL', 'https://api.vectorcam.org')  # ✅ UPDATED to production
 API_KEY = os.getenv('API_SECRET_KEY') or os.getenv('VECTORCAM_API_KEY')
 
-# API Endpoints
-SURVEILLANCE_ENDPOINT = f"{API_BASE_URL}/sessions/export/surveillance-forms/csv?startDate=2025-12-01"
-SPECIMENS_ENDPOINT = f"{API_BASE_URL}/specimens/export/csv?startDate=2025-12-01"
+# API Endpoints (startDate is appended per run by the extractor)
+SURVEILLANCE_ENDPOINT = f"{API_BASE_URL}/sessions/export/surveillance-forms/csv"
+SPECIMENS_ENDPOINT = f"{API_BASE_URL}/specimens/export/csv"
+
+# Incremental Extraction
+EXTRACT_START_DATE = os.getenv('EXTRACT_START_DATE', '2025-12-01')  # first run / full refresh
+WATERMARK_OVERLAP_DAYS = int(os.getenv('WATERMARK_OVERLAP_DAYS', 14))  # minimum re-fetch window behind the watermark
+UPLOAD_LAG_QUANTILE = float(os.getenv('UPLOAD_LAG_QUANTILE', 0.99))  # window also covers this share of observed upload lags
+FULL_REFRESH_DAYS = int(os.getenv('FULL_REFRESH_DAYS', 7))  # re-download everything this often (0 = only with --full-refresh)
+
+# Backfill (date-window sharded download)
+BACKFILL_WINDOW = os.getenv('BACKFILL_WINDOW', 'month')  # 'week' or 'month'
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', 4))  # shards downloaded at once
+BACKFILL_SHARD_RETRIES = int(os.getenv('BACKFILL_SHARD_RETRIES', 2))  # extra rounds for failed shards
+
+# HTTP Client
+EXTRACT_CONCURRENT = os.getenv('EXTRACT_CONCURRENT', 'true').lower() == 'true'  # fetch endpoints in parallel
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 1.0))  # sleeps 1s, 2s, 4s, ...
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 8))
+
+# CSV Streaming
+CSV_CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', 50000))  # rows per parsed batch
+CSV_STREAM_CHUNK_BYTES = int(os.getenv('CSV_STREAM_CHUNK_BYTES', 1 << 20))  # bytes per HTTP read
 
 # Database Configuration - POINTS TO BACKEND
 DB_PATH = PROJECT_ROOT.parent / 'backend' / 'data' / 'vectorinsight.db'  # ✅ FIXED
 
+# SQLite Tuning (PRAGMAs applied to every VectorInsightDB connection)
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes of the file read via mmap
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))  # page cache per connection
+
 # Data Storage - ALL EXPORTS GO TO BACKEND
 EXPORTS_DIR = PROJECT_ROOT.parent / 'backend' / 'data' / 'exports'  # ✅ NEW
 RAW_DATA_DIR = PROJECT_ROOT / os.getenv('RAW_DATA_DIR', 'data/raw')
 LOGS_DIR = PROJECT_ROOT / os.getenv('LOGS_DIR', 'data/logs')
+SNAPSHOT_HISTORY = int(os.getenv('SNAPSHOT_HISTORY', 400))  # raw snapshots kept per data type for --as-of (0 = all)
+
+# Stage Cache (skip pipeline stages whose inputs are unchanged since the last run)
+STAGE_CACHE_ENABLED = os.getenv('STAGE_CACHE_ENABLED', 'true').lower() == 'true'
+STAGE_CACHE_DIR = PROJECT_ROOT / os.getenv('STAGE_CACHE_DIR', 'data/cache')
+
+# Metrics Cache (calculate_metrics results keyed by input content, least recently used evicted first)
+METRICS_CACHE_ENABLED = os.getenv('METRICS_CACHE_ENABLED', 'true').lower() == 'true'
+METRICS_CACHE_DIR = PROJECT_ROOT / os.getenv('METRICS_CACHE_DIR', 'data/cache/metrics')
+METRICS_CACHE_MAX_ENTRIES = int(os.getenv('METRICS_CACHE_MAX_ENTRIES', 256))
+METRICS_CACHE_MAX_MB = int(os.getenv('METRICS_CACHE_MAX_MB', 256))
+
+# Bootstrap confidence intervals (indoor resting density)
+BOOTSTRAP_RESAMPLES = int(os.getenv('BOOTSTRAP_RESAMPLES', 1000))
+BOOTSTRAP_CONFIDENCE = float(os.getenv('BOOTSTRAP_CONFIDENCE', 0.95))
+BOOTSTRAP_SEED = int(os.getenv('BOOTSTRAP_SEED', 42))
+
+# Stage Scheduling (DB writes, exports and metrics after cleaning run in parallel)
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', 4))
+
+# Run Profiling (per-stage JSON run report in LOGS_DIR)
+PROFILE_TRACEMALLOC = os.getenv('PROFILE_TRACEMALLOC', 'false').lower() == 'true'  # per-stage allocation peaks (slows runs several-fold)
+PROFILE_CPROFILE = os.getenv('PROFILE_CPROFILE', 'false').lower() == 'true'  # same as --profile
+PROFILE_RSS_INTERVAL_S = float(os.getenv('PROFILE_RSS_INTERVAL_S', 0.05))  # per-stage RSS peak sampling (0 = start/end only)
 
 # Dashboard Configuration
 DASHBOARD_TITLE = os.getenv('DASHBOARD_TITLE', 'VectorInsight Dashboard')
@@ -15,7 +15,9 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 import config
 from modules.database import VectorInsightDB
+from modules.metrics_cube import MetricsCube
 from modules.user_tracking import UserTracker
+from modules.schema import categorize, observed_counts
 
 
 # Page configuration
@@ -54,48 +56,51 @@ st.markdown("""
 
 @st.cache_resource
 def load_database():
-    """Load database connection"""
-    return VectorInsightDB()
+    """Load database connection (read-only: the dashboard never writes)"""
+    return VectorInsightDB(read_only=True)
 
 
 @st.cache_data(ttl=3600)
 def load_data():
-    """Load data from database with caching"""
+    """
+    Load the rows and the metrics cube with caching
+    
+    Both come from one read, cached and expired together, so the key
+    metrics (summed from the cube) and the charts (counted from the rows)
+    always show the same pipeline run.
+    """
     db = load_database()
     
+    cube = MetricsCube.from_database(db)
     surveillance = db.get_surveillance_data()
     specimens = db.get_specimens_data()
     metrics = db.get_metrics()
     
-    # Convert date columns to datetime
-    date_columns = ['SessionCollectionDate', 'SessionCreatedAt', 'SessionCompletedAt', 
-                    'SessionSubmittedAt', 'SessionUpdatedAt', 'CreatedAt', 'UpdatedAt']
-    for col in date_columns:
-        if col in surveillance.columns:
-            surveillance[col] = pd.to_datetime(surveillance[col], errors='coerce', utc=True).dt.tz_localize(None)
-    
-    date_columns_spec = ['CapturedAt', 'ImageSubmittedAt', 'ImageUpdatedAt',
-                         'SessionCollectionDate', 'SessionCreatedAt', 'SessionCompletedAt',
-                         'SessionSubmittedAt', 'SessionUpdatedAt']
-    for col in date_columns_spec:
-        if col in specimens.columns:
-            specimens[col] = pd.to_datetime(specimens[col], errors='coerce', utc=True).dt.tz_localize(None)
-    
-    return surveillance, specimens, metrics
+    # Timestamps come back parsed as UTC; the filters compare naive dates
+    for df in (surveillance, specimens):
+        for col in df.select_dtypes('datetimetz').columns:
+            df[col] = df[col].dt.tz_localize(None)
+    
+    # Low-cardinality labels as categoricals: less memory, faster filters and counts
+    surveillance = categorize(surveillance, 'surveillance')
+    specimens = categorize(specimens, 'specimens')
+    
+    return surveillance, specimens, metrics, cube
 
 
 def apply_filters(surveillance_df, specimens_df, date_range, districts, methods, species_list):
     """Apply user-selected filters to data"""
-    # Date filtering
+    # Date filtering (the end date is included in full, as in the metrics cube)
     if date_range:
         start_date, end_date = date_range
+        end_exclusive = pd.Timestamp(end_date) + pd.Timedelta(days=1)
         surveillance_df = surveillance_df[
             (surveillance_df['SessionCollectionDate'] >= pd.Timestamp(start_date)) &
-            (surveillance_df['SessionCollectionDate'] <= pd.Timestamp(end_date))
+            (surveillance_df['SessionCollectionDate'] < end_exclusive)
         ]
         specimens_df = specimens_df[
             (specimens_df['CapturedAt'] >= pd.Timestamp(start_date)) &
-            (specimens_df['CapturedAt'] <= pd.Timestamp(end_date))
+            (specimens_df['CapturedAt'] < end_exclusive)
         ]
     
     # District filtering
@@ -125,7 +130,7 @@ def main():
     
     # Load data
     try:
-        surveillance_df, specimens_df, metrics_df = load_data()
+        surveillance_df, specimens_df, metrics_df, cube = load_data()
         
         if surveillance_df.empty or specimens_df.empty:
             st.error("⚠️ No data available. Please run the pipeline first: `python pipeline.py`")
@@ -246,30 +251,40 @@ def main():
     else:
         st.sidebar.warning("⚠️ No report found. Run pipeline first: `python pipeline.py`")
     
-    st.sidebar.info(f"💾 Showing {len(filtered_surveillance)} collections & {len(filtered_specimens)} specimens")
+    # Metrics for the filters, summed from the metrics cube
+    live_metrics = cube.metrics(
+        start_date=date_range[0] if date_range else None,
+        end_date=date_range[1] if date_range else None,
+        districts=None if 'All' in selected_districts else selected_districts,
+        methods=None if 'All' in selected_methods else selected_methods,
+        species=None if 'All' in selected_species else selected_species,
+    )
+    live_summary = live_metrics['summary']
+    
+    st.sidebar.info(
+        f"💾 Showing {live_summary['total_collections']:,} collections & "
+        f"{live_summary['total_specimens']:,} specimens"
+    )
     
-    # Summary metrics row
     st.header("📊 Key Metrics Overview")
     col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         st.metric(
             "Total Collections",
-            f"{len(filtered_surveillance):,}",
+            f"{live_summary['total_collections']:,}",
             delta=None
         )
     
     with col2:
         st.metric(
             "Total Number of Images",
-            f"{len(filtered_specimens):,}",
+            f"{live_summary['total_specimens']:,}",
             delta=None
         )
     
     with col3:
-        anopheles_count = len(filtered_specimens[
-            filtered_specimens['Species'].str.contains('Anopheles', na=False, case=False)
-        ]) if 'Species' in filtered_specimens.columns else 0
+        anopheles_count = live_metrics['species']['total_anopheles']
         st.metric(
             "Anopheles Collected",
             f"{anopheles_count:,}",
@@ -277,7 +292,7 @@ def main():
         )
     
     with col4:
-        unique_sites = filtered_surveillance['SiteDistrict'].nunique() if 'SiteDistrict' in filtered_surveillance.columns else 0
+        unique_sites = live_summary['unique_sites']
         st.metric(
             "Unique Sites",
             f"{unique_sites}",
@@ -285,7 +300,9 @@ def main():
         )
     
     with col5:
-        avg_per_collection = len(filtered_specimens) / len(filtered_surveillance) if len(filtered_surveillance) > 0 else 0
+        avg_per_collection = (
+            live_summary['total_specimens'] / live_summary['total_collections']
+        ) if live_summary['total_collections'] > 0 else 0
         st.metric(
             "Avg Specimens/Collection",
             f"{avg_per_collection:.1f}",
@@ -352,7 +369,7 @@ def main():
                 ~filtered_specimens['Species'].str.contains('Unknown', na=False, case=False)
             ]
             
-            species_counts = known_specimens['Species'].value_counts().reset_index()
+            species_counts = observed_counts(known_specimens['Species']).reset_index()
             species_counts.columns = ['Species', 'Count']
             
             col1, col2 = st.columns(2)
@@ -388,7 +405,7 @@ def main():
             ]
             
             if len(anopheles_df) > 0:
-                anopheles_counts = anopheles_df['Species'].value_counts().reset_index()
+                anopheles_counts = observed_counts(anopheles_df['Species']).reset_index()
                 anopheles_counts.columns = ['Species', 'Count']
                 
                 fig3 = px.bar(
@@ -410,13 +427,13 @@ def main():
                 temporal_col = 'CaptureYearMonth' if 'CaptureYearMonth' in known_specimens.columns else 'CaptureYear'
                 
                 # Get top 5 species by total count (excluding Unknown)
-                top_species = known_specimens['Species'].value_counts().head(5).index.tolist()
+                top_species = observed_counts(known_specimens['Species']).head(5).index.tolist()
                 
                 # Filter for top species
                 top_species_data = known_specimens[known_specimens['Species'].isin(top_species)]
                 
                 # Group by time period and species
-                species_temporal = top_species_data.groupby([temporal_col, 'Species']).size().reset_index(name='Count')
+                species_temporal = top_species_data.groupby([temporal_col, 'Species'], observed=True).size().reset_index(name='Count')
                 species_temporal = species_temporal.sort_values(temporal_col)
                 
                 # Create line chart
@@ -462,42 +479,28 @@ def main():
     with tab3:
         st.header("Indoor Resting Density (PSC Collections)")
         
-        # Filter for PSC collections
-        psc_surveillance = filtered_surveillance[
-            filtered_surveillance['SessionCollectionMethod'].str.contains('PSC', na=False, case=False)
-        ]
+        # Specimens of each PSC session counted in the session's month, as in the pipeline metrics
+        density = live_metrics['indoor_density']
         
-        if len(psc_surveillance) > 0:
-            # Count specimens per session
-            psc_sessions = psc_surveillance['SessionID'].unique()
-            psc_specimens = filtered_specimens[filtered_specimens['SessionID'].isin(psc_sessions)]
-            
-            specimens_per_session = psc_specimens.groupby('SessionID').size().reset_index(name='mosquito_count')
-            psc_with_counts = psc_surveillance.merge(specimens_per_session, on='SessionID', how='left')
-            psc_with_counts['mosquito_count'] = psc_with_counts['mosquito_count'].fillna(0)
-            
-            avg_density = psc_with_counts['mosquito_count'].mean()
-            
+        if density['total_psc_collections'] > 0:
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("Average Mosquitoes per House", f"{avg_density:.2f}")
+                st.metric("Average Mosquitoes per House", f"{density['avg_mosquitoes_per_house']:.2f}")
             
             with col2:
-                anopheles_psc = psc_specimens[
-                    psc_specimens['Species'].str.contains('Anopheles', na=False, case=False)
-                ]
-                anopheles_per_session = anopheles_psc.groupby('SessionID').size().mean()
-                st.metric("Average Anopheles per House", f"{anopheles_per_session:.2f}")
+                st.metric("Average Anopheles per House", f"{density['avg_anopheles_per_house']:.2f}")
             
             with col3:
-                st.metric("PSC Collections", f"{len(psc_surveillance)}")
+                st.metric("PSC Collections", f"{density['total_psc_collections']}")
             
             # Density over time
-            if 'CollectionYearMonth' in psc_with_counts.columns:
+            if density['density_by_month']:
                 st.subheader("Indoor Density Trends")
-                density_by_month = psc_with_counts.groupby('CollectionYearMonth')['mosquito_count'].mean().reset_index()
-                density_by_month = density_by_month.sort_values('CollectionYearMonth')
+                density_by_month = pd.DataFrame({
+                    'CollectionYearMonth': list(density['density_by_month']),
+                    'mosquito_count': list(density['density_by_month'].values()),
+                }).sort_values('CollectionYearMonth')
                 
                 fig = px.line(
                     density_by_month,
@@ -520,7 +523,7 @@ def main():
         with col1:
             st.subheader("IRS Coverage")
             if 'WasIrsConducted' in filtered_surveillance.columns:
-                irs_data = filtered_surveillance['WasIrsConducted'].value_counts().reset_index()
+                irs_data = observed_counts(filtered_surveillance['WasIrsConducted']).reset_index()
                 irs_data.columns = ['IRS Status', 'Count']
                 
                 fig = px.pie(
@@ -555,9 +558,9 @@ def main():
         # LLIN Types
         st.subheader("LLIN Types Used")
         if 'LlinType' in filtered_surveillance.columns:
-            llin_types = filtered_surveillance[
+            llin_types = observed_counts(filtered_surveillance[
                 filtered_surveillance['LlinType'] != 'Unknown'
-            ]['LlinType'].value_counts().reset_index()
+            ]['LlinType']).reset_index()
             llin_types.columns = ['LLIN Type', 'Count']
             
             fig3 = px.bar(
@@ -576,7 +579,7 @@ def main():
         st.header("Collection Methods Analysis")
         
         if 'SessionCollectionMethod' in filtered_surveillance.columns:
-            method_counts = filtered_surveillance['SessionCollectionMethod'].value_counts().reset_index()
+            method_counts = observed_counts(filtered_surveillance['SessionCollectionMethod']).reset_index()
             method_counts.columns = ['Method', 'Count']
             
             col1, col2 = st.columns(2)
@@ -594,7 +597,7 @@ def main():
             with col2:
                 # Specimens per collection by method
                 if 'SessionCollectionMethod' in filtered_specimens.columns:
-                    specimens_by_method = filtered_specimens['SessionCollectionMethod'].value_counts().reset_index()
+                    specimens_by_method = observed_counts(filtered_specimens['SessionCollectionMethod']).reset_index()
                     specimens_by_method.columns = ['Method', 'Specimens']
                     
                     method_summary = method_counts.merge(specimens_by_method, on='Method', how='left')
@@ -622,7 +625,7 @@ def main():
             
             with col1:
                 st.subheader("Collections by District")
-                district_counts = filtered_surveillance['SiteDistrict'].value_counts().reset_index()
+                district_counts = observed_counts(filtered_surveillance['SiteDistrict']).reset_index()
                 district_counts.columns = ['District', 'Collections']
                 
                 fig = px.bar(
@@ -641,7 +644,7 @@ def main():
             with col2:
                 st.subheader("Specimens by District")
                 if 'SiteDistrict' in filtered_specimens.columns:
-                    district_specimens = filtered_specimens['SiteDistrict'].value_counts().reset_index()
+                    district_specimens = observed_counts(filtered_specimens['SiteDistrict']).reset_index()
                     district_specimens.columns = ['District', 'Specimens']
                     
                     fig2 = px.bar(
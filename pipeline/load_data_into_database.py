@@ -4,7 +4,8 @@ Loads CSV exports into SQLite database
 """
 from pathlib import Path
 import sqlite3
-import pandas as pd
+
+from modules.schema import read_vectorcam_csv
 
 # ✅ FIXED: Use correct paths relative to pipeline directory
 BASE_DIR = Path(__file__).resolve().parent
@@ -69,8 +70,8 @@ def load_data_to_database():
 
     # Read CSVs
     print("\n📖 Reading CSV files...")
-    surv_df = pd.read_csv(surv_csv)
-    spec_df = pd.read_csv(spec_csv)
+    surv_df = read_vectorcam_csv(surv_csv, 'surveillance')
+    spec_df = read_vectorcam_csv(spec_csv, 'specimens')
     print(f"✓ Surveillance records: {len(surv_df)}")
     print(f"✓ Specimens records: {len(spec_df)}")
 
@@ -0,0 +1,290 @@
+"""
+Aggregates Module
+Pre-aggregated count tables, refreshed incrementally from the data tables
+"""
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+# Count tables read by the dashboard and API instead of the raw rows.
+# Definitions follow MetricsCalculator: Anopheles is any species containing
+# 'anopheles' (case-insensitive), fed is Fully Fed / Half Gravid / Gravid.
+FED_STATUSES = ('Fully Fed', 'Half Gravid', 'Gravid')
+
+# Month key of rows without a date (see DIRTY_KEYS['monthly_metrics'])
+UNDATED_MONTH = 'undated'
+
+AGGREGATE_DDL = {
+    # Specimens per capture day and label combination
+    'daily_counts': """
+        CREATE TABLE IF NOT EXISTS daily_counts (
+            date TEXT,
+            year_month TEXT,
+            district TEXT,
+            method TEXT,
+            species TEXT,
+            sex TEXT,
+            abdomen_status TEXT,
+            n INTEGER NOT NULL
+        )
+    """,
+    # One row per collection session (house visit), with its IRS / LLIN
+    # answers and specimen counts
+    'session_counts': """
+        CREATE TABLE IF NOT EXISTS session_counts (
+            session_id INTEGER PRIMARY KEY,
+            date TEXT,
+            year_month TEXT,
+            district TEXT,
+            method TEXT,
+            irs TEXT,
+            llins INTEGER,
+            llin_usage REAL,
+            total INTEGER NOT NULL,
+            anopheles INTEGER NOT NULL,
+            female INTEGER NOT NULL,
+            fed INTEGER NOT NULL,
+            unfed INTEGER NOT NULL
+        )
+    """,
+    # Specimens per session, capture day and species: with session_counts,
+    # a session's specimens can be credited to its collection day
+    'session_species_counts': """
+        CREATE TABLE IF NOT EXISTS session_species_counts (
+            session_id INTEGER,
+            date TEXT,
+            species TEXT,
+            n INTEGER NOT NULL
+        )
+    """,
+}
+
+AGGREGATE_INDEXES = {
+    'daily_counts': [
+        ('idx_daily_counts_date', ('date',)),
+        ('idx_daily_counts_month', ('year_month', 'district', 'method')),
+    ],
+    'session_counts': [
+        ('idx_session_counts_month', ('year_month', 'district', 'method')),
+    ],
+    'session_species_counts': [
+        ('idx_session_species_counts_session', ('session_id',)),
+    ],
+}
+
+# Columns each aggregate can be grouped and filtered by
+AGGREGATE_DIMENSIONS = {
+    'daily_counts': ('date', 'year_month', 'district', 'method', 'species', 'sex', 'abdomen_status'),
+    'session_counts': ('date', 'year_month', 'district', 'method', 'irs'),
+}
+
+# Group of each aggregate that a source row belongs to, as an SQL expression
+# over the source table aliased {t}. When a row is inserted, changed or
+# deleted, its groups (before and after) are queued for refresh. Daily groups
+# are capture days; '' stands for specimens without a capture date.
+# monthly_metrics groups are data months; they are not rebuilt by
+# refresh_aggregates() but by the pipeline's metric_partitions stage. A
+# source may list several keys: a specimen belongs to its capture month and,
+# through indoor resting density, to its session's collection month.
+DIRTY_KEYS = {
+    'daily_counts': {
+        'specimens': "COALESCE(date({t}.CapturedAtEpoch, 'unixepoch'), '')",
+    },
+    'session_counts': {
+        'surveillance_sessions': "{t}.SessionID",
+        'specimens': "{t}.SessionID",
+    },
+    'session_species_counts': {
+        'specimens': "{t}.SessionID",
+    },
+    'monthly_metrics': {
+        'surveillance_sessions': f"COALESCE({{t}}.year_month, '{UNDATED_MONTH}')",
+        'specimens': (
+            f"COALESCE({{t}}.year_month, '{UNDATED_MONTH}')",
+            f"(SELECT COALESCE(s.year_month, '{UNDATED_MONTH}') FROM surveillance_sessions s "
+            f"WHERE s.SessionID = {{t}}.SessionID)",
+        ),
+    },
+}
+
+# Groups waiting for refresh_aggregates(); kept in the database so a failed
+# refresh is retried on the next run
+DIRTY_DDL = """
+    CREATE TABLE IF NOT EXISTS aggregate_dirty (
+        aggregate TEXT NOT NULL,
+        group_key NOT NULL,
+        PRIMARY KEY (aggregate, group_key)
+    )
+"""
+
+_DIRTY = "SELECT group_key FROM aggregate_dirty WHERE aggregate = '{aggregate}'"
+_DIRTY_UNDATED = "EXISTS (SELECT 1 FROM aggregate_dirty WHERE aggregate = 'daily_counts' AND group_key = '')"
+
+# Statements rebuilding the queued groups of each aggregate
+REFRESH_SQL = {
+    'daily_counts': [
+        f"DELETE FROM daily_counts WHERE date IN ({_DIRTY.format(aggregate='daily_counts')})",
+        f"DELETE FROM daily_counts WHERE date IS NULL AND {_DIRTY_UNDATED}",
+        # Each queued day is an index range scan on CapturedAtEpoch
+        """
+        INSERT INTO daily_counts (date, year_month, district, method, species, sex, abdomen_status, n)
+        SELECT
+            date(sp.CapturedAtEpoch, 'unixepoch'), sp.year_month, sp.SiteDistrict,
+            sp.SessionCollectionMethod, sp.Species, sp.Sex, sp.AbdomenStatus, COUNT(*)
+        FROM aggregate_dirty d
+        JOIN specimens sp
+            ON sp.CapturedAtEpoch >= CAST(strftime('%s', d.group_key) AS INTEGER)
+            AND sp.CapturedAtEpoch < CAST(strftime('%s', d.group_key) AS INTEGER) + 86400
+        WHERE d.aggregate = 'daily_counts' AND d.group_key != ''
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+        """,
+        f"""
+        INSERT INTO daily_counts (date, year_month, district, method, species, sex, abdomen_status, n)
+        SELECT
+            NULL, NULL, sp.SiteDistrict, sp.SessionCollectionMethod,
+            sp.Species, sp.Sex, sp.AbdomenStatus, COUNT(*)
+        FROM specimens sp
+        WHERE sp.CapturedAtEpoch IS NULL AND {_DIRTY_UNDATED}
+        GROUP BY 3, 4, 5, 6, 7
+        """,
+    ],
+    'session_counts': [
+        f"DELETE FROM session_counts WHERE session_id IN ({_DIRTY.format(aggregate='session_counts')})",
+        f"""
+        INSERT INTO session_counts
+            (session_id, date, year_month, district, method, irs, llins, llin_usage,
+             total, anopheles, female, fed, unfed)
+        SELECT
+            sv.SessionID, date(sv.SessionCollectionDateEpoch, 'unixepoch'), sv.year_month,
+            sv.SiteDistrict, sv.SessionCollectionMethod,
+            sv.WasIrsConducted, sv.NumLlinsAvailable, sv.LlinUsageRate,
+            COUNT(sp.SessionID),
+            COUNT(CASE WHEN sp.Species LIKE '%anopheles%' THEN 1 END),
+            COUNT(CASE WHEN sp.Sex = 'Female' THEN 1 END),
+            COUNT(CASE WHEN sp.AbdomenStatus IN {FED_STATUSES!r} THEN 1 END),
+            COUNT(CASE WHEN sp.AbdomenStatus = 'Unfed' THEN 1 END)
+        FROM surveillance_sessions sv
+        LEFT JOIN specimens sp ON sp.SessionID = sv.SessionID
+        WHERE sv.SessionID IN ({_DIRTY.format(aggregate='session_counts')})
+        GROUP BY sv.SessionID
+        """,
+    ],
+    'session_species_counts': [
+        f"DELETE FROM session_species_counts WHERE session_id IN ({_DIRTY.format(aggregate='session_species_counts')})",
+        f"""
+        INSERT INTO session_species_counts (session_id, date, species, n)
+        SELECT sp.SessionID, date(sp.CapturedAtEpoch, 'unixepoch'), sp.Species, COUNT(*)
+        FROM specimens sp
+        WHERE sp.SessionID IN ({_DIRTY.format(aggregate='session_species_counts')})
+        GROUP BY 1, 2, 3
+        """,
+    ],
+}
+
+
+def _table_names(cursor) -> set:
+    """Tables in the main database"""
+    return {row[0] for row in cursor.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+
+
+def _table_columns(cursor, table: str) -> list:
+    """Column names of a table, in order"""
+    return [row[1] for row in cursor.execute(f"PRAGMA main.table_info({table})")]
+
+
+def _ddl_columns(ddl: str) -> list:
+    """Column names declared by a CREATE TABLE statement, in order"""
+    body = ddl[ddl.index('(') + 1:ddl.rindex(')')]
+    return [line.split()[0] for line in body.splitlines() if line.strip()]
+
+
+def _keys(keys) -> tuple:
+    """DIRTY_KEYS entry as a tuple of key expressions"""
+    return (keys,) if isinstance(keys, str) else tuple(keys)
+
+
+def mark_touched(cursor, table: str, source: str, where: str = '1'):
+    """
+    Queue the aggregate groups of some source rows for refresh
+
+    Args:
+        cursor: Cursor inside the loading transaction
+        table: Source table name ('surveillance_sessions' or 'specimens')
+        source: FROM clause selecting the rows, with the source table aliased t
+        where: Optional condition on the rows
+    """
+    for aggregate, sources in DIRTY_KEYS.items():
+        if table not in sources:
+            continue
+        for key in _keys(sources[table]):
+            key = key.format(t='t')
+            cursor.execute(
+                f"INSERT OR IGNORE INTO aggregate_dirty (aggregate, group_key) "
+                f"SELECT DISTINCT ?, {key} FROM {source} WHERE ({where}) AND {key} IS NOT NULL",
+                (aggregate,)
+            )
+
+
+def ensure_aggregates(cursor):
+    """
+    Create the aggregate tables if missing
+
+    A newly created aggregate is queued in full, so databases loaded before
+    it existed are aggregated on the next refresh. An aggregate whose columns
+    differ from its DDL (written by an older version) is dropped and rebuilt
+    the same way.
+
+    Args:
+        cursor: Cursor on an open connection
+    """
+    existing = _table_names(cursor)
+    cursor.execute(DIRTY_DDL)
+    for aggregate, ddl in AGGREGATE_DDL.items():
+        if aggregate in existing and _table_columns(cursor, aggregate) != _ddl_columns(ddl):
+            logger.info(f"Rebuilding {aggregate}: its columns changed")
+            cursor.execute(f"DROP TABLE {aggregate}")
+            cursor.execute("DELETE FROM aggregate_dirty WHERE aggregate = ?", (aggregate,))
+            existing.discard(aggregate)
+        cursor.execute(ddl)
+        for index_name, columns in AGGREGATE_INDEXES[aggregate]:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {aggregate}({', '.join(columns)})")
+        if aggregate in existing:
+            continue
+        for table, keys in DIRTY_KEYS[aggregate].items():
+            if table not in existing:
+                continue
+            for key in _keys(keys):
+                cursor.execute(
+                    f"INSERT OR IGNORE INTO aggregate_dirty (aggregate, group_key) "
+                    f"SELECT DISTINCT ?, {key.format(t='t')} FROM main.{table} AS t "
+                    f"WHERE {key.format(t='t')} IS NOT NULL",
+                    (aggregate,)
+                )
+
+
+def refresh_aggregates(cursor) -> Dict[str, int]:
+    """
+    Rebuild the queued groups of every aggregate and clear the queue
+
+    Only the queued days and sessions are read from the data tables, so a
+    load touching a few days costs a few index range scans.
+
+    Args:
+        cursor: Cursor inside a transaction (both data tables must exist)
+
+    Returns:
+        Groups refreshed per aggregate table
+    """
+    refreshed = {}
+    for aggregate, statements in REFRESH_SQL.items():
+        queued = cursor.execute(
+            "SELECT COUNT(*) FROM aggregate_dirty WHERE aggregate = ?", (aggregate,)
+        ).fetchone()[0]
+        if queued:
+            for sql in statements:
+                cursor.execute(sql)
+            cursor.execute("DELETE FROM aggregate_dirty WHERE aggregate = ?", (aggregate,))
+        refreshed[aggregate] = queued
+    return refreshed
@@ -0,0 +1,153 @@
+"""
+Bootstrap Module
+Seeded bootstrap confidence intervals for group means, one substream per group
+"""
+import logging
+import zlib
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# Draws held in memory at once (resamples x rows, or resamples x distinct
+# values, per batch)
+MAX_BATCH_CELLS = 4_000_000
+
+
+def group_rng(key: str, seed: Optional[int] = None) -> np.random.Generator:
+    """
+    Generator of one group's own substream
+
+    The substream is spawned from the seed and keyed by the group's label,
+    so a group draws the same numbers whichever other groups exist.
+
+    Args:
+        key: Group label (e.g. 'density_by_district:Kampala')
+        seed: Root seed. If None, uses config.BOOTSTRAP_SEED
+    """
+    seed = config.BOOTSTRAP_SEED if seed is None else seed
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(zlib.crc32(key.encode()),)))
+
+
+def bootstrap_mean_ci(values: np.ndarray, counts: np.ndarray, key: str,
+                      n_resamples: Optional[int] = None, confidence: Optional[float] = None,
+                      seed: Optional[int] = None) -> Tuple[float, float]:
+    """
+    Percentile bootstrap interval for the mean of one group
+
+    The group is given as a histogram: each distinct value and how many
+    rows hold it. A resample redraws that many rows with replacement:
+
+    - With few distinct values (counts per house), a resample is how often
+      each distinct value is drawn, one multinomial draw: the cost is
+      resamples x distinct values, however many rows there are.
+    - Otherwise, rows are resampled by index from the expanded histogram:
+      resamples x rows.
+
+    Both draw from the same bootstrap distribution. Which one runs and what
+    it draws depend only on the group's histogram, its key and the seed, so
+    adding or changing another group leaves this interval unchanged.
+
+    Args:
+        values: Distinct values, ascending
+        counts: Rows holding each value
+        key: Group label, selecting the group's generator substream
+        n_resamples: Resamples. If None, uses config.BOOTSTRAP_RESAMPLES
+        confidence: Interval coverage. If None, uses config.BOOTSTRAP_CONFIDENCE
+        seed: Root seed. If None, uses config.BOOTSTRAP_SEED
+
+    Returns:
+        (low, high); NaN for a group without rows
+    """
+    n_resamples = n_resamples or config.BOOTSTRAP_RESAMPLES
+    confidence = confidence or config.BOOTSTRAP_CONFIDENCE
+
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+    size = int(counts.sum())
+    if size == 0:
+        return float('nan'), float('nan')
+
+    rng = group_rng(key, seed)
+    means = np.empty(n_resamples)
+    if len(values) <= size // 2:
+        pvals = counts / size
+        batch = max(1, MAX_BATCH_CELLS // len(values))
+        for first in range(0, n_resamples, batch):
+            count = min(batch, n_resamples - first)
+            means[first:first + count] = rng.multinomial(size, pvals, size=count) @ values / size
+    else:
+        rows = np.repeat(values, counts)
+        batch = max(1, MAX_BATCH_CELLS // size)
+        for first in range(0, n_resamples, batch):
+            count = min(batch, n_resamples - first)
+            means[first:first + count] = rows[rng.integers(0, size, size=(count, size))].mean(axis=1)
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+def _interval(values: pd.Series, key: str) -> Dict[str, float]:
+    """JSON-ready interval of one group, from its rows counted per value (values.index)"""
+    low, high = bootstrap_mean_ci(values.index.to_numpy(), values.to_numpy(), key)
+    return {'low': low, 'high': high}
+
+
+def density_intervals(mosquitoes: np.ndarray, anopheles: np.ndarray,
+                      districts: pd.Series, months: pd.Series,
+                      weights: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Confidence intervals for the indoor resting density metrics
+
+    Every group (overall, Anopheles, each district, each month) is reduced
+    to its histogram of per-house counts and bootstrapped on its own
+    substream keyed by the metric and label, so equal houses give equal
+    intervals however the houses are ordered, split into rows or grouped
+    with other districts and months.
+
+    Args:
+        mosquitoes: Mosquitoes per PSC house
+        anopheles: Anopheles per PSC house
+        districts: District of each house (missing: left out of the district intervals)
+        months: Collection month of each house (missing: left out of the month intervals)
+        weights: Houses each row stands for (for rows that are already
+            counted, e.g. stored histograms). If None, each row is one house
+
+    Returns:
+        Intervals ({'low', 'high'}) keyed like calculate_indoor_resting_density()
+        output with a '_ci' suffix
+    """
+    houses = pd.DataFrame({
+        'mosquitoes': np.asarray(mosquitoes, dtype=np.float64),
+        'anopheles': np.asarray(anopheles, dtype=np.float64),
+        'district': pd.Series(districts).astype(object).to_numpy(),
+        'month': pd.Series(months).astype(object).to_numpy(),
+        'n': 1 if weights is None else np.asarray(weights, dtype=np.int64),
+    })
+
+    def histograms(by: str) -> Dict[Any, pd.Series]:
+        counts = houses.groupby([by, 'mosquitoes'])['n'].sum()
+        return {label: counts.xs(label, level=by) for label in counts.index.unique(level=by)}
+
+    return {
+        'avg_mosquitoes_per_house_ci': _interval(
+            houses.groupby('mosquitoes')['n'].sum(), 'avg_mosquitoes_per_house'
+        ),
+        'avg_anopheles_per_house_ci': _interval(
+            houses.groupby('anopheles')['n'].sum(), 'avg_anopheles_per_house'
+        ),
+        'density_by_district_ci': {
+            district: _interval(counts, f'density_by_district:{district}')
+            for district, counts in sorted(histograms('district').items())
+        },
+        'density_by_month_ci': {
+            month: _interval(counts, f'density_by_month:{month}')
+            for month, counts in sorted(histograms('month').items())
+        },
+    }
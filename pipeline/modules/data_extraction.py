@@ -2,14 +2,25 @@
 Data Extraction Module
 Handles API calls to VectorCam backend
 """
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 from datetime import datetime
 from pathlib import Path
 import logging
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Iterator, Iterable, List
 
 import config
+from modules.database import VectorInsightDB
+from modules.snapshot_store import RawSnapshotStore
+from modules.schema import csv_dtypes, apply_schema
+from modules.timestamps import parse_timestamps
 
 # Setup logging
 logging.basicConfig(
@@ -23,22 +34,262 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Per data type: (API endpoint, merge key, timestamp column of uploads and edits)
+EXTRACT_SOURCES = {
+    'surveillance': (config.SURVEILLANCE_ENDPOINT, 'SessionID', 'SessionUpdatedAt'),
+    'specimens': (config.SPECIMENS_ENDPOINT, 'SpecimenID', 'ImageUpdatedAt'),
+}
+
+# The export endpoints apply startDate to the session collection date, so the
+# watermark is the newest collection date seen. Sessions uploaded or edited
+# after later ones were collected are caught by re-fetching a window behind it
+# as long as the slowest uploads observed (UPLOAD_LAG_QUANTILE), and anything
+# older by the scheduled full refresh (FULL_REFRESH_DAYS).
+WATERMARK_DATE_COLUMN = 'SessionCollectionDate'
+
+# extraction_watermarks keys: newest collection date and upload lag (days) per
+# data type, and the time of the last full refresh
+WATERMARK_KEY = '{data_type}:collected'
+UPLOAD_LAG_KEY = '{data_type}:upload_lag_days'
+FULL_REFRESH_KEY = 'full_refresh'
+
+
+# Columns identifying one export row, used to drop rows repeated across shards
+# (a specimen has one row per image)
+ROW_KEYS = {
+    'surveillance': ['ID'],
+    'specimens': ['SpecimenID', 'ImageID'],
+}
+
+# pandas frequency for each backfill window size
+BACKFILL_FREQUENCIES = {
+    'week': 'W-MON',
+    'month': 'MS',
+}
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (e.g. iter_content)"""
+    
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self.bytes_read = 0
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        self.bytes_read += n
+        return n
+
+
+def concat_batches(batches: Iterable[pd.DataFrame], data_type: str) -> pd.DataFrame:
+    """
+    Concatenate streamed batches into one typed DataFrame
+    
+    Each batch is converted to an Arrow table as it arrives and then
+    dropped, so what accumulates is Arrow's columnar copy (strings in
+    contiguous buffers, several times smaller than Python objects) rather
+    than the pandas batches. The tables are released column by column while
+    the result is built, so the list of batches and the concatenated frame
+    are never held in full at the same time.
+    
+    Args:
+        batches: Typed batches (e.g. from DataExtractor.iter_csv_batches)
+        data_type: 'surveillance' or 'specimens' (selects the schema)
+        
+    Returns:
+        DataFrame with registry dtypes (empty if there are no batches)
+    """
+    tables = [pa.Table.from_pandas(batch, preserve_index=False) for batch in batches]
+    if not tables:
+        return pd.DataFrame()
+    
+    try:
+        # 'permissive' unifies a column that is all-null in one batch with its type in the others
+        table = pa.concat_tables(tables, promote_options='permissive')
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        # Columns outside the registry can be parsed as different types per batch
+        logger.warning(f"Concatenating {data_type} batches in pandas: {e}")
+        return apply_schema(pd.concat([t.to_pandas() for t in tables], ignore_index=True), data_type)
+    
+    del tables
+    df = table.to_pandas(self_destruct=True, split_blocks=True)
+    del table
+    return apply_schema(df, data_type)
+
+
 class DataExtractor:
     """Handles data extraction from VectorCam API"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, db: Optional[VectorInsightDB] = None,
+                 full_refresh: bool = False):
         """
         Initialize DataExtractor
         
         Args:
             api_key: API secret key. If None, uses config.API_SECRET_KEY
+            db: Database holding extraction watermarks. If None, uses config.DB_PATH
+            full_refresh: If True, ignores watermarks and the raw store and
+                fetches everything since config.EXTRACT_START_DATE
         """
         self.api_key = api_key or config.API_KEY
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Accept': 'text/csv'
         }
+        self.db = db or VectorInsightDB()
+        self.full_refresh = full_refresh
+        self.snapshots = RawSnapshotStore()
+        self.session = self._build_session()
+    
+    def _build_session(self) -> requests.Session:
+        """
+        Build a keep-alive HTTP session shared by all requests
+        
+        Failed connections and 429/5xx responses are retried up to
+        config.HTTP_MAX_RETRIES times with exponential backoff.
+        
+        Returns:
+            Configured requests.Session
+        """
+        retry = Retry(
+            total=config.HTTP_MAX_RETRIES,
+            backoff_factor=config.HTTP_BACKOFF_FACTOR,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry,
+            pool_connections=config.HTTP_POOL_SIZE,
+            pool_maxsize=config.HTTP_POOL_SIZE,
+        )
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+        
+    def full_refresh_due(self) -> bool:
+        """
+        Whether the last full refresh is older than config.FULL_REFRESH_DAYS
+        
+        Incremental runs cannot see edits to sessions collected before their
+        re-fetch window, nor deletions; a periodic full refresh catches both.
+        A database without a recorded full refresh is due.
+        
+        Returns:
+            True if this run should re-download everything
+        """
+        if config.FULL_REFRESH_DAYS <= 0:
+            return False
+        last = self.db.get_watermark(FULL_REFRESH_KEY)
+        if last is None:
+            return True
+        return pd.Timestamp.now() - pd.Timestamp(last) >= pd.Timedelta(days=config.FULL_REFRESH_DAYS)
+    
+    def _start_date(self, data_type: str) -> str:
+        """
+        Get the startDate to request for a data type
+        
+        Incremental runs start behind the newest collection date seen by
+        the larger of WATERMARK_OVERLAP_DAYS and the stored upload lag, so
+        sessions uploaded late are fetched once they arrive.
+        
+        Args:
+            data_type: 'surveillance' or 'specimens'
+            
+        Returns:
+            Start date in YYYY-MM-DD format
+        """
+        watermark = None if self.full_refresh else self.db.get_watermark(WATERMARK_KEY.format(data_type=data_type))
+        if watermark is None:
+            return config.EXTRACT_START_DATE
+        
+        lag = self.db.get_watermark(UPLOAD_LAG_KEY.format(data_type=data_type))
+        overlap = max(config.WATERMARK_OVERLAP_DAYS, int(lag or 0))
+        start = pd.Timestamp(watermark) - pd.Timedelta(days=overlap)
+        return max(start.strftime('%Y-%m-%d'), config.EXTRACT_START_DATE)
+    
+    def _endpoint_url(self, data_type: str) -> str:
+        """Build the export URL for a data type, including its startDate"""
+        endpoint, _, _ = EXTRACT_SOURCES[data_type]
+        return f"{endpoint}?startDate={self._start_date(data_type)}"
+    
+
+    def iter_csv_batches(self, endpoint: str, data_type: str,
+                         chunk_rows: Optional[int] = None,
+                         label: Optional[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream CSV data from API endpoint as DataFrame batches
+        
+        The response body is read with iter_content and parsed incrementally,
+        so only one HTTP chunk and one batch of rows are held at a time.
+        Columns are parsed straight into the schema registry dtypes.
+        
+        Args:
+            endpoint: API endpoint URL
+            data_type: 'surveillance' or 'specimens' (selects the schema)
+            chunk_rows: Rows per batch. If None, uses config.CSV_CHUNK_ROWS
+            label: Name used in log messages. If None, uses data_type
+            
+        Yields:
+            Typed DataFrame batches of at most chunk_rows rows
+            
+        Raises:
+            requests.exceptions.RequestException: If the request fails
+        """
+        chunk_rows = chunk_rows or config.CSV_CHUNK_ROWS
+        label = label or data_type
+        
+        logger.info(f"Streaming {label} data from {endpoint}")
+        start = time.perf_counter()
         
+        with self.session.get(endpoint, timeout=120, stream=True) as response:
+            response.raise_for_status()
+            logger.info(f"{label} responded in {time.perf_counter() - start:.2f}s")
+            
+            stream = _ChunkStream(response.iter_content(chunk_size=config.CSV_STREAM_CHUNK_BYTES))
+            reader = pd.read_csv(
+                io.BufferedReader(stream, buffer_size=config.CSV_STREAM_CHUNK_BYTES),
+                chunksize=chunk_rows,
+                dtype=csv_dtypes(data_type),
+                # Decode as response.text would when the server declares a charset
+                encoding=response.encoding or 'utf-8'
+            )
+            
+            n_batches = 0
+            n_rows = 0
+            peak_batch_bytes = 0
+            with reader:
+                for batch in reader:
+                    batch = apply_schema(batch, data_type)
+                    if n_batches == 0:
+                        logger.info(
+                            f"First {label} batch after {time.perf_counter() - start:.2f}s "
+                            f"({len(batch)} rows)"
+                        )
+                    n_batches += 1
+                    n_rows += len(batch)
+                    peak_batch_bytes = max(peak_batch_bytes, int(batch.memory_usage(deep=True).sum()))
+                    yield batch
+        
+        logger.info(
+            f"Streamed {n_rows} rows of {label} data in {n_batches} batches: "
+            f"{stream.bytes_read / 1e6:.2f} MB downloaded, "
+            f"peak batch {peak_batch_bytes / 1e6:.1f} MB, "
+            f"{time.perf_counter() - start:.2f}s total"
+        )
+    
     def _fetch_csv(self, endpoint: str, data_type: str) -> Optional[pd.DataFrame]:
         """
         Fetch CSV data from API endpoint
@@ -52,12 +303,7 @@ class DataExtractor:
         """
         try:
             logger.info(f"Fetching {data_type} data from {endpoint}")
-            response = requests.get(endpoint, headers=self.headers, timeout=120)
-            response.raise_for_status()
-            
-            # Parse CSV into DataFrame
-            from io import StringIO
-            df = pd.read_csv(StringIO(response.text))
+            df = concat_batches(self.iter_csv_batches(endpoint, data_type), data_type)
             
             logger.info(f"Successfully fetched {len(df)} rows of {data_type} data")
             return df
@@ -76,7 +322,7 @@ class DataExtractor:
         Returns:
             DataFrame with surveillance data or None if error
         """
-        return self._fetch_csv(config.SURVEILLANCE_ENDPOINT, "surveillance")
+        return self._fetch_csv(self._endpoint_url("surveillance"), "surveillance")
     
     def fetch_specimens_data(self) -> Optional[pd.DataFrame]:
         """
@@ -85,26 +331,257 @@ class DataExtractor:
         Returns:
             DataFrame with specimens data or None if error
         """
-        return self._fetch_csv(config.SPECIMENS_ENDPOINT, "specimens")
+        return self._fetch_csv(self._endpoint_url("specimens"), "specimens")
     
-    def fetch_all_data(self) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+    def fetch_all_data(self, concurrent: Optional[bool] = None) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
         """
         Fetch both surveillance and specimens data
         
+        Args:
+            concurrent: Fetch both endpoints in parallel over the shared session.
+                If None, uses config.EXTRACT_CONCURRENT
+        
         Returns:
             Tuple of (surveillance_df, specimens_df)
         """
-        surveillance_df = self.fetch_surveillance_data()
-        specimens_df = self.fetch_specimens_data()
+        if concurrent is None:
+            concurrent = config.EXTRACT_CONCURRENT
+        
+        start = time.perf_counter()
+        
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix='extract') as pool:
+                surveillance_future = pool.submit(self.fetch_surveillance_data)
+                specimens_future = pool.submit(self.fetch_specimens_data)
+                surveillance_df = surveillance_future.result()
+                specimens_df = specimens_future.result()
+        else:
+            surveillance_df = self.fetch_surveillance_data()
+            specimens_df = self.fetch_specimens_data()
+        
+        mode = 'concurrently' if concurrent else 'sequentially'
+        logger.info(f"Fetched surveillance and specimens {mode} in {time.perf_counter() - start:.2f}s")
         
         return surveillance_df, specimens_df
     
+    @staticmethod
+    def date_windows(start_date: str, end_date: str, window: str = 'month') -> List[Tuple[str, str]]:
+        """
+        Split [start_date, end_date) into calendar windows
+        
+        Args:
+            start_date: First day (YYYY-MM-DD)
+            end_date: Day after the last day (YYYY-MM-DD)
+            window: 'week' (Monday-aligned) or 'month'
+            
+        Returns:
+            List of (window_start, window_end) date strings, end exclusive
+        """
+        if window not in BACKFILL_FREQUENCIES:
+            raise ValueError(f"Unknown backfill window '{window}' - use one of {sorted(BACKFILL_FREQUENCIES)}")
+        
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        if start >= end:
+            raise ValueError(f"Backfill start {start_date} must be before end {end_date}")
+        
+        inner = pd.date_range(start, end, freq=BACKFILL_FREQUENCIES[window], inclusive='neither')
+        bounds = [start, *inner, end]
+        return [(a.strftime('%Y-%m-%d'), b.strftime('%Y-%m-%d')) for a, b in zip(bounds[:-1], bounds[1:])]
+    
+    def _fetch_shard(self, data_type: str, start_date: str, end_date: str) -> pd.DataFrame:
+        """
+        Fetch one date window of a backfill
+        
+        Raises:
+            requests.exceptions.RequestException: If the download fails
+        """
+        endpoint, _, _ = EXTRACT_SOURCES[data_type]
+        url = f"{endpoint}?startDate={start_date}&endDate={end_date}"
+        return concat_batches(
+            self.iter_csv_batches(url, data_type, label=f"{data_type} [{start_date}, {end_date})"),
+            data_type
+        )
+    
+    def fetch_backfill(self, data_type: str, start_date: str, end_date: str,
+                       window: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Download a long date range as parallel date-window shards
+        
+        Shards run on config.BACKFILL_WORKERS threads. Failed shards are retried
+        on their own for up to config.BACKFILL_SHARD_RETRIES extra rounds, so one
+        timeout does not restart the whole download. Rows repeated across shard
+        boundaries are dropped on ROW_KEYS.
+        
+        Args:
+            data_type: 'surveillance' or 'specimens'
+            start_date: First day (YYYY-MM-DD)
+            end_date: Day after the last day (YYYY-MM-DD)
+            window: 'week' or 'month'. If None, uses config.BACKFILL_WINDOW
+            
+        Returns:
+            Stitched DataFrame or None if any shard still fails
+        """
+        window = window or config.BACKFILL_WINDOW
+        pending = self.date_windows(start_date, end_date, window)
+        shards = {}
+        
+        logger.info(f"Backfilling {data_type} {start_date} to {end_date} in {len(pending)} {window} shards")
+        start = time.perf_counter()
+        
+        for attempt in range(config.BACKFILL_SHARD_RETRIES + 1):
+            if attempt > 0:
+                delay = config.HTTP_BACKOFF_FACTOR * (2 ** (attempt - 1))
+                logger.warning(f"Retrying {len(pending)} failed {data_type} shards in {delay:.1f}s")
+                time.sleep(delay)
+            
+            failed = []
+            with ThreadPoolExecutor(max_workers=config.BACKFILL_WORKERS, thread_name_prefix='backfill') as pool:
+                futures = {
+                    pool.submit(self._fetch_shard, data_type, *shard): shard
+                    for shard in pending
+                }
+                for future, shard in futures.items():
+                    try:
+                        shards[shard] = future.result()
+                    except Exception as e:
+                        logger.error(f"{data_type} shard {shard[0]}..{shard[1]} failed: {str(e)}")
+                        failed.append(shard)
+            
+            pending = failed
+            if not pending:
+                break
+        
+        if pending:
+            logger.error(f"Backfill of {data_type} failed: {len(pending)} shards could not be downloaded")
+            return None
+        
+        # Stitch in date order; later shards win for rows present in two windows.
+        # Empty windows are left out so their untyped columns don't widen dtypes.
+        frames = [shards[shard] for shard in sorted(shards)]
+        df = pd.concat([f for f in frames if len(f) > 0] or frames[:1], ignore_index=True)
+        keys = [col for col in ROW_KEYS[data_type] if col in df.columns]
+        before = len(df)
+        df = df.drop_duplicates(subset=keys or None, keep='last').reset_index(drop=True)
+        
+        logger.info(
+            f"Backfilled {len(df)} {data_type} rows from {len(shards)} shards "
+            f"({before - len(df)} duplicates dropped) in {time.perf_counter() - start:.2f}s"
+        )
+        return df
+    
+    def load_raw_store(self, data_type: str) -> Optional[pd.DataFrame]:
+        """
+        Load the most recent raw snapshot for a data type
+        
+        Snapshots written before the schema registry held untyped columns,
+        so the result is cast to registry dtypes before it is merged.
+        
+        Args:
+            data_type: 'surveillance' or 'specimens'
+            
+        Returns:
+            DataFrame with previously extracted data or None if there is none
+        """
+        df = self.snapshots.load(data_type)
+        if df is None:
+            # Raw directories written before the snapshot store existed
+            snapshots = list(config.RAW_DATA_DIR.glob(f"{data_type}_*.parquet"))
+            if not snapshots:
+                return None
+            latest = max(snapshots, key=lambda p: p.stat().st_mtime)
+            
+            logger.info(f"Loading raw {data_type} store from {latest}")
+            df = pd.read_parquet(latest)
+        
+        return apply_schema(df, data_type)
+    
+    def merge_with_raw_store(self, df: pd.DataFrame, data_type: str) -> pd.DataFrame:
+        """
+        Merge freshly fetched rows into the existing raw store
+        
+        Rows are matched on the data type's primary key; fetched rows replace
+        stored ones, so edits inside the overlap window win.
+        
+        Args:
+            df: Newly fetched data (the delta since the watermark)
+            data_type: 'surveillance' or 'specimens'
+            
+        Returns:
+            Full DataFrame: stored rows plus the delta
+        """
+        if self.full_refresh:
+            return df
+        
+        existing = self.load_raw_store(data_type)
+        if existing is None:
+            return df
+        
+        _, key, _ = EXTRACT_SOURCES[data_type]
+        if key not in df.columns or key not in existing.columns:
+            logger.warning(f"No {key} column to merge {data_type} data on - using fetched data only")
+            return df
+        
+        if len(df) == 0:
+            logger.info(f"No new {data_type} rows - keeping {len(existing)} stored rows")
+            return existing
+        
+        # Replace every stored row whose key was re-fetched (an export can hold
+        # several rows per key, e.g. one per specimen image), keep the rest
+        replaced = existing[key].isin(df[key].dropna())
+        n_updated = int(df[key].isin(existing.loc[replaced, key]).sum())
+        
+        merged = pd.concat([existing[~replaced], df], ignore_index=True)
+        
+        logger.info(
+            f"Merged {data_type} delta: {len(df) - n_updated} new, {n_updated} updated, "
+            f"{len(merged)} total rows"
+        )
+        return merged
+    
+    def update_watermarks(self, surveillance_df: pd.DataFrame, specimens_df: pd.DataFrame):
+        """
+        Persist the newest collection date and the upload lag of each data type
+        
+        The upload lag is the UPLOAD_LAG_QUANTILE quantile, in whole days,
+        of the time between a row's collection date and its last upload or
+        edit, over all the data saved. A full refresh is recorded as well.
+        
+        Args:
+            surveillance_df: Surveillance data that was saved
+            specimens_df: Specimens data that was saved
+        """
+        for data_type, df in (('surveillance', surveillance_df), ('specimens', specimens_df)):
+            if WATERMARK_DATE_COLUMN not in df.columns:
+                logger.warning(f"No {WATERMARK_DATE_COLUMN} column - {data_type} watermark not updated")
+                continue
+            
+            collected = parse_timestamps(df[WATERMARK_DATE_COLUMN])
+            newest = collected.max()
+            if pd.isna(newest):
+                continue
+            self.db.set_watermark(WATERMARK_KEY.format(data_type=data_type), newest.isoformat())
+            
+            _, _, updated_col = EXTRACT_SOURCES[data_type]
+            if updated_col in df.columns:
+                lag = (parse_timestamps(df[updated_col]) - collected).dt.days.quantile(config.UPLOAD_LAG_QUANTILE)
+                if pd.notna(lag):
+                    days = max(0, int(np.ceil(lag)))
+                    self.db.set_watermark(UPLOAD_LAG_KEY.format(data_type=data_type), str(days))
+                    logger.info(f"{data_type} upload lag ({config.UPLOAD_LAG_QUANTILE:.0%} of rows): {days} days")
+        
+        if self.full_refresh:
+            self.db.set_watermark(FULL_REFRESH_KEY, datetime.now().isoformat())
+    
     def save_raw_data(self, 
                       surveillance_df: pd.DataFrame, 
                       specimens_df: pd.DataFrame,
                       timestamp: Optional[str] = None) -> Tuple[Path, Path]:
         """
-        Save raw data as Parquet files with timestamp
+        Save raw data to the content-addressed snapshot store
+        
+        A Parquet object is only written when a frame's content changed since
+        any earlier snapshot, and a manifest entry only when it differs from
+        the snapshot in effect.
         
         Args:
             surveillance_df: Surveillance data
@@ -112,52 +589,59 @@ class DataExtractor:
             timestamp: Optional timestamp string. If None, uses current time
             
         Returns:
-            Tuple of (surveillance_path, specimens_path)
+            Tuple of (surveillance_path, specimens_path) monthly aliases
         """
         if timestamp is None:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
-        # Create monthly snapshot naming (YYYY_MM format)
-        year_month = datetime.now().strftime('%Y_%m')
-        
-        surveillance_path = config.RAW_DATA_DIR / f"surveillance_{year_month}.parquet"
-        specimens_path = config.RAW_DATA_DIR / f"specimens_{year_month}.parquet"
-        
-        # Save as Parquet (more efficient than CSV)
-        surveillance_df.to_parquet(surveillance_path, index=False)
-        specimens_df.to_parquet(specimens_path, index=False)
+        surveillance_path = self.snapshots.put('surveillance', surveillance_df, timestamp)
+        specimens_path = self.snapshots.put('specimens', specimens_df, timestamp)
         
         logger.info(f"Saved raw surveillance data to {surveillance_path}")
         logger.info(f"Saved raw specimens data to {specimens_path}")
         
-        # Also save timestamped backup
-        backup_surveillance = config.RAW_DATA_DIR / f"surveillance_{timestamp}.parquet"
-        backup_specimens = config.RAW_DATA_DIR / f"specimens_{timestamp}.parquet"
-        
-        surveillance_df.to_parquet(backup_surveillance, index=False)
-        specimens_df.to_parquet(backup_specimens, index=False)
-        
-        logger.info(f"Saved backup files with timestamp {timestamp}")
-        
         return surveillance_path, specimens_path
 
 
-def extract_data(save_raw: bool = True) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+def extract_data(save_raw: bool = True,
+                 full_refresh: bool = False,
+                 backfill: Optional[Tuple[str, str]] = None,
+                 backfill_window: Optional[str] = None) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
     """
     Main function to extract data from API
     
+    Fetches only records collected since each endpoint's watermark (less the
+    re-fetch window) and merges them into the raw store; every
+    config.FULL_REFRESH_DAYS the run re-downloads everything instead.
+    Watermarks advance only once the merged data is saved.
+    
     Args:
         save_raw: Whether to save raw data files
+        full_refresh: If True, re-downloads everything since config.EXTRACT_START_DATE
+        backfill: Optional (start_date, end_date) range to download in date-window shards
+        backfill_window: 'week' or 'month'. If None, uses config.BACKFILL_WINDOW
         
     Returns:
-        Tuple of (surveillance_df, specimens_df)
+        Tuple of (surveillance_df, specimens_df) with the full merged data
     """
-    extractor = DataExtractor()
-    surveillance_df, specimens_df = extractor.fetch_all_data()
+    extractor = DataExtractor(full_refresh=full_refresh)
+    if not full_refresh and not backfill and extractor.full_refresh_due():
+        logger.info(f"Scheduled full refresh (every {config.FULL_REFRESH_DAYS} days)")
+        extractor.full_refresh = True
+    
+    if backfill:
+        surveillance_df = extractor.fetch_backfill('surveillance', *backfill, window=backfill_window)
+        specimens_df = extractor.fetch_backfill('specimens', *backfill, window=backfill_window)
+    else:
+        surveillance_df, specimens_df = extractor.fetch_all_data()
     
     if surveillance_df is not None and specimens_df is not None:
+        surveillance_df = extractor.merge_with_raw_store(surveillance_df, 'surveillance')
+        specimens_df = extractor.merge_with_raw_store(specimens_df, 'specimens')
+        
         if save_raw:
             extractor.save_raw_data(surveillance_df, specimens_df)
+            extractor.update_watermarks(surveillance_df, specimens_df)
     
     return surveillance_df, specimens_df
 
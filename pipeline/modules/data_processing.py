@@ -6,23 +6,73 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import logging
-from typing import Tuple
+from typing import Tuple, Dict, List, Callable, Optional, Iterable
 from pathlib import Path
 
 # Import config for paths
 import sys
 sys.path.append(str(Path(__file__).parent.parent))
 import config
+from modules.report_builder import build_vectorcam_report
+from modules.schema import apply_schema, categorize, read_vectorcam_csv
+from modules.species import SpeciesNormalizer
 
 logger = logging.getLogger(__name__)
 
 
+# A row filter is (description, column, predicate). The predicate receives the
+# column and returns True for rows to keep; rules on missing columns are skipped.
+FilterRule = Tuple[str, str, Callable[[pd.Series], pd.Series]]
+
+
+def _valid_session_id(session_id: pd.Series) -> pd.Series:
+    """SessionID is present and not a blank/'N/A' placeholder"""
+    return session_id.notna() & (session_id != '') & (session_id != 'N/A')
+
+
+# Global data filters shared by surveillance and specimens, in log order
+GLOBAL_FILTERS: List[FilterRule] = [
+    ('without valid SessionID', 'SessionID', _valid_session_id),
+    ('from sites 1-11', 'SiteID', lambda site: ~site.between(1, 11).fillna(False)),
+    ("from district 'Other'", 'SiteDistrict', lambda district: district != 'Other'),
+]
+
+
+def apply_row_filters(df: pd.DataFrame,
+                      rules: List[FilterRule]) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Apply row filters as one combined mask and materialize the result once
+    
+    Each removed row is counted against the first rule that rejects it, so the
+    counts match applying the rules one after another.
+    
+    Args:
+        df: DataFrame to filter
+        rules: Filter rules, in reporting order
+        
+    Returns:
+        Tuple of (filtered DataFrame, rows removed per rule description)
+    """
+    keep = np.ones(len(df), dtype=bool)
+    removed = {}
+    
+    for description, column, predicate in rules:
+        if column not in df.columns:
+            continue
+        passed = predicate(df[column]).fillna(False).to_numpy(dtype=bool)
+        removed[description] = int((keep & ~passed).sum())
+        keep &= passed
+    
+    return df.take(np.flatnonzero(keep)), removed
+
+
 class DataProcessor:
     """Processes and cleans raw surveillance and specimen data"""
     
     def __init__(self):
         """Initialize DataProcessor"""
         self.exports_dir = config.EXPORTS_DIR  # ✅ Use config path
+        self.species = SpeciesNormalizer()
     
     def clean_surveillance_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -39,25 +89,8 @@ class DataProcessor:
         # Make a copy to avoid modifying original
         df = df.copy()
         
-        # Convert date columns to datetime
-        date_columns = [
-            'SessionCollectionDate', 'SessionCreatedAt', 'SessionCompletedAt',
-            'SessionSubmittedAt', 'SessionUpdatedAt', 'CreatedAt', 'UpdatedAt'
-        ]
-        
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        # Handle numeric columns
-        numeric_columns = [
-            'NumPeopleSleptInHouse', 'MonthsSinceIrs', 'NumLlinsAvailable',
-            'NumPeopleSleptUnderLlin', 'SessionID', 'SiteID', 'ProgramID', 'ID'
-        ]
-        
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        # Typed on read; only frames from other sources are actually cast here
+        df = apply_schema(df, 'surveillance')
         
         # Clean Yes/No fields
         if 'WasIrsConducted' in df.columns:
@@ -83,7 +116,8 @@ class DataProcessor:
         # Calculate LLIN usage rate (percentage of people using nets)
         if 'NumPeopleSleptUnderLlin' in df.columns and 'NumPeopleSleptInHouse' in df.columns:
             df['LlinUsageRate'] = (
-                df['NumPeopleSleptUnderLlin'] / df['NumPeopleSleptInHouse'] * 100
+                df['NumPeopleSleptUnderLlin'].astype('float64')
+                / df['NumPeopleSleptInHouse'].astype('float64') * 100
             ).fillna(0)
         
         # Flag data quality issues
@@ -91,48 +125,30 @@ class DataProcessor:
         
         # Flag if people slept under more nets than available
         if 'NumPeopleSleptUnderLlin' in df.columns and 'NumLlinsAvailable' in df.columns:
-            mask = (df['NumPeopleSleptUnderLlin'] > df['NumLlinsAvailable'] * 2)
+            mask = (df['NumPeopleSleptUnderLlin'] > df['NumLlinsAvailable'] * 2).fillna(False)
             df.loc[mask, 'DataQualityFlag'] = 'Suspicious: More people than nets'
         
         # Flag unusual household sizes
         if 'NumPeopleSleptInHouse' in df.columns:
-            mask = (df['NumPeopleSleptInHouse'] > 50)
+            mask = (df['NumPeopleSleptInHouse'] > 50).fillna(False)
             df.loc[mask, 'DataQualityFlag'] = 'Suspicious: Large household'
 
         logger.info("Applying global data filters...")
         
         initial_count = len(df)
         
-        # Filter 1: Remove sessions without SessionID
-        if 'SessionID' in df.columns:
-            before = len(df)
-            df = df[df['SessionID'].notna()].copy()
-            df = df[df['SessionID'] != ''].copy()
-            df = df[df['SessionID'] != 'N/A'].copy()
-            removed = before - len(df)
-            if removed > 0:
-                logger.info(f"  ✅ Removed {removed} records without valid SessionID")
-        
-        # Filter 2: Remove sites 1-11
-        if 'SiteID' in df.columns:
-            before = len(df)
-            df = df[~df['SiteID'].between(1, 11)].copy()
-            removed = before - len(df)
-            if removed > 0:
-                logger.info(f"  ✅ Removed {removed} records from sites 1-11")
-        
-        # Filter 3: Remove district "Other"
-        if 'SiteDistrict' in df.columns:
-            before = len(df)
-            df = df[df['SiteDistrict'] != 'Other'].copy()
-            removed = before - len(df)
-            if removed > 0:
-                logger.info(f"  ✅ Removed {removed} records from district 'Other'")
+        df, removed = apply_row_filters(df, GLOBAL_FILTERS)
+        for description, count in removed.items():
+            if count > 0:
+                logger.info(f"  ✅ Removed {count} records {description}")
         
         total_removed = initial_count - len(df)
         logger.info(f"  📊 Total records after filtering: {len(df)} (removed {total_removed})")
         # ============================================================================
         
+        # Low-cardinality labels are categorical from here on
+        df = categorize(df, 'surveillance')
+        
         logger.info(f"Cleaned surveillance data: {len(df)} records")
         logger.info(f"Data quality flags: {df['DataQualityFlag'].value_counts().to_dict()}")
         
@@ -145,83 +161,16 @@ class DataProcessor:
         # Make a copy
         df = df.copy()
 
-        # ✅ FIXED - Normalize species names
-        if 'Species' in df.columns:
-            # Convert to string and strip whitespace
-            df['Species'] = df['Species'].astype(str).str.strip()
-            
-            # Normalize common variations
-            species_mapping = {
-                # Non-mosquito variations
-                'non-mosquito': 'Non-Mosquito',
-                'non mosquito': 'Non-Mosquito',
-                'Non mosquito': 'Non-Mosquito',
-                'non-Mosquito': 'Non-Mosquito',
-                'NON-MOSQUITO': 'Non-Mosquito',
-                'NON MOSQUITO': 'Non-Mosquito',
-                
-                # Unknown variations
-                'unknown': 'Unknown',
-                'Unknown ': 'Unknown',
-                ' Unknown': 'Unknown',
-                'UNKNOWN': 'Unknown',
-                
-                # Anopheles variations
-                'anopheles gambiae': 'Anopheles gambiae',
-                'Anopheles Gambiae': 'Anopheles gambiae',
-                'ANOPHELES GAMBIAE': 'Anopheles gambiae',
-                
-                'anopheles funestus': 'Anopheles funestus',
-                'Anopheles Funestus': 'Anopheles funestus',
-                'ANOPHELES FUNESTUS': 'Anopheles funestus',
-                
-                'anopheles other': 'Anopheles other',
-                'Anopheles Other': 'Anopheles other',
-                'ANOPHELES OTHER': 'Anopheles other',
-                
-                # Culex variations
-                'culex': 'Culex',
-                'CULEX': 'Culex',
-                'Culex ': 'Culex',
-                
-                # Mansonia variations
-                'mansonia': 'Mansonia',
-                'MANSONIA': 'Mansonia',
-                'Mansonia ': 'Mansonia',
-                
-                # Aedes variations
-                'aedes': 'Aedes',
-                'AEDES': 'Aedes',
-                'Aedes ': 'Aedes',
-            }
-            
-            # Apply mapping
-            df['Species'] = df['Species'].replace(species_mapping)
-            
-            # Replace empty strings and 'nan' with 'Unknown'
-            df.loc[df['Species'].isin(['', 'nan', 'None', 'null']), 'Species'] = 'Unknown'
-        
-        # Convert date columns to datetime
-        date_columns = [
-            'CapturedAt', 'ImageSubmittedAt', 'ImageUpdatedAt',
-            'SessionCollectionDate', 'SessionCreatedAt', 'SessionCompletedAt',
-            'SessionSubmittedAt', 'SessionUpdatedAt'
-        ]
+        # Typed on read; only frames from other sources are actually cast here
+        df = apply_schema(df, 'specimens')
         
-        for col in date_columns:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        # Handle numeric columns
-        numeric_columns = ['SessionID', 'SiteID', 'ProgramID', 'ImageID']
-        
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        # ✅ FIXED - Normalize species names (once per distinct label)
+        if 'Species' in df.columns:
+            df['Species'] = self.species.normalize(df['Species'])
         
-        # Clean categorical fields
+        # Clean categorical fields (Species is never missing after normalization)
         categorical_columns = [
-            'Species', 'Sex', 'AbdomenStatus', 'SessionCollectionMethod',
+            'Sex', 'AbdomenStatus', 'SessionCollectionMethod',
             'SiteDistrict', 'ProgramCountry'
         ]
         
@@ -238,7 +187,7 @@ class DataProcessor:
         
         # Create species groups
         if 'Species' in df.columns:
-            df['SpeciesGroup'] = df['Species'].apply(self._categorize_species)
+            df['SpeciesGroup'] = self.species.groups(df['Species'])
         
         # Create blood-feeding status flag
         if 'AbdomenStatus' in df.columns:
@@ -260,35 +209,17 @@ class DataProcessor:
         
         initial_count = len(df)
         
-        # Filter 1: Remove specimens without SessionID
-        if 'SessionID' in df.columns:
-            before = len(df)
-            df = df[df['SessionID'].notna()].copy()
-            df = df[df['SessionID'] != ''].copy()
-            df = df[df['SessionID'] != 'N/A'].copy()
-            removed = before - len(df)
-            if removed > 0:
-                logger.info(f"  ✅ Removed {removed} specimens without valid SessionID")
-        
-        # Filter 2: Remove specimens from sites 1-11
-        if 'SiteID' in df.columns:
-            before = len(df)
-            df = df[~df['SiteID'].between(1, 11)].copy()
-            removed = before - len(df)
-            if removed > 0:
-                logger.info(f"  ✅ Removed {removed} specimens from sites 1-11")
-        
-        # Filter 3: Remove specimens from district "Other"
-        if 'SiteDistrict' in df.columns:
-            before = len(df)
-            df = df[df['SiteDistrict'] != 'Other'].copy()
-            removed = before - len(df)
-            if removed > 0:
-                logger.info(f"  ✅ Removed {removed} specimens from district 'Other'")
+        df, removed = apply_row_filters(df, GLOBAL_FILTERS)
+        for description, count in removed.items():
+            if count > 0:
+                logger.info(f"  ✅ Removed {count} specimens {description}")
         
         total_removed = initial_count - len(df)
         logger.info(f"  📊 Total SPECIMENS after filtering: {len(df)} (removed {total_removed})")
         # ============================================================================
+        
+        # Low-cardinality labels are categorical from here on
+        df = categorize(df, 'specimens')
 
         
         logger.info(f"Cleaned specimens data: {len(df)} records")
@@ -296,30 +227,6 @@ class DataProcessor:
         
         return df
     
-    def _categorize_species(self, species: str) -> str:
-        """Categorize species into broader groups"""
-        if pd.isna(species) or species in ['N/A', 'Unknown']:
-            return 'Unknown'
-        
-        species_lower = str(species).lower()
-        
-        if 'gambiae' in species_lower:
-            return 'Anopheles gambiae complex'
-        elif 'funestus' in species_lower:
-            return 'Anopheles funestus group'
-        elif 'arabiensis' in species_lower:
-            return 'Anopheles arabiensis'
-        elif 'anopheles' in species_lower:
-            return 'Other Anopheles'
-        elif 'culex' in species_lower:
-            return 'Culex (nuisance)'
-        elif 'aedes' in species_lower:
-            return 'Aedes (arbovirus vector)'
-        elif 'non-mosquito' in species_lower or 'non mosquito' in species_lower:
-            return 'Non-mosquito'
-        else:
-            return 'Other'
-    
     def merge_data(self, surveillance_df: pd.DataFrame, 
                    specimens_df: pd.DataFrame) -> pd.DataFrame:
         """Merge surveillance and specimens data"""
@@ -405,209 +312,8 @@ class DataProcessor:
         
         logger.info("Generating VectorCam report format")
         
-        # Match column names from surveillance data
-        country_col = 'ProgramCountry' if 'ProgramCountry' in surveillance_df.columns else None
-        district_col = 'SiteDistrict' if 'SiteDistrict' in surveillance_df.columns else None
-        method_col = 'SessionCollectionMethod' if 'SessionCollectionMethod' in surveillance_df.columns else None
-        date_col = 'SessionCollectionDate' if 'SessionCollectionDate' in surveillance_df.columns else None
-        
-        report_rows = []
-        
-        # Group by SessionID to get per-house data
-        for session_id in surveillance_df['SessionID'].dropna().unique():
-            matching_sessions = surveillance_df[surveillance_df['SessionID'] == session_id]
-            if len(matching_sessions) == 0:
-                logger.warning(f"Session {session_id} not found in surveillance data - skipping")
-                continue
-            session_info = matching_sessions.iloc[0]
-            
-            # Get specimens for this session
-            session_specimens = specimens_df[specimens_df['SessionID'] == session_id]
-            
-            # Initialize counters
-            counts = {
-                'total': 0,
-                'totalAnopheles': 0,
-                'totalOtherMosquitoes': 0,
-                'maleAnopheles': 0,
-                # Anopheles gambiae by status
-                'anGambiaeUF': 0, 'anGambiaeF': 0, 'anGambiaeG': 0,
-                'AnGambiaeMale': 0, 'AnGambiaeFemale': 0,
-                # Anopheles funestus by status  
-                'anFunestusUF': 0, 'anFunestusF': 0, 'anFunestusG': 0,
-                'AnFunestusMale': 0, 'AnFunestusFemale': 0,
-                # Other Anopheles by status
-                'anOtherUF': 0, 'anOtherF': 0, 'anOtherG': 0,
-                'AnOtherMale': 0, 'AnOtherFemale': 0,
-                # Culex
-                'CulexUF': 0, 'CulexF': 0, 'CulexG': 0,
-                'culexMale': 0, 'culexFemale': 0,
-                # Aedes
-                'AedesUF': 0, 'AedesF': 0, 'AedesG': 0,
-                'aedesMale': 0, 'aedesFemale': 0,
-                # Mansonia
-                'MansoniaUF': 0, 'MansoniaF': 0, 'MansoniaG': 0,
-                'mansoniaMale': 0, 'mansoniaFemale': 0,
-            }
-            
-            # Count specimens by species, sex, and status
-            for _, specimen in session_specimens.iterrows():
-                counts['total'] += 1
-                
-                species = str(specimen.get('Species', '')).lower()
-                sex = str(specimen.get('Sex', '')).lower()
-                abdomen = str(specimen.get('AbdomenStatus', '')).lower()
-                
-                # Determine feeding status suffix
-                if 'unfed' in abdomen:
-                    status = 'UF'
-                elif 'fed' in abdomen or 'blood' in abdomen:
-                    status = 'F'
-                elif 'gravid' in abdomen:
-                    status = 'G'
-                else:
-                    status = 'UF'  # default
-                
-                is_anopheles = False
-                
-                # Count by species and status
-                if 'gambiae' in species:
-                    is_anopheles = True
-                    counts[f'anGambiae{status}'] += 1
-                    if 'male' in sex:
-                        counts['AnGambiaeMale'] += 1
-                        counts['maleAnopheles'] += 1
-                    elif 'female' in sex:
-                        counts['AnGambiaeFemale'] += 1
-                        
-                elif 'funestus' in species:
-                    is_anopheles = True
-                    counts[f'anFunestus{status}'] += 1
-                    if 'male' in sex:
-                        counts['AnFunestusMale'] += 1
-                        counts['maleAnopheles'] += 1
-                    elif 'female' in sex:
-                        counts['AnFunestusFemale'] += 1
-                        
-                elif 'anopheles' in species:
-                    is_anopheles = True
-                    counts[f'anOther{status}'] += 1
-                    if 'male' in sex:
-                        counts['AnOtherMale'] += 1
-                        counts['maleAnopheles'] += 1
-                    elif 'female' in sex:
-                        counts['AnOtherFemale'] += 1
-                        
-                elif 'culex' in species:
-                    counts[f'Culex{status}'] += 1
-                    if 'male' in sex:
-                        counts['culexMale'] += 1
-                    elif 'female' in sex:
-                        counts['culexFemale'] += 1
-                        
-                elif 'aedes' in species:
-                    counts[f'Aedes{status}'] += 1
-                    if 'male' in sex:
-                        counts['aedesMale'] += 1
-                    elif 'female' in sex:
-                        counts['aedesFemale'] += 1
-                        
-                elif 'mansonia' in species:
-                    counts[f'Mansonia{status}'] += 1
-                    if 'male' in sex:
-                        counts['mansoniaMale'] += 1
-                    elif 'female' in sex:
-                        counts['mansoniaFemale'] += 1
-                
-                # Update totals
-                if is_anopheles:
-                    counts['totalAnopheles'] += 1
-                else:
-                    counts['totalOtherMosquitoes'] += 1
-            
-            # Build row
-            row = {
-                'country': session_info.get(country_col, '') if country_col and country_col in session_info.index else '',
-                'district': session_info.get(district_col, '') if district_col and district_col in session_info.index else '',
-                'site': session_info.get('SiteID', '') if 'SiteID' in session_info.index else '',
-                'houseNumber': session_info.get('SessionHouseNumber', session_id) if 'SessionHouseNumber' in session_info.index else session_id,
-                'collectionMethod': session_info.get(method_col, '') if method_col and method_col in session_info.index else '',
-                'date': session_info.get(date_col, '') if date_col and date_col in session_info.index else '',
-                
-                # Counts
-                'total': counts['total'],
-                'totalAnopheles': counts['totalAnopheles'],
-                'totalOtherMosquitoes': counts['totalOtherMosquitoes'],
-                'maleAnopheles': counts['maleAnopheles'],
-                
-                # Anopheles gambiae
-                'anGambiaeUF': counts['anGambiaeUF'],
-                'anGambiaeF': counts['anGambiaeF'],
-                'anGambiaeG': counts['anGambiaeG'],
-                'AnGambiaeMale': counts['AnGambiaeMale'],
-                'AnGambiaeFemale': counts['AnGambiaeFemale'],
-                
-                # Anopheles funestus
-                'anFunestusUF': counts['anFunestusUF'],
-                'anFunestusF': counts['anFunestusF'],
-                'anFunestusG': counts['anFunestusG'],
-                'AnFunestusMale': counts['AnFunestusMale'],
-                'AnFunestusFemale': counts['AnFunestusFemale'],
-                
-                # Other Anopheles
-                'anOtherUF': counts['anOtherUF'],
-                'anOtherF': counts['anOtherF'],
-                'anOtherG': counts['anOtherG'],
-                'AnOtherMale': counts['AnOtherMale'],
-                'AnOtherFemale': counts['AnOtherFemale'],
-                
-                # Culex
-                'CulexUF': counts['CulexUF'],
-                'CulexF': counts['CulexF'],
-                'CulexG': counts['CulexG'],
-                'culexMale': counts['culexMale'],
-                'culexFemale': counts['culexFemale'],
-                
-                # Aedes
-                'AedesUF': counts['AedesUF'],
-                'AedesF': counts['AedesF'],
-                'AedesG': counts['AedesG'],
-                'aedesMale': counts['aedesMale'],
-                'aedesFemale': counts['aedesFemale'],
-                
-                # Mansonia
-                'MansoniaUF': counts['MansoniaUF'],
-                'MansoniaF': counts['MansoniaF'],
-                'MansoniaG': counts['MansoniaG'],
-                'mansoniaMale': counts['mansoniaMale'],
-                'mansoniaFemale': counts['mansoniaFemale'],
-                
-                # House metadata
-                'peopleSlept': session_info.get('NumPeopleSleptInHouse', '') if 'NumPeopleSleptInHouse' in session_info.index else '',
-                'irsSprayed': session_info.get('WasIrsConducted', '') if 'WasIrsConducted' in session_info.index else '',
-                'monthsAgo': session_info.get('MonthsSinceIrs', '') if 'MonthsSinceIrs' in session_info.index else '',
-                'totalLLIN': session_info.get('NumLlinsAvailable', '') if 'NumLlinsAvailable' in session_info.index else '',
-                'llinType': session_info.get('LlinType', '') if 'LlinType' in session_info.index else '',
-                'llinBrand': session_info.get('LlinBrand', '') if 'LlinBrand' in session_info.index else '',
-                'peopleSleptUnderLlin': session_info.get('NumPeopleSleptUnderLlin', '') if 'NumPeopleSleptUnderLlin' in session_info.index else '',
-                
-                # Additional fields
-                'name': session_info.get('SessionCollectorName', '') if 'SessionCollectorName' in session_info.index else '',
-                'site code': session_info.get('SiteID', '') if 'SiteID' in session_info.index else '',
-                'health centre': session_info.get('SiteHealthCenter', '') if 'SiteHealthCenter' in session_info.index else '',
-                'parish': session_info.get('SiteParish', '') if 'SiteParish' in session_info.index else '',
-                'village': '',
-                'coded house number': '',
-                'Latitude': '',
-                'Longitude': '',
-                'House Type': '',
-                'Title of Officer': session_info.get('SessionCollectorTitle', '') if 'SessionCollectorTitle' in session_info.index else ''
-            }
-            
-            report_rows.append(row)
-        
-        # Create DataFrame
-        report_df = pd.DataFrame(report_rows)
+        # One row per house with all species/sex/status counters built in a single pass
+        report_df = build_vectorcam_report(surveillance_df, specimens_df)
         
         # ✅ FIXED: Use format YYYY-MM-DD instead of YYYYMMDD
         timestamp = datetime.now().strftime('%Y-%m-%d')
@@ -629,12 +335,20 @@ class DataProcessor:
         
         return clean_surveillance, clean_specimens, merged
 
-def filter_surveillance_sessions(df: pd.DataFrame) -> pd.DataFrame:
+def filter_surveillance_sessions(df: pd.DataFrame,
+                                 session_ids: Optional[Iterable] = None) -> pd.DataFrame:
     """
     Filter dataframe to only include SURVEILLANCE type sessions.
     Excludes DATA_COLLECTION sessions.
     Handles minor naming / casing issues.
+    
+    Args:
+        df: Surveillance or specimens DataFrame
+        session_ids: If given, rows whose SessionID is not in it are dropped
+            in the same pass (e.g. specimens without a surveillance record)
     """
+    rules = []
+    
     # Try to find the correct column name
     candidate_cols = ['SessionType', 'session_type', 'sessionType']
     session_type_col = None
@@ -645,33 +359,43 @@ def filter_surveillance_sessions(df: pd.DataFrame) -> pd.DataFrame:
     
     if session_type_col is None:
         print("⚠️  Warning: no SessionType/session_type column found. Cannot filter.")
+    else:
+        # Normalize values: string, strip, uppercase
+        session_types = (
+            df[session_type_col]
+            .astype(str)
+            .str.strip()
+            .str.upper()
+        )
+        
+        print("\n📊 SessionType value counts BEFORE filtering:")
+        print(session_types.value_counts(dropna=False).to_string())
+        print()
+        
+        rules.append(('Non-SURVEILLANCE excluded', session_type_col,
+                      lambda _: session_types == 'SURVEILLANCE'))
+    
+    if session_ids is not None and 'SessionID' in df.columns:
+        rules.append(('Without a surveillance session', 'SessionID',
+                      lambda ids: ids.isin(session_ids)))
+    
+    if not rules:
         return df
-
-    # Normalize values: string, strip, uppercase
-    df = df.copy()
-    df[session_type_col] = (
-        df[session_type_col]
-        .astype(str)
-        .str.strip()
-        .str.upper()
-    )
-
+    
     initial_count = len(df)
-
-    print("\n📊 SessionType value counts BEFORE filtering:")
-    print(df[session_type_col].value_counts(dropna=False).to_string())
-    print()
-
-    # Keep only SURVEILLANCE
-    df_filtered = df[df[session_type_col] == 'SURVEILLANCE'].copy()
+    
+    # Keep only SURVEILLANCE (and matched sessions) in a single pass
+    df_filtered, removed = apply_row_filters(df, rules)
+    if session_type_col is not None:
+        df_filtered[session_type_col] = 'SURVEILLANCE'
     
     filtered_count = len(df_filtered)
-    excluded_count = initial_count - filtered_count
     
     print("✅ Session filtering:")
     print(f"   - Total sessions: {initial_count}")
     print(f"   - SURVEILLANCE sessions: {filtered_count}")
-    print(f"   - Non-SURVEILLANCE excluded: {excluded_count}")
+    for description, count in removed.items():
+        print(f"   - {description}: {count}")
     
     # Safety: if we accidentally filtered out everything, warn loudly
     if filtered_count == 0:
@@ -685,7 +409,7 @@ def load_surveillance_csv(filepath: str) -> pd.DataFrame:
     """
     Load surveillance CSV and immediately filter for SURVEILLANCE type only
     """
-    df = pd.read_csv(filepath)
+    df = read_vectorcam_csv(filepath, 'surveillance')
     
     if 'SessionType' in df.columns:
         df = df[df['SessionType'] == 'SURVEILLANCE'].copy()
@@ -3,105 +3,352 @@ Database Module
 Handles SQLite database operations for storing processed data
 """
 import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import logging
-from typing import Optional, List
+from typing import Optional, List, Iterable, Tuple, Dict, Sequence
 from datetime import datetime
 
 import config
+from modules.schema import apply_schema, get_schema
+from modules.timestamps import parse_timestamps
+from modules.aggregates import AGGREGATE_DIMENSIONS, ensure_aggregates, mark_touched, refresh_aggregates
 
 logger = logging.getLogger(__name__)
 
 
+# Applied to every read-write connection. WAL lets readers (the dashboard)
+# run while the pipeline writes; with WAL, synchronous=NORMAL only risks the
+# last commits on power loss, never corruption. journal_mode is stored in the
+# file, the others last for the connection.
+CONNECTION_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', config.SQLITE_MMAP_SIZE),
+    ('cache_size', -config.SQLITE_CACHE_SIZE_KB),  # negative = KiB
+    ('temp_store', 'MEMORY'),
+]
+
+# Read-only connections skip the write settings and refuse writes
+READ_ONLY_PRAGMAS = [
+    ('query_only', 'ON'),
+    ('mmap_size', config.SQLITE_MMAP_SIZE),
+    ('cache_size', -config.SQLITE_CACHE_SIZE_KB),
+    ('temp_store', 'MEMORY'),
+]
+
+
+class ConnectionManager:
+    """
+    Hands out one tuned SQLite connection per thread and reuses it
+
+    sqlite3 connections belong to the thread that uses them, so each thread
+    gets its own, opened (and PRAGMA-configured) on its first call and
+    returned again on every later one. close() closes all of them.
+    """
+    
+    def __init__(self, db_path: Path, read_only: bool = False):
+        """
+        Initialize ConnectionManager
+        
+        Args:
+            db_path: SQLite database file
+            read_only: Open connections with mode=ro (the file must exist)
+        """
+        self.db_path = Path(db_path)
+        self.read_only = read_only
+        self.opened = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+    
+    def _open(self) -> sqlite3.Connection:
+        """Open and configure a new connection"""
+        # check_same_thread=False only so close() may run on another thread;
+        # each connection is still used by the thread that opened it
+        if self.read_only:
+            conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True,
+                                   check_same_thread=False)
+            pragmas = READ_ONLY_PRAGMAS
+        else:
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            pragmas = CONNECTION_PRAGMAS
+        for name, value in pragmas:
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+    
+    def get(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+                self.opened += 1
+            logger.info(f"Connected to database: {self.db_path}" + (" (read-only)" if self.read_only else ""))
+        return conn
+    
+    def close(self) -> int:
+        """
+        Close every connection handed out; threads reconnect on their next call
+        
+        Returns:
+            Number of connections closed
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+        return len(connections)
+
+
+# Data tables as declared by create_tables(). The loaders upsert into these
+# instead of replacing them, so keys and indexes survive every load.
+TABLE_DDL = {
+    'surveillance_sessions': """
+        CREATE TABLE IF NOT EXISTS {table} (
+            ID INTEGER PRIMARY KEY,
+            SessionID INTEGER,
+            SessionFrontendID TEXT,
+            SessionHouseNumber TEXT,
+            SessionCollectorTitle TEXT,
+            SessionCollectorName TEXT,
+            SessionCollectionDate TEXT,
+            SessionCollectionMethod TEXT,
+            SessionSpecimenCondition TEXT,
+            SessionNotes TEXT,
+            NumPeopleSleptInHouse INTEGER,
+            WasIrsConducted TEXT,
+            MonthsSinceIrs REAL,
+            NumLlinsAvailable INTEGER,
+            LlinType TEXT,
+            LlinBrand TEXT,
+            NumPeopleSleptUnderLlin INTEGER,
+            SiteID INTEGER,
+            SiteDistrict TEXT,
+            SiteSubCounty TEXT,
+            SiteParish TEXT,
+            SiteSentinelSite TEXT,
+            SiteHealthCenter TEXT,
+            ProgramID INTEGER,
+            ProgramName TEXT,
+            ProgramCountry TEXT,
+            CreatedAt TEXT,
+            UpdatedAt TEXT,
+            SessionCollectionDateEpoch INTEGER,
+            year_month TEXT,
+            ImportedAt TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+    # A specimen is imaged more than once; each image is its own row
+    'specimens': """
+        CREATE TABLE IF NOT EXISTS {table} (
+            SpecimenID TEXT NOT NULL,
+            SessionID INTEGER,
+            Species TEXT,
+            Sex TEXT,
+            AbdomenStatus TEXT,
+            CapturedAt TEXT,
+            ImageID INTEGER,
+            ImageUrl TEXT,
+            SessionCollectionMethod TEXT,
+            SiteDistrict TEXT,
+            SiteSubCounty TEXT,
+            ProgramCountry TEXT,
+            CapturedAtEpoch INTEGER,
+            year_month TEXT,
+            ImportedAt TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (SpecimenID, ImageID),
+            FOREIGN KEY (SessionID) REFERENCES surveillance_sessions (SessionID)
+        )
+    """,
+}
+
+# Upsert key of each data table (must match the PRIMARY KEY above)
+TABLE_KEYS = {
+    'surveillance_sessions': ('ID',),
+    'specimens': ('SpecimenID', 'ImageID'),
+}
+
+# Date column of each data table. The loader derives from it an integer
+# epoch column (<column>Epoch, seconds UTC) and a 'year_month' key (YYYY-MM),
+# so month and date-range filters are index range scans instead of
+# strftime() or string comparisons over every stored timestamp.
+TABLE_DATE_COLUMNS = {
+    'surveillance_sessions': 'SessionCollectionDate',
+    'specimens': 'CapturedAt',
+}
+
+# Secondary indexes: (name, columns)
+TABLE_INDEXES = {
+    'surveillance_sessions': [
+        ('idx_sessions_date', ('SessionCollectionDate',)),
+        ('idx_sessions_method', ('SessionCollectionMethod',)),
+        ('idx_sessions_session', ('SessionID',)),
+        ('idx_sessions_epoch', ('SessionCollectionDateEpoch',)),
+        ('idx_sessions_month', ('year_month', 'SiteDistrict', 'SessionCollectionMethod')),
+    ],
+    'specimens': [
+        ('idx_specimens_species', ('Species',)),
+        ('idx_specimens_session', ('SessionID',)),
+        ('idx_specimens_epoch', ('CapturedAtEpoch',)),
+        ('idx_specimens_month', ('year_month', 'SiteDistrict', 'SessionCollectionMethod')),
+    ],
+}
+
+# Registry (modules.schema) data type stored in each table
+TABLE_DATA_TYPES = {
+    'surveillance_sessions': 'surveillance',
+    'specimens': 'specimens',
+}
+
+# SQLite column type for each registry column kind
+KIND_SQL_TYPES = {
+    'int': 'INTEGER',
+    'float': 'REAL',
+    'bool': 'INTEGER',
+    'string': 'TEXT',
+    'category': 'TEXT',
+    'timestamp': 'TEXT',
+}
+
+
+def _quote(name: str) -> str:
+    """Quote an SQL identifier"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_type(series: pd.Series) -> str:
+    """SQLite column type for a column the registry does not know"""
+    if pd.api.types.is_bool_dtype(series.dtype) or pd.api.types.is_integer_dtype(series.dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(series.dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def date_key_columns(table: str) -> Dict[str, str]:
+    """Derived date columns of a data table -> SQL type"""
+    return {f"{TABLE_DATE_COLUMNS[table]}Epoch": 'INTEGER', 'year_month': 'TEXT'}
+
+
+def add_date_keys(table: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add a data table's epoch and year_month columns, derived from its date column
+    
+    Args:
+        table: Key of TABLE_DATE_COLUMNS
+        df: Rows to load
+        
+    Returns:
+        DataFrame with the derived columns (unchanged if the date column is absent)
+    """
+    date_col = TABLE_DATE_COLUMNS[table]
+    if date_col not in df.columns:
+        return df
+    
+    dates = parse_timestamps(df[date_col])
+    valid = dates.notna().to_numpy()
+    nanos = dates.dt.tz_convert(None).to_numpy().view(np.int64)
+    epoch = pd.array(np.where(valid, nanos // 10**9, 0), dtype='Int64')
+    epoch[~valid] = pd.NA
+    
+    # Format each distinct month once
+    codes, months = pd.factorize(dates.dt.year * 100 + dates.dt.month)
+    labels = np.array([f"{int(m) // 100:04d}-{int(m) % 100:02d}" for m in months] + [None], dtype=object)
+    
+    return df.assign(**{f"{date_col}Epoch": epoch, 'year_month': labels[codes]})
+
+
+def epoch_seconds(value) -> int:
+    """
+    Epoch seconds (UTC) of a date filter value
+    
+    Args:
+        value: Date/datetime string or Timestamp; naive values are taken as UTC
+        
+    Returns:
+        Seconds since 1970-01-01 UTC
+    """
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    return ts.value // 10**9
+
+
+def _sql_rows(df: pd.DataFrame) -> List[tuple]:
+    """
+    Convert a frame to parameter tuples for sqlite3
+
+    Values match what DataFrame.to_sql stored before: timestamps as
+    'YYYY-MM-DD HH:MM:SS+00:00' text, booleans as 0/1, missing values as NULL.
+    """
+    columns = []
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            # Timestamps repeat (session columns on every specimen): format each distinct value once
+            codes, uniques = pd.factorize(values)
+            text = np.array([ts.isoformat(sep=' ') for ts in uniques.to_pydatetime()] + [None], dtype=object)
+            columns.append(text[codes])
+        else:
+            converted = values.astype(object)
+            columns.append(converted.where(values.notna(), None).to_numpy())
+    return list(zip(*columns))
+
+
+# One metric row, replacing the stored row with the same (year_month, metric_name, category)
+METRIC_INSERT_SQL = """
+    INSERT OR REPLACE INTO monthly_metrics
+    (year_month, metric_name, metric_value, metric_json, category, calculated_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
 class VectorInsightDB:
     """Manages SQLite database for VectorInsight data"""
     
-    def __init__(self, db_path: Optional[Path] = None):
+    def __init__(self, db_path: Optional[Path] = None, read_only: bool = False):
         """
         Initialize database connection
         
         Args:
             db_path: Path to SQLite database file. If None, uses config.DB_PATH
+            read_only: Open read-only connections (for the dashboard); writes raise
         """
         self.db_path = db_path or config.DB_PATH
-        self.connection = None
+        self.read_only = read_only
+        self.connections = ConnectionManager(self.db_path, read_only=read_only)
         
     def connect(self):
-        """Establish database connection"""
+        """Database connection of the calling thread (reused across calls)"""
         try:
-            self.connection = sqlite3.connect(str(self.db_path))
-            logger.info(f"Connected to database: {self.db_path}")
-            return self.connection
+            return self.connections.get()
         except sqlite3.Error as e:
             logger.error(f"Failed to connect to database: {str(e)}")
             raise
     
     def close(self):
-        """Close database connection"""
-        if self.connection:
-            self.connection.close()
-            logger.info("Database connection closed")
+        """Close all database connections"""
+        closed = self.connections.close()
+        if closed:
+            logger.info(f"Database connection(s) closed: {closed}")
     
     def create_tables(self):
         """Create database tables if they don't exist"""
         with self.connect() as conn:
             cursor = conn.cursor()
             
-            # Surveillance Sessions Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS surveillance_sessions (
-                    ID INTEGER PRIMARY KEY,
-                    SessionID INTEGER,
-                    SessionFrontendID TEXT,
-                    SessionHouseNumber TEXT,
-                    SessionCollectorTitle TEXT,
-                    SessionCollectorName TEXT,
-                    SessionCollectionDate TEXT,
-                    SessionCollectionMethod TEXT,
-                    SessionSpecimenCondition TEXT,
-                    SessionNotes TEXT,
-                    NumPeopleSleptInHouse INTEGER,
-                    WasIrsConducted TEXT,
-                    MonthsSinceIrs INTEGER,
-                    NumLlinsAvailable INTEGER,
-                    LlinType TEXT,
-                    LlinBrand TEXT,
-                    NumPeopleSleptUnderLlin INTEGER,
-                    SiteID INTEGER,
-                    SiteDistrict TEXT,
-                    SiteSubCounty TEXT,
-                    SiteParish TEXT,
-                    SiteSentinelSite TEXT,
-                    SiteHealthCenter TEXT,
-                    ProgramID INTEGER,
-                    ProgramName TEXT,
-                    ProgramCountry TEXT,
-                    CreatedAt TEXT,
-                    UpdatedAt TEXT,
-                    ImportedAt TEXT DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            # Data tables, with their keys and indexes
+            for table in TABLE_DDL:
+                self._ensure_table(cursor, table)
             
-            # Specimens Table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS specimens (
-                    SpecimenID TEXT PRIMARY KEY,
-                    SessionID INTEGER,
-                    Species TEXT,
-                    Sex TEXT,
-                    AbdomenStatus TEXT,
-                    CapturedAt TEXT,
-                    ImageID INTEGER,
-                    ImageUrl TEXT,
-                    SessionCollectionMethod TEXT,
-                    SiteDistrict TEXT,
-                    SiteSubCounty TEXT,
-                    ProgramCountry TEXT,
-                    ImportedAt TEXT DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (SessionID) REFERENCES surveillance_sessions (SessionID)
-                )
-            """)
+            # Pre-aggregated counts (see modules.aggregates)
+            ensure_aggregates(cursor)
             
             # Monthly Metrics Table (for pre-calculated aggregations)
             cursor.execute("""
@@ -117,27 +364,21 @@ class VectorInsightDB:
                 )
             """)
             
-            # Create indexes for better query performance
+            # Data months whose metrics are stored in monthly_metrics, the
+            # metrics code that computed them and the sums the all-time
+            # rollup is merged from (see modules.metric_partitions)
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_sessions_date 
-                ON surveillance_sessions(SessionCollectionDate)
+                CREATE TABLE IF NOT EXISTS metric_partitions (
+                    year_month TEXT PRIMARY KEY,
+                    code_version TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    calculated_at TEXT NOT NULL
+                )
             """)
             
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_sessions_method 
-                ON surveillance_sessions(SessionCollectionMethod)
-            """)
+            # Extraction watermarks (high-water mark per API endpoint)
+            self._create_watermark_table(cursor)
             
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_specimens_species 
-                ON specimens(Species)
-            """)
-            
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_specimens_session 
-                ON specimens(SessionID)
-            """)
-
             cursor.execute("""
                 CREATE VIEW IF NOT EXISTS Surveillance AS
                 SELECT
@@ -185,31 +426,298 @@ class VectorInsightDB:
             conn.commit()
             logger.info("Database tables created successfully")
     
-    def insert_surveillance_data(self, df: pd.DataFrame, replace: bool = True):
+    def _create_watermark_table(self, cursor):
+        """Create the extraction watermark table if it doesn't exist"""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_watermarks (
+                endpoint TEXT PRIMARY KEY,
+                watermark TEXT NOT NULL,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    def get_watermark(self, endpoint: str) -> Optional[str]:
         """
-        Insert surveillance data into database
+        Get the extraction high-water mark for an endpoint
         
         Args:
-            df: DataFrame with surveillance data
-            replace: If True, replaces existing data. If False, appends.
+            endpoint: Endpoint name (e.g. 'surveillance', 'specimens')
+            
+        Returns:
+            ISO-8601 timestamp of the newest record seen, or None on first run
         """
         with self.connect() as conn:
-            if_exists = 'replace' if replace else 'append'
-            df.to_sql('surveillance_sessions', conn, if_exists=if_exists, index=False)
-            logger.info(f"Inserted {len(df)} surveillance records into database")
+            cursor = conn.cursor()
+            self._create_watermark_table(cursor)
+            row = cursor.execute(
+                "SELECT watermark FROM extraction_watermarks WHERE endpoint = ?",
+                (endpoint,)
+            ).fetchone()
+            return row[0] if row else None
     
-    def insert_specimens_data(self, df: pd.DataFrame, replace: bool = True):
+    def set_watermark(self, endpoint: str, watermark: str):
         """
-        Insert specimens data into database
+        Store the extraction high-water mark for an endpoint
         
         Args:
-            df: DataFrame with specimens data
-            replace: If True, replaces existing data. If False, appends.
+            endpoint: Endpoint name (e.g. 'surveillance', 'specimens')
+            watermark: ISO-8601 timestamp of the newest record seen
         """
         with self.connect() as conn:
-            if_exists = 'replace' if replace else 'append'
-            df.to_sql('specimens', conn, if_exists=if_exists, index=False)
-            logger.info(f"Inserted {len(df)} specimen records into database")
+            cursor = conn.cursor()
+            self._create_watermark_table(cursor)
+            cursor.execute("""
+                INSERT OR REPLACE INTO extraction_watermarks (endpoint, watermark, updated_at)
+                VALUES (?, ?, ?)
+            """, (endpoint, watermark, datetime.now().isoformat()))
+            conn.commit()
+        logger.info(f"Watermark for {endpoint} set to {watermark}")
+    
+    @contextmanager
+    def _transaction(self):
+        """
+        Cursor inside an explicit BEGIN IMMEDIATE ... COMMIT
+        
+        The write lock is taken up front, and the transaction is rolled back
+        if the block raises.
+        """
+        conn = self.connect()
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None  # no implicit transactions inside the block
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            yield cursor
+            cursor.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            conn.isolation_level = isolation_level
+    
+    def _table_columns(self, cursor, table: str) -> Dict[str, int]:
+        """Column name -> position in the primary key (0 if not part of it)"""
+        return {row[1]: row[5] for row in cursor.execute(f"PRAGMA main.table_info({_quote(table)})")}
+    
+    def _ensure_table(self, cursor, table: str, columns: Optional[Dict[str, str]] = None):
+        """
+        Create a data table as declared, or bring an existing one up to date
+        
+        Tables written by older versions with to_sql(if_exists='replace') have
+        no primary key; they are rebuilt once under the declared schema with
+        their rows copied over. Registry columns (and any given extra columns)
+        missing from the table are added, and the declared indexes created.
+        
+        Args:
+            cursor: Cursor on an open connection
+            table: Key of TABLE_DDL
+            columns: Extra column -> SQL type to add if missing (e.g. from a frame being loaded)
+        """
+        existing = self._table_columns(cursor, table)
+        key = TABLE_KEYS[table]
+        
+        if not existing:
+            cursor.execute(TABLE_DDL[table].format(table=_quote(table)))
+        elif tuple(col for col, _ in sorted(
+                ((col, pk) for col, pk in existing.items() if pk), key=lambda item: item[1])) != key:
+            self._rebuild_table(cursor, table, existing)
+        
+        wanted = {
+            col: KIND_SQL_TYPES[kind]
+            for col, kind in get_schema(TABLE_DATA_TYPES[table]).items()
+        }
+        wanted.update(date_key_columns(table))
+        wanted.update(columns or {})
+        existing = self._table_columns(cursor, table)
+        for col, sql_type in wanted.items():
+            if col not in existing:
+                cursor.execute(f"ALTER TABLE main.{_quote(table)} ADD COLUMN {_quote(col)} {sql_type}")
+        
+        for index_name, index_columns in TABLE_INDEXES[table]:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS main.{_quote(index_name)} "
+                f"ON {_quote(table)}({', '.join(_quote(col) for col in index_columns)})"
+            )
+    
+    def _rebuild_table(self, cursor, table: str, existing: Dict[str, int]):
+        """Recreate a table under its declared schema, keeping its columns and rows"""
+        logger.info(f"Rebuilding {table} with primary key {TABLE_KEYS[table]}")
+        staging = f"{table}__rebuild"
+        declared = TABLE_DDL[table].format(table=_quote(staging))
+        
+        cursor.execute(f"DROP TABLE IF EXISTS main.{_quote(staging)}")
+        cursor.execute(declared)
+        declared_columns = self._table_columns(cursor, staging)
+        for col in existing:
+            if col not in declared_columns:
+                cursor.execute(f"ALTER TABLE main.{_quote(staging)} ADD COLUMN {_quote(col)}")
+        
+        quoted = ', '.join(_quote(col) for col in existing)
+        # Rows with a missing key cannot be addressed by later upserts
+        not_null = ' AND '.join(f"{_quote(col)} IS NOT NULL" for col in TABLE_KEYS[table])
+        cursor.execute(
+            f"INSERT OR REPLACE INTO main.{_quote(staging)} ({quoted}) "
+            f"SELECT {quoted} FROM main.{_quote(table)} WHERE {not_null}"
+        )
+        
+        # Views on the table (Surveillance, Specimens) must keep pointing at its name
+        cursor.execute("PRAGMA legacy_alter_table=ON")
+        cursor.execute(f"DROP TABLE main.{_quote(table)}")
+        cursor.execute(f"ALTER TABLE main.{_quote(staging)} RENAME TO {_quote(table)}")
+        cursor.execute("PRAGMA legacy_alter_table=OFF")
+    
+    def upsert_table(self, table: str, df: pd.DataFrame, delete_missing: bool = False) -> Dict[str, int]:
+        """
+        Insert new rows and update changed rows of a data table in one transaction
+        
+        Rows are matched on TABLE_KEYS[table]. Rows whose values are all
+        unchanged are not written. The table keeps its declared schema,
+        primary key and indexes; frame columns it lacks are added. The epoch
+        and year_month columns are derived from the table's date column.
+        The aggregate groups of every inserted, changed or deleted row are
+        queued for refresh_aggregates().
+        
+        Args:
+            table: 'surveillance_sessions' or 'specimens'
+            df: Rows to load
+            delete_missing: Also delete table rows whose key is not in df,
+                so the table mirrors df
+            
+        Returns:
+            Counts: inserted, updated, unchanged, deleted, skipped (missing
+            key or duplicate key in df) and rows (table size afterwards)
+        """
+        key = list(TABLE_KEYS[table])
+        missing_key = [col for col in key if col not in df.columns]
+        if missing_key:
+            raise ValueError(f"Cannot load {table}: key column(s) {missing_key} missing")
+        
+        has_key = df[key].notna().all(axis=1)
+        if not has_key.all():
+            logger.warning(f"Skipping {int((~has_key).sum())} {table} rows with a missing {'/'.join(key)}")
+            df = df[has_key]
+        df = add_date_keys(table, df)
+        
+        columns = list(df.columns)
+        values = [col for col in columns if col not in key]
+        schema = get_schema(TABLE_DATA_TYPES[table])
+        column_types = {
+            col: KIND_SQL_TYPES[schema[col]] if col in schema else _sql_type(df[col])
+            for col in columns
+        }
+        rows = _sql_rows(df)
+        
+        quoted = ', '.join(_quote(col) for col in columns)
+        target = f"main.{_quote(table)}"
+        match = ' AND '.join(f"t.{_quote(col)} = s.{_quote(col)}" for col in key)
+        changed = ' OR '.join(f"t.{_quote(col)} IS NOT s.{_quote(col)}" for col in values) or '0'
+        key_columns = ', '.join(_quote(col) for col in key)
+        touched = f"{target} AS t JOIN temp.upsert_changed c ON " + ' AND '.join(
+            f"t.{_quote(col)} = c.{_quote(col)}" for col in key
+        )
+        
+        with self._transaction() as cursor:
+            self._ensure_table(cursor, table, column_types)
+            ensure_aggregates(cursor)
+            
+            # Stage the frame in a temp table with the target's column types
+            cursor.execute("DROP TABLE IF EXISTS temp.upsert_staging")
+            cursor.execute(f"CREATE TEMP TABLE upsert_staging AS SELECT {quoted} FROM {target} WHERE 0")
+            cursor.executemany(
+                f"INSERT INTO temp.upsert_staging ({quoted}) VALUES ({', '.join('?' * len(columns))})",
+                rows
+            )
+            cursor.execute(f"CREATE INDEX temp.upsert_staging_key ON upsert_staging ({key_columns})")
+            duplicates = cursor.execute(
+                f"DELETE FROM temp.upsert_staging WHERE rowid NOT IN "
+                f"(SELECT MAX(rowid) FROM temp.upsert_staging GROUP BY {key_columns})"
+            ).rowcount
+            if duplicates:
+                logger.warning(f"{duplicates} {table} rows repeat a key; keeping the last of each")
+            
+            # Keys of the new and changed rows
+            cursor.execute("DROP TABLE IF EXISTS temp.upsert_changed")
+            cursor.execute(
+                f"CREATE TEMP TABLE upsert_changed AS "
+                f"SELECT {', '.join(f's.{_quote(col)}' for col in key)}, t.rowid IS NULL AS is_new "
+                f"FROM temp.upsert_staging s LEFT JOIN {target} t ON {match} "
+                f"WHERE t.rowid IS NULL OR {changed}"
+            )
+            changed_rows, inserted = cursor.execute(
+                "SELECT COUNT(*), COALESCE(SUM(is_new), 0) FROM temp.upsert_changed"
+            ).fetchone()
+            updated = changed_rows - inserted
+            
+            if values:
+                assignments = ', '.join(f"{_quote(col)} = excluded.{_quote(col)}" for col in values)
+                differs = ' OR '.join(f"{_quote(table)}.{_quote(col)} IS NOT excluded.{_quote(col)}" for col in values)
+                on_conflict = f"DO UPDATE SET {assignments}, ImportedAt = CURRENT_TIMESTAMP WHERE {differs}"
+            else:
+                on_conflict = "DO NOTHING"
+            
+            # Aggregate groups of changed rows are queued as they were before
+            # the write and as they are after it (a row may move day or session)
+            mark_touched(cursor, table, touched)
+            # 'WHERE true' lets SQLite parse ON CONFLICT after INSERT ... SELECT
+            cursor.execute(
+                f"INSERT INTO {target} ({quoted}) SELECT {quoted} FROM temp.upsert_staging WHERE true "
+                f"ON CONFLICT ({key_columns}) {on_conflict}"
+            )
+            mark_touched(cursor, table, touched)
+            
+            deleted = 0
+            if delete_missing:
+                missing = f"NOT EXISTS (SELECT 1 FROM temp.upsert_staging s WHERE {match})"
+                mark_touched(cursor, table, f"{target} AS t", missing)
+                deleted = cursor.execute(f"DELETE FROM {target} AS t WHERE {missing}").rowcount
+            
+            total = cursor.execute(f"SELECT COUNT(*) FROM {target}").fetchone()[0]
+            cursor.execute("DROP TABLE temp.upsert_staging")
+            cursor.execute("DROP TABLE temp.upsert_changed")
+        
+        staged = len(rows) - duplicates
+        counts = {
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': staged - inserted - updated,
+            'deleted': deleted,
+            'skipped': int((~has_key).sum()) + duplicates,
+            'rows': total,
+        }
+        logger.info(
+            f"Loaded {table}: {counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['deleted']} deleted ({total} rows)"
+        )
+        return counts
+    
+    def insert_surveillance_data(self, df: pd.DataFrame, replace: bool = True) -> Dict[str, int]:
+        """
+        Load surveillance data into the database by upsert on ID
+        
+        Args:
+            df: DataFrame with surveillance data
+            replace: If True, the table ends up holding exactly df's rows
+                (rows missing from df are deleted). If False, only inserts/updates.
+            
+        Returns:
+            Counts from upsert_table
+        """
+        return self.upsert_table('surveillance_sessions', df, delete_missing=replace)
+    
+    def insert_specimens_data(self, df: pd.DataFrame, replace: bool = True) -> Dict[str, int]:
+        """
+        Load specimens data into the database by upsert on (SpecimenID, ImageID)
+        
+        Args:
+            df: DataFrame with specimens data
+            replace: If True, the table ends up holding exactly df's rows
+                (rows missing from df are deleted). If False, only inserts/updates.
+            
+        Returns:
+            Counts from upsert_table
+        """
+        return self.upsert_table('specimens', df, delete_missing=replace)
     
     def insert_metric(self, year_month: str, metric_name: str, metric_value: float, 
                      metric_json: Optional[str] = None, category: Optional[str] = None):
@@ -223,15 +731,104 @@ class VectorInsightDB:
             metric_json: Optional JSON string with detailed data
             category: Optional category for grouping metrics
         """
-        with self.connect() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO monthly_metrics 
-                (year_month, metric_name, metric_value, metric_json, category, calculated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (year_month, metric_name, metric_value, metric_json, category, 
-                  datetime.now().isoformat()))
-            conn.commit()
+        self.insert_metrics(year_month, [(metric_name, metric_value, metric_json, category)])
+    
+    def insert_metrics(self, year_month: str,
+                       rows: Iterable[Tuple[str, Optional[float], Optional[str], Optional[str]]],
+                       replace: bool = False) -> int:
+        """
+        Insert or update many metrics in a single transaction
+        
+        Args:
+            year_month: Year-month in YYYY-MM format
+            rows: (metric_name, metric_value, metric_json, category) tuples,
+                e.g. from metrics_calculator.flatten_metrics
+            replace: If True, first delete the month's other metrics, so
+                metrics no longer calculated do not linger
+            
+        Returns:
+            Number of metric rows written
+        """
+        calculated_at = datetime.now().isoformat()
+        params = [
+            (year_month, metric_name, metric_value, metric_json, category, calculated_at)
+            for metric_name, metric_value, metric_json, category in rows
+        ]
+        
+        conn = self.connect()
+        # The connection context commits once at the end, or rolls back on error
+        with conn:
+            if replace:
+                conn.execute("DELETE FROM monthly_metrics WHERE year_month = ?", (year_month,))
+            conn.executemany(METRIC_INSERT_SQL, params)
+        return len(params)
+    
+    def get_stale_metric_months(self, code_version: str) -> Tuple[List[str], bool]:
+        """
+        Data months whose stored metrics are out of date
+        
+        Loads queue the months of every row they insert, change or delete
+        (see aggregates.DIRTY_KEYS); a month with no rows left is queued too.
+        
+        Args:
+            code_version: Version of the metrics code now in use
+            
+        Returns:
+            (queued months, whether every month must be recalculated because
+            no partition is stored yet or one was calculated by other code)
+        """
+        months = self.query(
+            "SELECT group_key FROM aggregate_dirty WHERE aggregate = 'monthly_metrics' ORDER BY group_key"
+        )['group_key'].tolist()
+        versions = self.query("SELECT DISTINCT code_version FROM metric_partitions")['code_version'].tolist()
+        return months, versions != [code_version]
+    
+    def replace_metric_partitions(self, partitions: Dict[str, Tuple[List[tuple], str]], code_version: str,
+                                  months: Optional[Iterable[str]] = None) -> int:
+        """
+        Store recalculated month partitions of monthly_metrics in one transaction
+        
+        Each replaced month loses all of its previous metric rows, and is
+        removed from the queue of stale months.
+        
+        Args:
+            partitions: (metric rows as flatten_metrics tuples, rollup state
+                JSON) per data month
+            code_version: Version of the metrics code that calculated them
+            months: Months being replaced: those in partitions and those
+                left without rows (which are only deleted). If None, every
+                row of monthly_metrics is replaced by the partitions.
+            
+        Returns:
+            Number of metric rows written
+        """
+        calculated_at = datetime.now().isoformat()
+        written = 0
+        with self._transaction() as cursor:
+            if months is None:
+                cursor.execute("DELETE FROM monthly_metrics")
+                cursor.execute("DELETE FROM metric_partitions")
+                cursor.execute("DELETE FROM aggregate_dirty WHERE aggregate = 'monthly_metrics'")
+            else:
+                for month in set(months) | set(partitions):
+                    cursor.execute("DELETE FROM monthly_metrics WHERE year_month = ?", (month,))
+                    cursor.execute("DELETE FROM metric_partitions WHERE year_month = ?", (month,))
+                    cursor.execute(
+                        "DELETE FROM aggregate_dirty WHERE aggregate = 'monthly_metrics' AND group_key = ?",
+                        (month,)
+                    )
+            for month, (rows, state) in partitions.items():
+                cursor.executemany(METRIC_INSERT_SQL, [
+                    (month, metric_name, metric_value, metric_json, category, calculated_at)
+                    for metric_name, metric_value, metric_json, category in rows
+                ])
+                cursor.execute(
+                    "INSERT INTO metric_partitions (year_month, code_version, state, calculated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (month, code_version, state, calculated_at)
+                )
+                written += len(rows)
+        return written
     
     def query(self, sql: str, params: tuple = None) -> pd.DataFrame:
         """
@@ -250,34 +847,41 @@ class VectorInsightDB:
             return pd.read_sql_query(sql, conn)
     
     def get_surveillance_data(self, start_date: Optional[str] = None, 
-                             end_date: Optional[str] = None) -> pd.DataFrame:
+                             end_date: Optional[str] = None,
+                             year_month: Optional[str] = None) -> pd.DataFrame:
         """
         Get surveillance data with optional date filtering
         
         Args:
             start_date: Optional start date (YYYY-MM-DD)
             end_date: Optional end date (YYYY-MM-DD)
+            year_month: Optional collection month (YYYY-MM)
             
         Returns:
-            DataFrame with surveillance data
+            DataFrame with surveillance data, typed per the schema registry
+            (timestamps as tz-aware UTC)
         """
         sql = "SELECT * FROM surveillance_sessions WHERE 1=1"
         params = []
         
         if start_date:
-            sql += " AND SessionCollectionDate >= ?"
-            params.append(start_date)
+            sql += " AND SessionCollectionDateEpoch >= ?"
+            params.append(epoch_seconds(start_date))
         if end_date:
-            sql += " AND SessionCollectionDate <= ?"
-            params.append(end_date)
+            sql += " AND SessionCollectionDateEpoch <= ?"
+            params.append(epoch_seconds(end_date))
+        if year_month:
+            sql += " AND year_month = ?"
+            params.append(year_month)
         
         sql += " ORDER BY SessionCollectionDate DESC"
         
-        return self.query(sql, tuple(params) if params else None)
+        return apply_schema(self.query(sql, tuple(params) if params else None), 'surveillance')
     
     def get_specimens_data(self, start_date: Optional[str] = None,
                           end_date: Optional[str] = None,
-                          species: Optional[str] = None) -> pd.DataFrame:
+                          species: Optional[str] = None,
+                          year_month: Optional[str] = None) -> pd.DataFrame:
         """
         Get specimens data with optional filtering
         
@@ -285,26 +889,31 @@ class VectorInsightDB:
             start_date: Optional start date (YYYY-MM-DD)
             end_date: Optional end date (YYYY-MM-DD)
             species: Optional species filter
+            year_month: Optional capture month (YYYY-MM)
             
         Returns:
-            DataFrame with specimens data
+            DataFrame with specimens data, typed per the schema registry
+            (timestamps as tz-aware UTC)
         """
         sql = "SELECT * FROM specimens WHERE 1=1"
         params = []
         
         if start_date:
-            sql += " AND CapturedAt >= ?"
-            params.append(start_date)
+            sql += " AND CapturedAtEpoch >= ?"
+            params.append(epoch_seconds(start_date))
         if end_date:
-            sql += " AND CapturedAt <= ?"
-            params.append(end_date)
+            sql += " AND CapturedAtEpoch <= ?"
+            params.append(epoch_seconds(end_date))
+        if year_month:
+            sql += " AND year_month = ?"
+            params.append(year_month)
         if species:
             sql += " AND Species = ?"
             params.append(species)
         
         sql += " ORDER BY CapturedAt DESC"
         
-        return self.query(sql, tuple(params) if params else None)
+        return apply_schema(self.query(sql, tuple(params) if params else None), 'specimens')
     
     def get_metrics(self, year_month: Optional[str] = None) -> pd.DataFrame:
         """
@@ -326,6 +935,111 @@ class VectorInsightDB:
         sql += " ORDER BY calculated_at DESC"
         
         return self.query(sql, tuple(params) if params else None)
+    
+    def refresh_aggregates(self) -> Dict[str, int]:
+        """
+        Rebuild the aggregate groups (days or sessions) touched since the last refresh
+        
+        Returns:
+            Groups (days or sessions) refreshed per aggregate table
+        """
+        with self._transaction() as cursor:
+            for table in TABLE_DDL:
+                self._ensure_table(cursor, table)
+            ensure_aggregates(cursor)
+            refreshed = refresh_aggregates(cursor)
+        logger.info(f"Refreshed aggregates: {refreshed}")
+        return refreshed
+    
+    def _aggregate_query(self, aggregate: str, measures: str, group_by: Sequence[str],
+                         start_date: Optional[str], end_date: Optional[str],
+                         conditions: Dict[str, Optional[Sequence[str]]],
+                         extra: Optional[str] = None) -> pd.DataFrame:
+        """Sum an aggregate table over group_by, with optional filters"""
+        dimensions = AGGREGATE_DIMENSIONS[aggregate]
+        unknown = [col for col in group_by if col not in dimensions]
+        if unknown:
+            raise ValueError(f"Cannot group {aggregate} by {unknown} (expected some of {list(dimensions)})")
+        
+        sql = f"SELECT {''.join(f'{col}, ' for col in group_by)}{measures} FROM {aggregate} WHERE 1=1"
+        params = []
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(str(pd.Timestamp(start_date).date()))
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(str(pd.Timestamp(end_date).date()))
+        for col, values in conditions.items():
+            if values:
+                sql += f" AND {col} IN ({', '.join('?' * len(values))})"
+                params.extend(values)
+        if extra:
+            sql += f" AND {extra}"
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}"
+        
+        return self.query(sql, tuple(params) if params else None)
+    
+    def get_daily_counts(self, group_by: Sequence[str] = ('date',),
+                         start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         districts: Optional[Sequence[str]] = None,
+                         methods: Optional[Sequence[str]] = None,
+                         species: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        Specimen counts from daily_counts
+        
+        e.g. species by month: get_daily_counts(['year_month', 'species'])
+        
+        Args:
+            group_by: Columns of daily_counts to group by (empty for one total)
+            start_date: Optional first capture day (YYYY-MM-DD)
+            end_date: Optional last capture day (YYYY-MM-DD), inclusive
+            districts: Optional districts to keep
+            methods: Optional collection methods to keep
+            species: Optional species to keep
+            
+        Returns:
+            DataFrame with the group_by columns and n
+        """
+        return self._aggregate_query(
+            'daily_counts', "SUM(n) AS n", group_by, start_date, end_date,
+            {'district': districts, 'method': methods, 'species': species}
+        )
+    
+    def get_session_counts(self, group_by: Sequence[str] = ('year_month',),
+                           start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           districts: Optional[Sequence[str]] = None,
+                           methods: Optional[Sequence[str]] = None,
+                           psc_only: bool = False) -> pd.DataFrame:
+        """
+        Collections and per-house specimen counts from session_counts
+        
+        e.g. monthly collections: get_session_counts(['year_month']);
+        indoor resting density by district: get_session_counts(['district'], psc_only=True)
+        
+        Args:
+            group_by: Columns of session_counts to group by (empty for one total)
+            start_date: Optional first collection day (YYYY-MM-DD)
+            end_date: Optional last collection day (YYYY-MM-DD), inclusive
+            districts: Optional districts to keep
+            methods: Optional collection methods to keep
+            psc_only: Keep only Pyrethrum Spray Catch collections, as the
+                indoor resting density metrics do
+            
+        Returns:
+            DataFrame with the group_by columns, collections, specimens,
+            anopheles, female, fed, unfed, avg_per_house and avg_anopheles_per_house
+        """
+        measures = (
+            "COUNT(*) AS collections, SUM(total) AS specimens, SUM(anopheles) AS anopheles, "
+            "SUM(female) AS female, SUM(fed) AS fed, SUM(unfed) AS unfed, "
+            "AVG(total) AS avg_per_house, AVG(anopheles) AS avg_anopheles_per_house"
+        )
+        return self._aggregate_query(
+            'session_counts', measures, group_by, start_date, end_date,
+            {'district': districts, 'method': methods},
+            extra="method LIKE '%PSC%'" if psc_only else None
+        )
 
 
 def initialize_database() -> VectorInsightDB:
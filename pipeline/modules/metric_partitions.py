@@ -0,0 +1,459 @@
+"""
+Metric Partitions Module
+Metrics calculated per data month, and the all-time metrics rolled up from them
+"""
+import json
+import logging
+from typing import Dict, Any, Optional, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import config
+from modules.aggregates import FED_STATUSES, UNDATED_MONTH
+from modules.bootstrap import density_intervals
+from modules.metrics_cache import CALCULATOR_CODE_FILES, calculator_version
+from modules.metrics_calculator import MetricsCalculator
+from modules.stage_cache import frame_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+# monthly_metrics holds one partition per data month (collection month for
+# sessions, capture month for specimens; UNDATED_MONTH for rows without a
+# date) and the all-time rollup under ALL_TIME. Indoor resting density is
+# per session: it counts every specimen of the month's PSC sessions, in
+# whichever month the specimen was captured.
+ALL_TIME = 'all'
+
+PARTITION_COLUMNS = {'surveillance': 'CollectionYearMonth', 'specimens': 'CaptureYearMonth'}
+
+# Editing these files (or the bootstrap settings) recalculates every partition
+METRIC_CODE_FILES = [
+    *CALCULATOR_CODE_FILES,
+    config.PROJECT_ROOT / 'modules' / 'metric_partitions.py',
+]
+
+PARTITION_METRICS_SQL = """
+    SELECT p.year_month, p.state, m.category, m.metric_name, m.metric_value, m.metric_json
+    FROM metric_partitions p
+    JOIN monthly_metrics m ON m.year_month = p.year_month
+    ORDER BY p.year_month
+"""
+
+# What the rollup is merged from, cheaply: every rewrite of a partition
+# changes its calculated_at, and edits to its metric rows their count or times
+PARTITIONS_VERSION_SQL = """
+    SELECT p.year_month, p.code_version, p.calculated_at,
+           COUNT(m.id) AS metric_rows, MAX(m.id) AS last_metric, MAX(m.calculated_at) AS metrics_at
+    FROM metric_partitions p
+    LEFT JOIN monthly_metrics m ON m.year_month = p.year_month
+    GROUP BY p.year_month
+    ORDER BY p.year_month
+"""
+
+
+def metrics_code_version() -> str:
+    """Version of the code that calculates the partitions"""
+    return calculator_version(METRIC_CODE_FILES)
+
+
+def month_rows(df: pd.DataFrame, column: str) -> Dict[str, np.ndarray]:
+    """
+    Row positions of each data month
+
+    Args:
+        df: Cleaned frame
+        column: Its year-month column (rows without one go to UNDATED_MONTH)
+
+    Returns:
+        Positions per month
+    """
+    if column not in df.columns:
+        return {UNDATED_MONTH: np.arange(len(df))} if len(df) else {}
+    months = df[column].astype(object).fillna(UNDATED_MONTH).to_numpy()
+    return {str(month): rows for month, rows in pd.Series(months).groupby(months, sort=True).indices.items()}
+
+
+def session_month_rows(surveillance_df: pd.DataFrame, specimens_df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Row positions of the specimens of each data month's sessions
+
+    Specimens are matched to sessions on SessionID and credited to the
+    session's collection month, whatever their own capture month.
+
+    Args:
+        surveillance_df: Cleaned surveillance data
+        specimens_df: Cleaned specimens data
+
+    Returns:
+        Specimen positions per collection month (specimens without a session are left out)
+    """
+    if 'SessionID' not in surveillance_df.columns or 'SessionID' not in specimens_df.columns:
+        return {}
+    column = PARTITION_COLUMNS['surveillance']
+    months = (
+        surveillance_df[column].astype(object).fillna(UNDATED_MONTH)
+        if column in surveillance_df.columns else UNDATED_MONTH
+    )
+    sessions = (
+        pd.DataFrame({'SessionID': surveillance_df['SessionID'], 'month': months})
+        .dropna(subset=['SessionID'])
+        .drop_duplicates()
+    )
+    specimens = pd.DataFrame({'SessionID': specimens_df['SessionID'].to_numpy(), 'row': np.arange(len(specimens_df))})
+    pairs = specimens.merge(sessions, on='SessionID')
+    return {str(month): np.sort(rows.to_numpy()) for month, rows in pairs.groupby('month', sort=True)['row']}
+
+
+def partition_state(surveillance_df: pd.DataFrame, specimens_df: pd.DataFrame,
+                    session_specimens_df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Sums and counts behind a partition's means and distinct counts
+
+    calculate_all_metrics() reports means and distinct counts, which cannot
+    be added across months; these are what they are computed from.
+
+    Args:
+        surveillance_df: The month's surveillance rows
+        specimens_df: The month's specimen rows
+        session_specimens_df: The specimens of the month's sessions
+
+    Returns:
+        JSON-ready dictionary
+    """
+    psc = surveillance_df[
+        surveillance_df['SessionCollectionMethod'].str.contains('PSC', na=False, case=False)
+    ]
+    psc_specimens = session_specimens_df[
+        session_specimens_df['SessionCollectionMethod'].str.contains('PSC', na=False, case=False)
+    ]
+    is_anopheles = psc_specimens['Species'].str.contains('Anopheles', na=False, case=False)
+    # Per PSC session, as calculate_indoor_resting_density() counts them
+    mosquitoes = psc['SessionID'].map(psc_specimens['SessionID'].value_counts()).fillna(0)
+    anopheles = psc['SessionID'].map(psc_specimens.loc[is_anopheles, 'SessionID'].value_counts()).fillna(0)
+
+    # PSC houses counted per (district, month, mosquitoes, anopheles): all the
+    # density intervals need, in a few rows however many houses there are
+    house_counts = (
+        pd.DataFrame({
+            'district': psc['SiteDistrict'].astype(object),
+            'month': psc['CollectionYearMonth'].astype(object) if 'CollectionYearMonth' in psc.columns else None,
+            'mosquitoes': mosquitoes.astype(int),
+            'anopheles': anopheles.astype(int),
+        })
+        .groupby(['district', 'month', 'mosquitoes', 'anopheles'], dropna=False)
+        .size()
+    )
+
+    usage = surveillance_df['LlinUsageRate'] if 'LlinUsageRate' in surveillance_df.columns else None
+    surveillance_nulls = surveillance_df.isnull().sum()
+    specimens_nulls = specimens_df.isnull().sum()
+    return {
+        'collectors': sorted(str(name) for name in surveillance_df['SessionCollectorName'].dropna().unique()),
+        'llins_reported': int(surveillance_df['NumLlinsAvailable'].count()),
+        'llin_usage': None if usage is None else float(usage.sum()),
+        'llin_usage_reported': None if usage is None else int(usage.count()),
+        'psc_mosquitoes': int(mosquitoes.sum()),
+        'psc_anopheles': int(anopheles.sum()),
+        'psc_houses_by_district': {
+            str(k): int(v) for k, v in psc.groupby('SiteDistrict', observed=True).size().items()
+        },
+        'psc_mosquitoes_by_district': {
+            str(k): int(v) for k, v in mosquitoes.groupby(psc['SiteDistrict'], observed=True).sum().items()
+        },
+        # [district, month, mosquitoes, anopheles, houses], for the all-time confidence intervals
+        'psc_house_counts': [
+            [None if pd.isna(district) else str(district), None if pd.isna(month) else str(month),
+             int(n_mosquitoes), int(n_anopheles), int(n)]
+            for (district, month, n_mosquitoes, n_anopheles), n in house_counts.items()
+        ],
+        'surveillance_nulls': {str(k): int(v) for k, v in surveillance_nulls.items()},
+        'specimens_nulls': {str(k): int(v) for k, v in specimens_nulls.items()},
+        'surveillance_cells': int(surveillance_df.size),
+        'specimens_cells': int(specimens_df.size),
+    }
+
+
+def calculate_partitions(surveillance_df: pd.DataFrame, specimens_df: pd.DataFrame,
+                         months: Optional[Iterable[str]] = None) -> Dict[str, Tuple[Dict, Dict]]:
+    """
+    Calculate the metrics of some data months, each from its own rows only
+
+    Args:
+        surveillance_df: Cleaned surveillance data
+        specimens_df: Cleaned specimens data
+        months: Months to calculate. If None, every month with rows
+
+    Returns:
+        (calculate_all_metrics() output, partition_state()) per month;
+        requested months without rows are left out
+    """
+    rows = {
+        'surveillance': month_rows(surveillance_df, PARTITION_COLUMNS['surveillance']),
+        'specimens': month_rows(specimens_df, PARTITION_COLUMNS['specimens']),
+        'session_specimens': session_month_rows(surveillance_df, specimens_df),
+    }
+    if months is None:
+        months = sorted(set(rows['surveillance']) | set(rows['specimens']))
+
+    none = np.array([], dtype=np.intp)
+    partitions = {}
+    for month in months:
+        surveillance = surveillance_df.take(rows['surveillance'].get(month, none))
+        specimens = specimens_df.take(rows['specimens'].get(month, none))
+        if surveillance.empty and specimens.empty:
+            continue
+        session_specimens = specimens_df.take(rows['session_specimens'].get(month, none))
+        # A month may have specimens but no sessions: its rates are NaN
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metrics = MetricsCalculator(surveillance, specimens).calculate_all_metrics()
+        metrics['indoor_density'] = MetricsCalculator(
+            surveillance, session_specimens
+        ).calculate_indoor_resting_density()
+        partitions[month] = (metrics, partition_state(surveillance, specimens, session_specimens))
+    return partitions
+
+
+def stored_partitions(db) -> List[Tuple[Dict, Dict]]:
+    """
+    Load the stored partitions
+
+    Args:
+        db: VectorInsightDB
+
+    Returns:
+        (metric families by stored metric name, partition state) per month,
+        oldest month first
+    """
+    partitions = {}
+    for row in db.query(PARTITION_METRICS_SQL).itertuples(index=False):
+        if row.year_month not in partitions:
+            partitions[row.year_month] = ({}, json.loads(row.state))
+        value = json.loads(row.metric_json) if row.metric_json is not None else row.metric_value
+        partitions[row.year_month][0].setdefault(row.category, {})[row.metric_name] = value
+    return list(partitions.values())
+
+
+def partitions_fingerprint(db) -> str:
+    """
+    Fingerprint of the stored partitions, to key the cached rollup on
+
+    Args:
+        db: VectorInsightDB
+
+    Returns:
+        Hex digest
+    """
+    return frame_fingerprint(db.query(PARTITIONS_VERSION_SQL))
+
+
+def _summed(dicts: Iterable[Dict], order: str = 'count') -> Dict:
+    """
+    Add up label counts
+
+    Args:
+        dicts: Counts per label
+        order: 'count' (largest first, as value_counts), 'label' (as
+            groupby) or None (first seen first)
+    """
+    total = {}
+    for counts in dicts:
+        for label, n in (counts or {}).items():
+            total[label] = total.get(label, 0) + n
+    if order is None:
+        return total
+    if order == 'label':
+        return dict(sorted(total.items()))
+    return dict(sorted(total.items(), key=lambda item: item[1], reverse=True))
+
+
+def _summed_crosstab(crosstabs: Iterable[Dict]) -> Dict:
+    """Add up crosstabs, filling label pairs absent from a month with 0 (as unstack(fill_value=0))"""
+    total = {}
+    for crosstab in crosstabs:
+        for column, counts in (crosstab or {}).items():
+            cells = total.setdefault(column, {})
+            for index, n in counts.items():
+                cells[index] = cells.get(index, 0) + n
+    index = sorted({label for cells in total.values() for label in cells})
+    return {column: {label: total[column].get(label, 0) for label in index} for column in sorted(total)}
+
+
+def _rate(numerator: float, denominator: float, empty: float = 0) -> float:
+    """Percentage, or empty when there is nothing to divide by"""
+    return numerator / denominator * 100 if denominator > 0 else empty
+
+
+def rollup_metrics(partitions: List[Tuple[Dict, Dict]]) -> Dict[str, Any]:
+    """
+    All-time metrics merged from month partitions
+
+    Counts are added up and means and rates are recomputed from the added
+    sums, so the result matches calculate_all_metrics() on all the rows
+    while costing a pass over months x labels instead of over the rows.
+    Partitions count each PSC session's specimens in the session's
+    collection month, so sessions whose specimens were captured in a later
+    month are counted in full, as by the calculator. The density confidence
+    intervals are bootstrapped from the stored PSC house histograms; each
+    group's interval depends only on its own houses, so they equal the
+    calculator's.
+
+    Args:
+        partitions: stored_partitions() output
+
+    Returns:
+        Dictionary of metric families, shaped like calculate_all_metrics()
+    """
+    families = [metrics for metrics, _ in partitions]
+    states = [state for _, state in partitions]
+
+    def values(category: str, name: str) -> List:
+        return [family.get(category, {}).get(name) for family in families]
+
+    def total(category: str, name: str) -> int:
+        return int(sum(value or 0 for value in values(category, name)))
+
+    total_collections = total('summary', 'total_collections')
+    total_specimens = total('summary', 'total_specimens')
+    total_anopheles = total('species', 'total_anopheles')
+
+    date_ranges = [value or {} for value in values('summary', 'date_range')]
+    starts = [dates['start'] for dates in date_ranges if dates.get('start') not in (None, 'NaT')]
+    ends = [dates['end'] for dates in date_ranges if dates.get('end') not in (None, 'NaT')]
+    collections_by_district = _summed(values('geographic', 'collections_by_district'))
+    collections_by_month = _summed(values('temporal', 'collections_by_month'), order='label')
+    collections_by_quarter = {}
+    for month, n in collections_by_month.items():
+        quarter = (int(month[:4]), (int(month[5:7]) - 1) // 3 + 1)
+        collections_by_quarter[quarter] = collections_by_quarter.get(quarter, 0) + n
+
+    collections_by_method = _summed(values('collection_methods', 'collections_by_method'))
+    specimens_by_method = _summed(values('collection_methods', 'specimens_by_method'))
+
+    irs_coverage = _summed(values('interventions', 'irs_coverage'))
+    llin_coverage = [value or {} for value in values('interventions', 'llin_coverage')]
+    total_llins = sum(coverage.get('total_llins') or 0 for coverage in llin_coverage)
+    llins_reported = sum(state['llins_reported'] for state in states)
+    # LlinUsageRate is optional: without it the usage rate is 0, as in the calculator
+    usage_states = [state for state in states if state['llin_usage_reported'] is not None]
+    usage_reported = sum(state['llin_usage_reported'] for state in usage_states)
+    if not usage_states:
+        avg_usage_rate = 0
+    elif usage_reported:
+        avg_usage_rate = sum(state['llin_usage'] for state in usage_states) / usage_reported
+    else:
+        avg_usage_rate = float('nan')
+
+    feeding_status = _summed(values('blood_feeding', 'overall_feeding_status'))
+    anopheles_feeding = _summed(values('blood_feeding', 'anopheles_feeding_status'))
+    fed = sum(feeding_status.get(status, 0) for status in FED_STATUSES)
+    anopheles_fed = sum(anopheles_feeding.get(status, 0) for status in FED_STATUSES)
+
+    total_psc = total('indoor_density', 'total_psc_collections')
+    if total_psc > 0:
+        houses = _summed((state['psc_houses_by_district'] for state in states), order='label')
+        mosquitoes = _summed(state['psc_mosquitoes_by_district'] for state in states)
+        house_counts = pd.DataFrame(
+            [row for state in states for row in state['psc_house_counts']],
+            columns=['district', 'month', 'mosquitoes', 'anopheles', 'n']
+        )
+        indoor_density = {
+            'total_psc_collections': total_psc,
+            'avg_mosquitoes_per_house': sum(state['psc_mosquitoes'] for state in states) / total_psc,
+            'avg_anopheles_per_house': sum(state['psc_anopheles'] for state in states) / total_psc,
+            'density_by_district': {
+                district: mosquitoes.get(district, 0) / n for district, n in houses.items()
+            },
+            'density_by_month': dict(sorted(
+                (month, density) for value in values('indoor_density', 'density_by_month')
+                for month, density in (value or {}).items()
+            )),
+            # The houses of every month, counted, give the calculator's intervals
+            **density_intervals(
+                house_counts['mosquitoes'], house_counts['anopheles'],
+                house_counts['district'], house_counts['month'], weights=house_counts['n']
+            ),
+        }
+    else:
+        indoor_density = {
+            'total_psc_collections': 0,
+            'avg_mosquitoes_per_house': 0,
+            'avg_anopheles_per_house': 0,
+        }
+
+    completeness, missing_pct = {}, {}
+    for table, rows in (('surveillance', total_collections), ('specimens', total_specimens)):
+        nulls = _summed((state[f'{table}_nulls'] for state in states), order=None)
+        cells = sum(state[f'{table}_cells'] for state in states)
+        completeness[table] = 100 - sum(nulls.values()) / cells * 100 if cells else float('nan')
+        missing_pct[table] = {col: n / rows * 100 for col, n in nulls.items() if n > 0} if rows else {}
+
+    metrics = {
+        'summary': {
+            'total_collections': total_collections,
+            'total_specimens': total_specimens,
+            'date_range': {'start': min(starts, default='NaT'), 'end': max(ends, default='NaT')},
+            'unique_sites': len(collections_by_district),
+            'unique_collectors': len({name for state in states for name in state['collectors']}),
+            'countries': list(dict.fromkeys(
+                country for value in values('summary', 'countries') for country in value or []
+            )),
+        },
+        'temporal': {
+            'collections_by_month': collections_by_month,
+            'specimens_by_month': _summed(values('temporal', 'specimens_by_month'), order='label'),
+            'collections_by_quarter': dict(sorted(collections_by_quarter.items())),
+        },
+        'species': {
+            'species_counts': _summed(values('species', 'species_counts')),
+            'species_groups': _summed(values('species', 'species_groups')),
+            'anopheles_counts': _summed(values('species', 'anopheles_counts')),
+            'anopheles_sex_ratio': _summed(values('species', 'anopheles_sex_ratio')),
+            'species_by_month': _summed_crosstab(values('species', 'species_by_month')),
+            'total_anopheles': total_anopheles,
+            'anopheles_percentage': _rate(total_anopheles, total_specimens),
+        },
+        'collection_methods': {
+            'collections_by_method': collections_by_method,
+            'specimens_by_method': specimens_by_method,
+            'specimens_per_collection': {
+                method: specimens_by_method.get(method, 0) / n for method, n in collections_by_method.items()
+            },
+            'species_by_method': _summed_crosstab(values('collection_methods', 'species_by_method')),
+        },
+        'interventions': {
+            'irs_coverage': irs_coverage,
+            'irs_rate_percent': _rate(irs_coverage.get('Yes', 0), total_collections),
+            'llin_coverage': {
+                'total_llins': total_llins,
+                'avg_llins_per_house': total_llins / llins_reported if llins_reported else float('nan'),
+                'houses_with_llins': int(sum(coverage.get('houses_with_llins') or 0 for coverage in llin_coverage)),
+            },
+            'avg_llin_usage_rate': avg_usage_rate,
+            'llin_types': _summed(values('interventions', 'llin_types')),
+            'llin_brands': _summed(values('interventions', 'llin_brands')),
+        },
+        'blood_feeding': {
+            'overall_feeding_status': feeding_status,
+            'anopheles_feeding_status': anopheles_feeding,
+            'overall_feeding_rate': _rate(fed, total_specimens),
+            'anopheles_feeding_rate': _rate(anopheles_fed, total_anopheles),
+            'feeding_by_species': _summed_crosstab(values('blood_feeding', 'feeding_by_species')),
+        },
+        'indoor_density': indoor_density,
+        'geographic': {
+            'collections_by_district': collections_by_district,
+            'specimens_by_district': _summed(values('geographic', 'specimens_by_district')),
+            'species_by_district': _summed_crosstab(values('geographic', 'species_by_district')),
+        },
+        'data_quality': {
+            'quality_flags': _summed(values('data_quality', 'quality_flags')),
+            'surveillance_completeness': completeness['surveillance'],
+            'specimens_completeness': completeness['specimens'],
+            'surveillance_missing_pct': missing_pct['surveillance'],
+            'specimens_missing_pct': missing_pct['specimens'],
+        },
+    }
+    logger.info(f"All-time metrics rolled up from {len(partitions)} month partition(s)")
+    return metrics
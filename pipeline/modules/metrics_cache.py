@@ -0,0 +1,196 @@
+"""
+Metrics Cache Module
+Bounded on-disk cache of calculate_metrics() results, keyed by input content
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+import logging
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Tuple
+
+import pandas as pd
+
+import config
+from modules.stage_cache import code_version, frame_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+# Code the metric values depend on: editing it changes every key, and the
+# entries written by the old code age out of the cache
+CALCULATOR_CODE_FILES = [
+    config.PROJECT_ROOT / 'modules' / 'metrics_calculator.py',
+    config.PROJECT_ROOT / 'modules' / 'schema.py',
+    config.PROJECT_ROOT / 'modules' / 'timestamps.py',
+    config.PROJECT_ROOT / 'modules' / 'bootstrap.py',
+]
+
+
+def calculator_version(paths: Optional[List[Path]] = None) -> str:
+    """
+    Version of the metrics code and of the settings its results depend on
+
+    Args:
+        paths: Code files. If None, CALCULATOR_CODE_FILES
+
+    Returns:
+        Hex digest
+    """
+    settings = [config.BOOTSTRAP_RESAMPLES, config.BOOTSTRAP_CONFIDENCE, config.BOOTSTRAP_SEED]
+    payload = json.dumps([code_version(paths or CALCULATOR_CODE_FILES), settings])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MetricsCache:
+    """
+    Memoizes metric dictionaries on disk, least recently used evicted first
+
+    Keys hash the code version and frame_fingerprint() of the input frames,
+    so any change to the data or to the metrics code is a miss. Each entry
+    is one pickle under the root directory, named by its key; its
+    modification time is its last use (refreshed on every hit), so several
+    processes (pipeline, dashboard, notebooks) can share a directory
+    without a shared index. After each write the oldest entries are removed
+    until the cache is within max_entries and max_bytes.
+    """
+
+    def __init__(self, root: Optional[Path] = None, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, version: Optional[str] = None):
+        """
+        Initialize MetricsCache
+
+        Args:
+            root: Cache directory. If None, uses config.METRICS_CACHE_DIR
+            max_entries: Most entries kept. If None, uses config.METRICS_CACHE_MAX_ENTRIES
+            max_bytes: Most bytes kept. If None, uses config.METRICS_CACHE_MAX_MB
+            version: Code version mixed into every key. If None, calculator_version()
+        """
+        self.root = Path(root or config.METRICS_CACHE_DIR)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries if max_entries is not None else config.METRICS_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else config.METRICS_CACHE_MAX_MB * 1024 * 1024
+        self.version = version or calculator_version()
+        self.counts = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    def key(self, frames: List[pd.DataFrame]) -> str:
+        """
+        Cache key for a calculation
+
+        Args:
+            frames: Input frames, in a fixed order
+
+        Returns:
+            Hex digest
+        """
+        payload = json.dumps([self.version, [frame_fingerprint(df) for df in frames]])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        """Entry file of a key"""
+        return self.root / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Stored metrics for a key
+
+        Args:
+            key: Key from key()
+
+        Returns:
+            A fresh copy of the metrics, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            metrics = pickle.loads(path.read_bytes())
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            metrics = None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Dropping unreadable metrics cache entry {key[:12]}: {e}")
+            path.unlink(missing_ok=True)
+            metrics = None
+
+        with self._lock:
+            self.counts['hits' if metrics is not None else 'misses'] += 1
+        logger.info(f"Metrics cache {'HIT ' if metrics is not None else 'MISS'} ({key[:12]})")
+        return metrics
+
+    def put(self, key: str, metrics: Dict[str, Any]):
+        """
+        Store metrics under a key, then evict down to the limits
+
+        Args:
+            key: Key from key()
+            metrics: Picklable metrics dictionary
+        """
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(pickle.dumps(metrics, protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.counts['writes'] += 1
+            self._evict()
+
+    def _entries(self) -> List[Tuple[Path, os.stat_result]]:
+        """(path, stat) of every entry, least recently used first"""
+        entries = []
+        for path in self.root.glob('*.pkl'):
+            try:
+                entries.append((path, path.stat()))
+            except FileNotFoundError:  # evicted by another process
+                continue
+        return sorted(entries, key=lambda entry: entry[1].st_mtime)
+
+    def _evict(self):
+        """Remove the least recently used entries until within max_entries and max_bytes"""
+        entries = self._entries()
+        total = sum(stat.st_size for _, stat in entries)
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            path, stat = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+            self.counts['evictions'] += 1
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            for path, _ in self._entries():
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Cache statistics
+
+        Returns:
+            hits, misses, writes and evictions in this process, hit_rate,
+            and entries / bytes on disk with their limits
+        """
+        with self._lock:
+            counts = dict(self.counts)
+            entries = self._entries()
+        lookups = counts['hits'] + counts['misses']
+        return {
+            **counts,
+            'hit_rate': counts['hits'] / lookups if lookups else None,
+            'entries': len(entries),
+            'bytes': sum(stat.st_size for _, stat in entries),
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_metrics_cache() -> MetricsCache:
+    """The process-wide cache in config.METRICS_CACHE_DIR, created on first use"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = MetricsCache()
+        return _default_cache
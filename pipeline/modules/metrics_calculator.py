@@ -5,12 +5,34 @@ Calculates all entomological metrics for the dashboard
 import pandas as pd
 import numpy as np
 import json
+import numbers
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 import logging
 
+import config
+from modules.bootstrap import density_intervals
+from modules.metrics_cache import MetricsCache, get_metrics_cache
+from modules.schema import observed_counts
+from modules.timestamps import parse_timestamps
+
 logger = logging.getLogger(__name__)
 
+# Specimen columns the shared count table is grouped by (those present).
+# Every specimen metric is a sum over these, so one grouped pass over the
+# rows replaces a scan per value_counts / groupby.
+SPECIMEN_COUNT_KEYS = [
+    'CaptureYearMonth', 'SessionCollectionMethod', 'SiteDistrict', 'Species',
+    'SpeciesGroup', 'Sex', 'AbdomenStatus', 'IsFed',
+]
+
+# Stored names that differ from the calculator's keys; existing readers of
+# monthly_metrics (dashboard, backend) look these up by the stored name
+METRIC_NAME_ALIASES = {
+    ('interventions', 'irs_rate_percent'): 'irs_coverage_rate',
+    ('interventions', 'avg_llin_usage_rate'): 'llin_usage_rate',
+}
+
 
 class MetricsCalculator:
     """Calculates entomological metrics from surveillance and specimen data"""
@@ -28,6 +50,88 @@ class MetricsCalculator:
         self.surveillance = surveillance_df
         self.specimens = specimens_df
         self.merged = merged_df
+        self._specimen_counts = None
+        self._specimen_masks = None
+    
+    @property
+    def specimen_masks(self) -> Dict[str, pd.Series]:
+        """
+        Row masks over self.specimens, computed once
+        
+        is_anopheles: Species contains 'Anopheles' (case-insensitive)
+        is_psc: collected by Pyrethrum Spray Catch
+        """
+        if self._specimen_masks is None:
+            self._specimen_masks = {
+                'is_anopheles': self.specimens['Species'].str.contains('Anopheles', na=False, case=False),
+                'is_psc': self.specimens['SessionCollectionMethod'].str.contains('PSC', na=False, case=False),
+            }
+        return self._specimen_masks
+    
+    @property
+    def specimen_counts(self) -> pd.DataFrame:
+        """
+        Specimens counted per combination of SPECIMEN_COUNT_KEYS, computed once
+        
+        One row per observed combination (missing labels included) with its
+        count n and an is_anopheles flag. The specimen metrics below sum
+        this table instead of rescanning the rows.
+        """
+        if self._specimen_counts is None:
+            keys = [col for col in SPECIMEN_COUNT_KEYS if col in self.specimens.columns]
+            counts = (
+                self.specimens.groupby(keys, observed=True, sort=False, dropna=False)
+                .size()
+                .reset_index(name='n')
+            )
+            counts['is_anopheles'] = counts['Species'].str.contains('Anopheles', na=False, case=False)
+            self._specimen_counts = counts
+        return self._specimen_counts
+    
+    def _specimen_label_counts(self, column: str, anopheles_only: bool = False) -> pd.Series:
+        """
+        observed_counts(self.specimens[column]) from the count table
+        
+        Labels are summed in the order value_counts() sees them (category
+        order, or first appearance for plain strings), so ties keep the
+        same order after sorting.
+        
+        Args:
+            column: Column in SPECIMEN_COUNT_KEYS
+            anopheles_only: Count Anopheles specimens only
+            
+        Returns:
+            Counts per label present, largest first
+        """
+        counts = self.specimen_counts
+        if anopheles_only:
+            counts = counts[counts['is_anopheles']]
+        categorical = isinstance(counts[column].dtype, pd.CategoricalDtype)
+        totals = (
+            counts.groupby(column, observed=not categorical, sort=categorical)['n'].sum()
+            .sort_values(ascending=False)
+        )
+        return totals[totals > 0]
+    
+    def _specimen_totals(self, column: str) -> pd.Series:
+        """groupby(column).size() over the specimens: counts per label, sorted by label"""
+        return self.specimen_counts.groupby(column, observed=True)['n'].sum()
+    
+    def _fed_count(self, anopheles_only: bool = False) -> int:
+        """Specimens with IsFed set (Anopheles only if asked)"""
+        counts = self.specimen_counts
+        fed = counts['IsFed'].fillna(False).astype(bool)
+        if anopheles_only:
+            fed &= counts['is_anopheles']
+        return counts.loc[fed, 'n'].sum()
+    
+    def _specimen_crosstab(self, index: str, columns: str) -> Dict[Any, Dict[Any, int]]:
+        """groupby([index, columns]).size().unstack(fill_value=0).to_dict() over the specimens"""
+        return (
+            self.specimen_counts.groupby([index, columns], observed=True)['n'].sum()
+            .unstack(fill_value=0)
+            .to_dict()
+        )
     
     def calculate_all_metrics(self) -> Dict[str, Any]:
         """
@@ -77,11 +181,7 @@ class MetricsCalculator:
         )
         
         # Specimens by month
-        monthly_specimens = (
-            self.specimens.groupby('CaptureYearMonth')
-            .size()
-            .to_dict()
-        )
+        monthly_specimens = self._specimen_totals('CaptureYearMonth').to_dict()
         
         # Collections by quarter
         quarterly_collections = (
@@ -99,30 +199,25 @@ class MetricsCalculator:
     def calculate_species_metrics(self) -> Dict[str, Any]:
         """Calculate species composition metrics"""
         # Overall species distribution
-        species_counts = self.specimens['Species'].value_counts().to_dict()
+        species_counts = self._specimen_label_counts('Species').to_dict()
         
         # Species groups
         species_group_counts = (
-            self.specimens['SpeciesGroup'].value_counts().to_dict() 
+            self._specimen_label_counts('SpeciesGroup').to_dict() 
             if 'SpeciesGroup' in self.specimens.columns else {}
         )
         
         # Anopheles species only
-        anopheles_df = self.specimens[
-            self.specimens['Species'].str.contains('Anopheles', na=False, case=False)
-        ]
-        anopheles_counts = anopheles_df['Species'].value_counts().to_dict()
+        anopheles_counts = self._specimen_label_counts('Species', anopheles_only=True).to_dict()
+        total_anopheles = int(self.specimen_masks['is_anopheles'].sum())
         
         # Sex ratio (for Anopheles)
-        anopheles_sex = anopheles_df['Sex'].value_counts().to_dict() if len(anopheles_df) > 0 else {}
+        anopheles_sex = (
+            self._specimen_label_counts('Sex', anopheles_only=True).to_dict() if total_anopheles > 0 else {}
+        )
         
         # Species by month
-        species_by_month = (
-            self.specimens.groupby(['CaptureYearMonth', 'Species'])
-            .size()
-            .unstack(fill_value=0)
-            .to_dict()
-        )
+        species_by_month = self._specimen_crosstab('CaptureYearMonth', 'Species')
         
         return {
             'species_counts': species_counts,
@@ -130,41 +225,30 @@ class MetricsCalculator:
             'anopheles_counts': anopheles_counts,
             'anopheles_sex_ratio': anopheles_sex,
             'species_by_month': species_by_month,
-            'total_anopheles': len(anopheles_df),
-            'anopheles_percentage': (len(anopheles_df) / len(self.specimens) * 100) if len(self.specimens) > 0 else 0
+            'total_anopheles': total_anopheles,
+            'anopheles_percentage': (total_anopheles / len(self.specimens) * 100) if len(self.specimens) > 0 else 0
         }
     
     def calculate_collection_method_metrics(self) -> Dict[str, Any]:
         """Calculate metrics by collection method"""
         # Collections by method
         method_collections = (
-            self.surveillance['SessionCollectionMethod']
-            .value_counts()
+            observed_counts(self.surveillance['SessionCollectionMethod'])
             .to_dict()
         )
         
         # Specimens by method
-        method_specimens = (
-            self.specimens['SessionCollectionMethod']
-            .value_counts()
-            .to_dict()
-        )
+        method_specimens = self._specimen_label_counts('SessionCollectionMethod').to_dict()
         
         # Specimens per collection by method
         specimens_per_collection = {}
         for method in self.surveillance['SessionCollectionMethod'].unique():
             n_collections = (self.surveillance['SessionCollectionMethod'] == method).sum()
-            n_specimens = (self.specimens['SessionCollectionMethod'] == method).sum()
             if n_collections > 0:
-                specimens_per_collection[method] = n_specimens / n_collections
+                specimens_per_collection[method] = np.int64(method_specimens.get(method, 0)) / n_collections
         
         # Species composition by method
-        species_by_method = (
-            self.specimens.groupby(['SessionCollectionMethod', 'Species'])
-            .size()
-            .unstack(fill_value=0)
-            .to_dict()
-        )
+        species_by_method = self._specimen_crosstab('SessionCollectionMethod', 'Species')
         
         return {
             'collections_by_method': method_collections,
@@ -177,7 +261,7 @@ class MetricsCalculator:
         """Calculate LLIN and IRS intervention metrics"""
         # IRS coverage
         irs_conducted = (
-            self.surveillance['WasIrsConducted'].value_counts().to_dict()
+            observed_counts(self.surveillance['WasIrsConducted']).to_dict()
         )
         
         irs_rate = (
@@ -197,15 +281,13 @@ class MetricsCalculator:
         
         # LLIN types
         llin_types = (
-            self.surveillance[self.surveillance['LlinType'] != 'Unknown']['LlinType']
-            .value_counts()
+            observed_counts(self.surveillance[self.surveillance['LlinType'] != 'Unknown']['LlinType'])
             .to_dict()
         )
         
         # LLIN brands
         llin_brands = (
-            self.surveillance[self.surveillance['LlinBrand'] != 'Unknown']['LlinBrand']
-            .value_counts()
+            observed_counts(self.surveillance[self.surveillance['LlinBrand'] != 'Unknown']['LlinBrand'])
             .to_dict()
         )
         
@@ -221,40 +303,31 @@ class MetricsCalculator:
     def calculate_blood_feeding_metrics(self) -> Dict[str, Any]:
         """Calculate blood-feeding status metrics"""
         # Overall feeding status
-        feeding_status = (
-            self.specimens['AbdomenStatus'].value_counts().to_dict()
-        )
+        feeding_status = self._specimen_label_counts('AbdomenStatus').to_dict()
         
         # For Anopheles only
-        anopheles_df = self.specimens[
-            self.specimens['Species'].str.contains('Anopheles', na=False, case=False)
-        ]
+        total_anopheles = int(self.specimen_masks['is_anopheles'].sum())
         
         anopheles_feeding = (
-            anopheles_df['AbdomenStatus'].value_counts().to_dict() 
-            if len(anopheles_df) > 0 else {}
+            self._specimen_label_counts('AbdomenStatus', anopheles_only=True).to_dict() 
+            if total_anopheles > 0 else {}
         )
         
         # Calculate feeding rates
         if 'IsFed' in self.specimens.columns:
             feeding_rate = (
-                self.specimens['IsFed'].sum() / len(self.specimens) * 100
+                self._fed_count() / len(self.specimens) * 100
             ) if len(self.specimens) > 0 else 0
             
             anopheles_feeding_rate = (
-                anopheles_df['IsFed'].sum() / len(anopheles_df) * 100
-            ) if len(anopheles_df) > 0 else 0
+                self._fed_count(anopheles_only=True) / total_anopheles * 100
+            ) if total_anopheles > 0 else 0
         else:
             feeding_rate = 0
             anopheles_feeding_rate = 0
         
         # Feeding status by species
-        feeding_by_species = (
-            self.specimens.groupby(['Species', 'AbdomenStatus'])
-            .size()
-            .unstack(fill_value=0)
-            .to_dict()
-        )
+        feeding_by_species = self._specimen_crosstab('Species', 'AbdomenStatus')
         
         return {
             'overall_feeding_status': feeding_status,
@@ -268,7 +341,9 @@ class MetricsCalculator:
         """
         Calculate indoor resting density from PSC (Pyrethrum Spray Catch) data
         
-        This is a key metric: mosquitoes per house for indoor collections
+        This is a key metric: mosquitoes per house for indoor collections.
+        Each mean comes with a '_ci' bootstrap confidence interval
+        (config.BOOTSTRAP_CONFIDENCE, resampling houses).
         """
         # Filter for PSC collections only
         psc_sessions = self.surveillance[
@@ -283,91 +358,78 @@ class MetricsCalculator:
                 'avg_anopheles_per_house': 0,
             }
         
-        # Get specimens from PSC collections
-        psc_specimens = self.specimens[
-            self.specimens['SessionCollectionMethod'].str.contains('PSC', na=False, case=False)
-        ]
-        
-        # Count specimens per session
-        specimens_per_session = (
-            psc_specimens.groupby('SessionID')
-            .size()
-            .reset_index(name='mosquito_count')
+        # Mosquitoes and Anopheles per PSC session, in one grouped pass
+        masks = self.specimen_masks
+        per_session = (
+            masks['is_anopheles'][masks['is_psc']]
+            .groupby(self.specimens.loc[masks['is_psc'], 'SessionID'])
+            .agg(mosquito_count='size', anopheles_count='sum')
+            .reset_index()
         )
         
         # Merge with sessions to get house info
         psc_with_counts = psc_sessions.merge(
-            specimens_per_session,
+            per_session,
             on='SessionID',
             how='left'
         )
-        psc_with_counts['mosquito_count'] = psc_with_counts['mosquito_count'].fillna(0)
+        psc_with_counts[['mosquito_count', 'anopheles_count']] = (
+            psc_with_counts[['mosquito_count', 'anopheles_count']].fillna(0)
+        )
         
         # Calculate overall density
         avg_mosquitoes_per_house = psc_with_counts['mosquito_count'].mean()
         
         # Calculate for Anopheles only
-        anopheles_psc = psc_specimens[
-            psc_specimens['Species'].str.contains('Anopheles', na=False, case=False)
-        ]
-        
-        anopheles_per_session = (
-            anopheles_psc.groupby('SessionID')
-            .size()
-            .reset_index(name='anopheles_count')
-        )
-        
-        psc_with_anopheles = psc_sessions.merge(
-            anopheles_per_session,
-            on='SessionID',
-            how='left'
-        )
-        psc_with_anopheles['anopheles_count'] = psc_with_anopheles['anopheles_count'].fillna(0)
-        
-        avg_anopheles_per_house = psc_with_anopheles['anopheles_count'].mean()
+        avg_anopheles_per_house = psc_with_counts['anopheles_count'].mean()
         
         # Density by district
         density_by_district = (
-            psc_with_counts.groupby('SiteDistrict')['mosquito_count']
+            psc_with_counts.groupby('SiteDistrict', observed=True)['mosquito_count']
             .mean()
             .to_dict()
         )
         
-        # Density over time
-        psc_with_counts['YearMonth'] = pd.to_datetime(psc_with_counts['SessionCollectionDate']).dt.strftime('%Y-%m')
+        # Density over time (CollectionYearMonth is this label, added during cleaning)
+        if 'CollectionYearMonth' in psc_with_counts.columns:
+            psc_with_counts['YearMonth'] = psc_with_counts['CollectionYearMonth']
+        else:
+            psc_with_counts['YearMonth'] = parse_timestamps(psc_with_counts['SessionCollectionDate']).dt.strftime('%Y-%m')
         density_by_month = (
             psc_with_counts.groupby('YearMonth')['mosquito_count']
             .mean()
             .to_dict()
         )
         
+        # Bootstrap confidence intervals for all of the above, resampling houses
+        intervals = density_intervals(
+            psc_with_counts['mosquito_count'].to_numpy(),
+            psc_with_counts['anopheles_count'].to_numpy(),
+            psc_with_counts['SiteDistrict'],
+            psc_with_counts['YearMonth'],
+        )
+        
         return {
             'total_psc_collections': len(psc_sessions),
             'avg_mosquitoes_per_house': float(avg_mosquitoes_per_house),
             'avg_anopheles_per_house': float(avg_anopheles_per_house),
             'density_by_district': density_by_district,
             'density_by_month': density_by_month,
+            **intervals,
         }
     
     def calculate_geographic_metrics(self) -> Dict[str, Any]:
         """Calculate metrics by geographic location"""
         # Collections by district
         district_collections = (
-            self.surveillance['SiteDistrict'].value_counts().to_dict()
+            observed_counts(self.surveillance['SiteDistrict']).to_dict()
         )
         
         # Specimens by district
-        district_specimens = (
-            self.specimens['SiteDistrict'].value_counts().to_dict()
-        )
+        district_specimens = self._specimen_label_counts('SiteDistrict').to_dict()
         
         # Species composition by district
-        species_by_district = (
-            self.specimens.groupby(['SiteDistrict', 'Species'])
-            .size()
-            .unstack(fill_value=0)
-            .to_dict()
-        )
+        species_by_district = self._specimen_crosstab('SiteDistrict', 'Species')
         
         return {
             'collections_by_district': district_collections,
@@ -379,27 +441,25 @@ class MetricsCalculator:
         """Calculate data quality indicators"""
         # Quality flags from surveillance
         quality_flags = (
-            self.surveillance['DataQualityFlag'].value_counts().to_dict()
+            observed_counts(self.surveillance['DataQualityFlag']).to_dict()
             if 'DataQualityFlag' in self.surveillance.columns else {}
         )
         
-        # Missing data analysis
-        surveillance_missing = (
-            self.surveillance.isnull().sum() / len(self.surveillance) * 100
-        ).to_dict()
+        # Missing data analysis (one isnull() pass per frame)
+        surveillance_nulls = self.surveillance.isnull().sum()
+        specimens_nulls = self.specimens.isnull().sum()
         
-        specimens_missing = (
-            self.specimens.isnull().sum() / len(self.specimens) * 100
-        ).to_dict()
+        surveillance_missing = (surveillance_nulls / len(self.surveillance) * 100).to_dict()
+        specimens_missing = (specimens_nulls / len(self.specimens) * 100).to_dict()
         
         # Completeness score
         surveillance_completeness = 100 - (
-            self.surveillance.isnull().sum().sum() / 
+            surveillance_nulls.sum() / 
             (len(self.surveillance) * len(self.surveillance.columns)) * 100
         )
         
         specimens_completeness = 100 - (
-            self.specimens.isnull().sum().sum() / 
+            specimens_nulls.sum() / 
             (len(self.specimens) * len(self.specimens.columns)) * 100
         )
         
@@ -455,7 +515,7 @@ class MetricsCalculator:
         
         # By collection method
         by_method = (
-            session_metrics.groupby('SessionCollectionMethod')['mosquitoes_per_person']
+            session_metrics.groupby('SessionCollectionMethod', observed=True)['mosquitoes_per_person']
             .mean()
             .to_dict()
         )
@@ -468,20 +528,82 @@ class MetricsCalculator:
 
 def calculate_metrics(surveillance_df: pd.DataFrame, 
                      specimens_df: pd.DataFrame,
-                     merged_df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+                     merged_df: Optional[pd.DataFrame] = None,
+                     use_cache: bool = config.METRICS_CACHE_ENABLED,
+                     cache: Optional[MetricsCache] = None) -> Dict[str, Any]:
     """
     Main function to calculate all metrics
     
+    Results are memoized on disk by the content of the two cleaned frames
+    and the metrics code version, so a repeated call on unchanged data
+    costs a fingerprint of the frames and one read. merged_df is not part
+    of the key: calculate_all_metrics() does not read it.
+    
     Args:
         surveillance_df: Cleaned surveillance data
         specimens_df: Cleaned specimens data
         merged_df: Optional merged data
+        use_cache: If False, always calculates (and does not store)
+        cache: Cache to use. If None, the shared cache in config.METRICS_CACHE_DIR
         
     Returns:
         Dictionary with all metrics
     """
-    calculator = MetricsCalculator(surveillance_df, specimens_df, merged_df)
-    return calculator.calculate_all_metrics()
+    if not use_cache:
+        return MetricsCalculator(surveillance_df, specimens_df, merged_df).calculate_all_metrics()
+    
+    cache = cache or get_metrics_cache()
+    key = cache.key([surveillance_df, specimens_df])
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = MetricsCalculator(surveillance_df, specimens_df, merged_df).calculate_all_metrics()
+        cache.put(key, metrics)
+    return metrics
+
+
+def _json_ready(value: Any) -> Any:
+    """Make a metric value JSON-serializable: string keys, plain numbers, NaN and NA as null"""
+    if isinstance(value, dict):
+        return {str(k): _json_ready(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Index, pd.Series)):
+        return [_json_ready(v) for v in value]
+    if value is pd.NA:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def flatten_metrics(metrics: Dict[str, Any]) -> List[Tuple[str, Optional[float], Optional[str], str]]:
+    """
+    Flatten calculate_all_metrics() output into monthly_metrics rows
+
+    Each metric family becomes the category and each of its entries one row:
+    numbers are stored in metric_value, anything else (breakdown dicts,
+    lists, strings) as JSON in metric_json with a metric_value of 0.
+
+    Args:
+        metrics: Output of calculate_metrics / calculate_all_metrics
+
+    Returns:
+        List of (metric_name, metric_value, metric_json, category) tuples
+    """
+    rows = []
+    for category, family in metrics.items():
+        if not isinstance(family, dict):
+            family = {category: family}
+        for key, value in family.items():
+            name = METRIC_NAME_ALIASES.get((category, key), str(key))
+            if isinstance(value, numbers.Number):
+                number = float(value)
+                rows.append((name, None if np.isnan(number) else number, None, category))
+            elif value is None:
+                rows.append((name, None, None, category))
+            else:
+                rows.append((name, 0, json.dumps(_json_ready(value)), category))  # value is a placeholder
+    return rows
 
 
 if __name__ == "__main__":
@@ -0,0 +1,364 @@
+"""
+Metrics Cube Module
+Filter-aware dashboard metrics summed from the pre-aggregated count tables
+"""
+import calendar
+import logging
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from modules.aggregates import FED_STATUSES
+from modules.species import SpeciesNormalizer
+
+logger = logging.getLogger(__name__)
+
+
+# Cube dimensions. Specimen cells come from daily_counts (capture day),
+# session cells from session_counts summed per collection day.
+SPECIMEN_DIMENSIONS = ('date', 'year_month', 'district', 'method', 'species', 'sex', 'abdomen_status')
+SESSION_DIMENSIONS = ('date', 'year_month', 'district', 'method', 'irs')
+
+SPECIMEN_CELLS_SQL = f"""
+    SELECT {', '.join(SPECIMEN_DIMENSIONS)}, SUM(n) AS n
+    FROM daily_counts
+    GROUP BY {', '.join(SPECIMEN_DIMENSIONS)}
+"""
+
+# Sums and non-missing counts, so means can be taken over any set of cells
+SESSION_CELLS_SQL = f"""
+    SELECT {', '.join(SESSION_DIMENSIONS)},
+        COUNT(*) AS collections,
+        SUM(llins) AS llins,
+        COUNT(llins) AS llins_reported,
+        COUNT(CASE WHEN llins > 0 THEN 1 END) AS houses_with_llins,
+        SUM(llin_usage) AS llin_usage,
+        COUNT(llin_usage) AS llin_usage_reported
+    FROM session_counts
+    GROUP BY {', '.join(SESSION_DIMENSIONS)}
+"""
+
+# Specimens of PSC sessions per (collection day, capture day, species),
+# labelled by their session: indoor resting density credits a session's
+# specimens to the session, whenever they were captured
+PSC_CELLS_SQL = """
+    SELECT s.date, s.year_month, s.district, s.method, c.date AS captured, c.species, SUM(c.n) AS n
+    FROM session_species_counts c
+    JOIN session_counts s ON s.session_id = c.session_id
+    WHERE s.method LIKE '%PSC%'
+    GROUP BY s.date, s.year_month, s.district, s.method, c.date, c.species
+"""
+
+SESSION_MEASURES = ('collections', 'llins', 'llins_reported', 'houses_with_llins',
+                    'llin_usage', 'llin_usage_reported')
+
+LABEL_COLUMNS = ('year_month', 'district', 'method', 'species', 'species_group', 'sex', 'abdomen_status', 'irs')
+
+
+def _prepare(cells: pd.DataFrame) -> pd.DataFrame:
+    """Cells with categorical labels (grouped many times per query) and day / month as datetimes"""
+    day = pd.to_datetime(cells['date'])
+    labels = {col: cells[col].astype('category') for col in LABEL_COLUMNS if col in cells.columns}
+    return cells.drop(columns='date').assign(day=day, month=day.dt.to_period('M').dt.start_time, **labels)
+
+
+def _month_aligned(start_date: Optional[str], end_date: Optional[str]) -> bool:
+    """Whether a date range covers whole months only (open ends count as aligned)"""
+    if start_date is not None and pd.Timestamp(start_date).day != 1:
+        return False
+    if end_date is not None:
+        end = pd.Timestamp(end_date)
+        if end.day != calendar.monthrange(end.year, end.month)[1]:
+            return False
+    return True
+
+
+def _mask(cells: pd.DataFrame, days: Sequence[str], start_date: Optional[str], end_date: Optional[str],
+          districts: Optional[Sequence[str]], methods: Optional[Sequence[str]],
+          species: Optional[Sequence[str]] = None) -> np.ndarray:
+    """Cells within the dates (on every column in days, inclusive) and labels of a filter"""
+    mask = np.ones(len(cells), dtype=bool)
+    for column in days:
+        if start_date is not None:
+            mask &= cells[column].to_numpy() >= pd.Timestamp(start_date).to_datetime64()
+        if end_date is not None:
+            mask &= cells[column].to_numpy() <= pd.Timestamp(end_date).to_datetime64()
+    if districts:
+        mask &= cells['district'].isin(districts).to_numpy()
+    if methods:
+        mask &= cells['method'].isin(methods).to_numpy()
+    if species:
+        mask &= cells['species'].isin(species).to_numpy()
+    return mask
+
+
+def _counts(cells: pd.DataFrame, by: str, measure: str = 'n') -> pd.Series:
+    """Summed measure per label, largest first, without empty labels (like observed_counts)"""
+    counts = cells.groupby(by, observed=True, sort=False)[measure].sum()
+    return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+
+def _crosstab(cells: pd.DataFrame, index: str, columns: str) -> Dict[Any, Dict[Any, int]]:
+    """{column label: {index label: n}} with zeros filled, like groupby().size().unstack().to_dict()"""
+    return (
+        cells.groupby([index, columns], observed=True)['n'].sum()
+        .unstack(fill_value=0)
+        .to_dict()
+    )
+
+
+class MetricsCube:
+    """
+    Answers dashboard metric queries by summing pre-aggregated cells
+
+    Specimen cells hold counts per (capture day, year_month, district,
+    method, species, sex, abdomen status); session cells hold collections
+    and IRS / LLIN sums per (collection day, year_month, district, method,
+    IRS answer); PSC cells hold the specimens of PSC sessions per
+    (collection day, capture day, species) with their session's labels.
+    They are loaded from daily_counts / session_counts /
+    session_species_counts, so their size depends on the number of
+    distinct label combinations, not on the number of rows. Queries
+    covering whole months (or no dates) use cells rolled up to year_month.
+
+    Filters follow the dashboard: dates restrict sessions by collection day
+    and specimens by capture day (both inclusive), species only restricts
+    specimens. Metrics use MetricsCalculator's families and key names and
+    match its values on the same filtered rows, except that
+      - date_range is given as days, not timestamps
+      - metrics that need row-level values are left out: unique_collectors,
+        countries, llin_types, llin_brands, the indoor density '_ci'
+        intervals and the data_quality family
+    """
+
+    def __init__(self, specimen_cells: pd.DataFrame, session_cells: pd.DataFrame,
+                 psc_cells: pd.DataFrame):
+        """
+        Initialize MetricsCube
+
+        Args:
+            specimen_cells: SPECIMEN_DIMENSIONS columns and n
+            session_cells: SESSION_DIMENSIONS columns and SESSION_MEASURES
+            psc_cells: PSC_CELLS_SQL columns
+        """
+        normalizer = SpeciesNormalizer()
+        species = specimen_cells['species']
+        specimen_cells = _prepare(specimen_cells.assign(
+            species_group=species.map({name: normalizer.group(name) for name in species.dropna().unique()}),
+            is_anopheles=species.str.contains('anopheles', case=False, na=False),
+            is_fed=specimen_cells['abdomen_status'].isin(FED_STATUSES),
+            is_psc=specimen_cells['method'].str.contains('PSC', case=False, na=False),
+        ))
+        session_cells = _prepare(session_cells.assign(
+            is_psc=session_cells['method'].str.contains('PSC', case=False, na=False),
+        ))
+        session_cells = session_cells.assign(first_day=session_cells['day'], last_day=session_cells['day'])
+        # Filtered by both days (never rolled up), like the rows they count
+        self.psc = _prepare(psc_cells.assign(
+            is_anopheles=psc_cells['species'].str.contains('anopheles', case=False, na=False),
+        ))
+        self.psc['captured'] = pd.to_datetime(self.psc['captured'])
+
+        self.daily = {'specimens': specimen_cells, 'sessions': session_cells}
+        self.monthly = {
+            'specimens': self._rollup(specimen_cells, ['n']),
+            'sessions': self._rollup(session_cells, list(SESSION_MEASURES)),
+        }
+
+    @classmethod
+    def from_database(cls, db) -> 'MetricsCube':
+        """
+        Load the cube from a database's aggregate tables
+
+        Args:
+            db: VectorInsightDB whose aggregates are refreshed
+
+        Returns:
+            MetricsCube
+        """
+        specimen_cells = db.query(SPECIMEN_CELLS_SQL)
+        session_cells = db.query(SESSION_CELLS_SQL)
+        psc_cells = db.query(PSC_CELLS_SQL)
+        logger.info(
+            f"Metrics cube loaded: {len(specimen_cells)} specimen cells, {len(session_cells)} session cells, "
+            f"{len(psc_cells)} PSC cells"
+        )
+        return cls(specimen_cells, session_cells, psc_cells)
+
+    @staticmethod
+    def _rollup(cells: pd.DataFrame, measures: list) -> pd.DataFrame:
+        """Sum cells over the days of each month; undated cells are kept"""
+        spans = {'day', 'first_day', 'last_day'}
+        keys = [col for col in cells.columns if col not in spans and col not in measures]
+        aggregations = {measure: (measure, 'sum') for measure in measures}
+        if 'first_day' in cells.columns:
+            aggregations.update(first_day=('first_day', 'min'), last_day=('last_day', 'max'))
+        return cells.groupby(keys, dropna=False, observed=True, sort=False, as_index=False).agg(**aggregations)
+
+    def cells(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              districts: Optional[Sequence[str]] = None,
+              methods: Optional[Sequence[str]] = None,
+              species: Optional[Sequence[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Cells matching a filter
+
+        Args:
+            start_date: Optional first day (YYYY-MM-DD), inclusive
+            end_date: Optional last day (YYYY-MM-DD), inclusive
+            districts: Optional districts to keep
+            methods: Optional collection methods to keep
+            species: Optional species to keep (specimens only)
+
+        Returns:
+            (specimen cells, session cells)
+        """
+        monthly = _month_aligned(start_date, end_date)
+        level = self.monthly if monthly else self.daily
+        column = 'month' if monthly else 'day'
+
+        specimens = level['specimens']
+        specimens = specimens[_mask(specimens, [column], start_date, end_date, districts, methods, species)]
+        sessions = level['sessions']
+        sessions = sessions[_mask(sessions, [column], start_date, end_date, districts, methods)]
+        return specimens, sessions
+
+    def psc_cells(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  districts: Optional[Sequence[str]] = None,
+                  methods: Optional[Sequence[str]] = None,
+                  species: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        PSC cells matching a filter: dates restrict both the session's
+        collection day and the specimens' capture day (arguments as in cells())
+        """
+        return self.psc[_mask(self.psc, ['day', 'captured'], start_date, end_date, districts, methods, species)]
+
+    def metrics(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                districts: Optional[Sequence[str]] = None,
+                methods: Optional[Sequence[str]] = None,
+                species: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Metric families for a filter, shaped like MetricsCalculator.calculate_all_metrics()
+
+        Args:
+            start_date: Optional first day (YYYY-MM-DD), inclusive
+            end_date: Optional last day (YYYY-MM-DD), inclusive
+            districts: Optional districts to keep
+            methods: Optional collection methods to keep
+            species: Optional species to keep (specimens only)
+
+        Returns:
+            Dictionary of metric families
+        """
+        specimens, sessions = self.cells(start_date, end_date, districts, methods, species)
+        anopheles = specimens[specimens['is_anopheles']]
+
+        total_specimens = int(specimens['n'].sum())
+        total_collections = int(sessions['collections'].sum())
+        total_anopheles = int(anopheles['n'].sum())
+        fed = int(specimens.loc[specimens['is_fed'], 'n'].sum())
+        anopheles_fed = int(anopheles.loc[anopheles['is_fed'], 'n'].sum())
+
+        collections_by_method = _counts(sessions, 'method', 'collections')
+        specimens_by_method = _counts(specimens, 'method')
+        dated = sessions[sessions['month'].notna()]
+        quarters = dated.groupby([dated['month'].dt.year, dated['month'].dt.quarter])['collections'].sum()
+
+        llins_reported = sessions['llins_reported'].sum()
+        usage_reported = sessions['llin_usage_reported'].sum()
+        first_day = sessions['first_day'].min()
+        last_day = sessions['last_day'].max()
+
+        return {
+            'summary': {
+                'total_collections': total_collections,
+                'total_specimens': total_specimens,
+                'date_range': {
+                    'start': None if pd.isna(first_day) else first_day.strftime('%Y-%m-%d'),
+                    'end': None if pd.isna(last_day) else last_day.strftime('%Y-%m-%d'),
+                },
+                'unique_sites': sessions.loc[sessions['collections'] > 0, 'district'].nunique(),
+            },
+            'temporal': {
+                'collections_by_month': _counts(sessions, 'year_month', 'collections').sort_index().to_dict(),
+                'specimens_by_month': _counts(specimens, 'year_month').sort_index().to_dict(),
+                'collections_by_quarter': quarters.to_dict(),
+            },
+            'species': {
+                'species_counts': _counts(specimens, 'species').to_dict(),
+                'species_groups': _counts(specimens, 'species_group').to_dict(),
+                'anopheles_counts': _counts(anopheles, 'species').to_dict(),
+                'anopheles_sex_ratio': _counts(anopheles, 'sex').to_dict() if total_anopheles > 0 else {},
+                'species_by_month': _crosstab(specimens, 'year_month', 'species'),
+                'total_anopheles': total_anopheles,
+                'anopheles_percentage': (total_anopheles / total_specimens * 100) if total_specimens > 0 else 0,
+            },
+            'collection_methods': {
+                'collections_by_method': collections_by_method.to_dict(),
+                'specimens_by_method': specimens_by_method.to_dict(),
+                'specimens_per_collection': {
+                    method: specimens_by_method.get(method, 0) / n_collections
+                    for method, n_collections in collections_by_method.items()
+                },
+                'species_by_method': _crosstab(specimens, 'method', 'species'),
+            },
+            'interventions': {
+                'irs_coverage': _counts(sessions, 'irs', 'collections').to_dict(),
+                'irs_rate_percent': (
+                    sessions.loc[sessions['irs'] == 'Yes', 'collections'].sum() / total_collections * 100
+                ) if total_collections > 0 else 0,
+                'llin_coverage': {
+                    'total_llins': sessions['llins'].sum(),
+                    'avg_llins_per_house': (
+                        sessions['llins'].sum() / llins_reported if llins_reported > 0 else float('nan')
+                    ),
+                    'houses_with_llins': sessions['houses_with_llins'].sum(),
+                },
+                'avg_llin_usage_rate': (
+                    sessions['llin_usage'].sum() / usage_reported if usage_reported > 0 else float('nan')
+                ),
+            },
+            'blood_feeding': {
+                'overall_feeding_status': _counts(specimens, 'abdomen_status').to_dict(),
+                'anopheles_feeding_status': _counts(anopheles, 'abdomen_status').to_dict() if total_anopheles > 0 else {},
+                'overall_feeding_rate': (fed / total_specimens * 100) if total_specimens > 0 else 0,
+                'anopheles_feeding_rate': (anopheles_fed / total_anopheles * 100) if total_anopheles > 0 else 0,
+                'feeding_by_species': _crosstab(specimens, 'species', 'abdomen_status'),
+            },
+            'indoor_density': self._indoor_density(
+                self.psc_cells(start_date, end_date, districts, methods, species), sessions
+            ),
+            'geographic': {
+                'collections_by_district': _counts(sessions, 'district', 'collections').to_dict(),
+                'specimens_by_district': _counts(specimens, 'district').to_dict(),
+                'species_by_district': _crosstab(specimens, 'district', 'species'),
+            },
+        }
+
+    @staticmethod
+    def _indoor_density(psc_specimens: pd.DataFrame, sessions: pd.DataFrame) -> Dict[str, Any]:
+        """
+        PSC mosquitoes per house: specimens of PSC sessions over PSC collections,
+        overall, by district and by month of the session
+        """
+        psc_sessions = sessions[sessions['is_psc']]
+        total_psc = int(psc_sessions['collections'].sum())
+        if total_psc == 0:
+            return {
+                'total_psc_collections': 0,
+                'avg_mosquitoes_per_house': 0,
+                'avg_anopheles_per_house': 0,
+            }
+
+        def per_house(by: str) -> Dict[Any, float]:
+            houses = _counts(psc_sessions, by, 'collections')
+            mosquitoes = psc_specimens.groupby(by, observed=True)['n'].sum().reindex(houses.index, fill_value=0)
+            return (mosquitoes / houses).to_dict()
+
+        return {
+            'total_psc_collections': total_psc,
+            'avg_mosquitoes_per_house': float(psc_specimens['n'].sum() / total_psc),
+            'avg_anopheles_per_house': float(psc_specimens.loc[psc_specimens['is_anopheles'], 'n'].sum() / total_psc),
+            'density_by_district': per_house('district'),
+            'density_by_month': per_house('year_month'),
+        }
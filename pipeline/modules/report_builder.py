@@ -0,0 +1,212 @@
+"""
+Report Builder Module
+Builds the house-by-house VectorCam report with columnar operations
+"""
+import pandas as pd
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Species blocks in report order:
+# (species needle, status column prefix, male column, female column, is Anopheles)
+# Needles are matched in order, so 'gambiae'/'funestus' win over 'anopheles'.
+REPORT_SPECIES = [
+    ('gambiae', 'anGambiae', 'AnGambiaeMale', 'AnGambiaeFemale', True),
+    ('funestus', 'anFunestus', 'AnFunestusMale', 'AnFunestusFemale', True),
+    ('anopheles', 'anOther', 'AnOtherMale', 'AnOtherFemale', True),
+    ('culex', 'Culex', 'culexMale', 'culexFemale', False),
+    ('aedes', 'Aedes', 'aedesMale', 'aedesFemale', False),
+    ('mansonia', 'Mansonia', 'mansoniaMale', 'mansoniaFemale', False),
+]
+
+# Abdomen status suffixes, indexed by status code
+REPORT_STATUSES = ['UF', 'F', 'G']
+
+# Report columns taken from the session row: (report column, surveillance column).
+# None means the column is always blank in the report.
+REPORT_LEADING_COLUMNS = [
+    ('country', 'ProgramCountry'),
+    ('district', 'SiteDistrict'),
+    ('site', 'SiteID'),
+    ('houseNumber', 'SessionHouseNumber'),
+    ('collectionMethod', 'SessionCollectionMethod'),
+    ('date', 'SessionCollectionDate'),
+]
+
+REPORT_TRAILING_COLUMNS = [
+    # House metadata
+    ('peopleSlept', 'NumPeopleSleptInHouse'),
+    ('irsSprayed', 'WasIrsConducted'),
+    ('monthsAgo', 'MonthsSinceIrs'),
+    ('totalLLIN', 'NumLlinsAvailable'),
+    ('llinType', 'LlinType'),
+    ('llinBrand', 'LlinBrand'),
+    ('peopleSleptUnderLlin', 'NumPeopleSleptUnderLlin'),
+    # Additional fields
+    ('name', 'SessionCollectorName'),
+    ('site code', 'SiteID'),
+    ('health centre', 'SiteHealthCenter'),
+    ('parish', 'SiteParish'),
+    ('village', None),
+    ('coded house number', None),
+    ('Latitude', None),
+    ('Longitude', None),
+    ('House Type', None),
+    ('Title of Officer', 'SessionCollectorTitle'),
+]
+
+# Sex codes
+_SEX_OTHER, _SEX_MALE, _SEX_FEMALE = 0, 1, 2
+_NO_SPECIES = len(REPORT_SPECIES)
+
+
+def _classify_unique(df: pd.DataFrame, col: str, classify) -> np.ndarray:
+    """
+    Classify a column by its distinct values only
+
+    Each distinct value is matched as str(value).lower(); a missing column
+    behaves like a column of empty strings.
+
+    Args:
+        df: Specimens data
+        col: Column to classify
+        classify: Function mapping a Series of distinct lower-cased strings to integer codes
+
+    Returns:
+        Integer code per row
+    """
+    if col not in df.columns:
+        return np.repeat(classify(pd.Series([''], dtype=object)), len(df)).astype(np.int64)
+    codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+    lowered = pd.Series([str(value).lower() for value in uniques], dtype=object)
+    lookup = np.asarray(classify(lowered), dtype=np.int64)
+    return lookup[codes]
+
+
+def _species_codes(species: pd.Series) -> np.ndarray:
+    """Index into REPORT_SPECIES, or _NO_SPECIES when nothing matches"""
+    result = np.full(len(species), _NO_SPECIES, dtype=np.int64)
+    # Walk in reverse so earlier needles take precedence
+    for code in range(len(REPORT_SPECIES) - 1, -1, -1):
+        needle = REPORT_SPECIES[code][0]
+        result[species.str.contains(needle, regex=False).to_numpy()] = code
+    return result
+
+
+def _status_codes(abdomen: pd.Series) -> np.ndarray:
+    """Index into REPORT_STATUSES; unmatched statuses default to unfed"""
+    unfed = abdomen.str.contains('unfed', regex=False).to_numpy()
+    fed = (
+        abdomen.str.contains('fed', regex=False) | abdomen.str.contains('blood', regex=False)
+    ).to_numpy()
+    gravid = abdomen.str.contains('gravid', regex=False).to_numpy()
+    return np.select([unfed, fed, gravid], [0, 1, 2], default=0)
+
+
+def _sex_codes(sex: pd.Series) -> np.ndarray:
+    """
+    Sex code per value
+
+    'male' is tested first and also matches 'female', so females land in the
+    *Male counters exactly as in the established report; the *Female counters
+    stay zero. Kept as-is so the report stays byte-identical.
+    """
+    male = sex.str.contains('male', regex=False).to_numpy()
+    female = sex.str.contains('female', regex=False).to_numpy()
+    return np.select([male, female], [_SEX_MALE, _SEX_FEMALE], default=_SEX_OTHER)
+
+
+def count_specimens_by_session(sessions: pd.Index, specimens_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build every report counter for the given sessions in a single pass
+
+    Args:
+        sessions: Unique SessionIDs, in report order
+        specimens_df: Cleaned specimens data
+
+    Returns:
+        DataFrame indexed like `sessions` with one int64 column per counter
+    """
+    n_species = len(REPORT_SPECIES) + 1
+    n_cells = n_species * len(REPORT_STATUSES) * 3
+
+    if 'SessionID' in specimens_df.columns and len(specimens_df) > 0:
+        session_codes = sessions.get_indexer(specimens_df['SessionID'])
+        keep = session_codes >= 0
+        matched = specimens_df.loc[keep]
+        session_codes = session_codes[keep]
+    else:
+        matched = specimens_df.iloc[0:0]
+        session_codes = np.empty(0, dtype=np.int64)
+
+    species = _classify_unique(matched, 'Species', _species_codes)
+    status = _classify_unique(matched, 'AbdomenStatus', _status_codes)
+    sex = _classify_unique(matched, 'Sex', _sex_codes)
+
+    # One (session x species x status x sex) count matrix
+    cell = (species * len(REPORT_STATUSES) + status) * 3 + sex
+    cube = np.bincount(
+        session_codes * n_cells + cell, minlength=len(sessions) * n_cells
+    ).reshape(len(sessions), n_species, len(REPORT_STATUSES), 3)
+
+    by_species = cube.sum(axis=(2, 3))
+    anopheles = [code for code, spec in enumerate(REPORT_SPECIES) if spec[4]]
+
+    counts = {
+        'total': by_species.sum(axis=1),
+        'totalAnopheles': by_species[:, anopheles].sum(axis=1),
+    }
+    counts['totalOtherMosquitoes'] = counts['total'] - counts['totalAnopheles']
+    counts['maleAnopheles'] = cube[:, anopheles][..., _SEX_MALE].sum(axis=(1, 2))
+
+    for code, (_, prefix, male_col, female_col, _) in enumerate(REPORT_SPECIES):
+        for status_code, suffix in enumerate(REPORT_STATUSES):
+            counts[f'{prefix}{suffix}'] = cube[:, code, status_code, :].sum(axis=1)
+        counts[male_col] = cube[:, code, :, _SEX_MALE].sum(axis=1)
+        counts[female_col] = cube[:, code, :, _SEX_FEMALE].sum(axis=1)
+
+    return pd.DataFrame(
+        {col: values.astype(np.int64) for col, values in counts.items()},
+        index=sessions
+    )
+
+
+def build_vectorcam_report(surveillance_df: pd.DataFrame,
+                           specimens_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Build the VectorCam report: one row per house (session) with species counts
+
+    Args:
+        surveillance_df: Cleaned surveillance data
+        specimens_df: Cleaned specimens data
+
+    Returns:
+        Report DataFrame in VectorCam column order
+    """
+    # First surveillance row per session, in order of appearance
+    houses = surveillance_df[surveillance_df['SessionID'].notna()]
+    houses = houses.drop_duplicates(subset='SessionID', keep='first').reset_index(drop=True)
+
+    if len(houses) == 0:
+        return pd.DataFrame()
+
+    sessions = pd.Index(houses['SessionID'])
+    counts = count_specimens_by_session(sessions, specimens_df).reset_index(drop=True)
+
+    def metadata(columns):
+        out = {}
+        for report_col, source_col in columns:
+            if source_col is not None and source_col in houses.columns:
+                out[report_col] = houses[source_col]
+            elif report_col == 'houseNumber':
+                out[report_col] = houses['SessionID']
+            else:
+                out[report_col] = ''
+        return pd.DataFrame(out, index=houses.index)
+
+    return pd.concat(
+        [metadata(REPORT_LEADING_COLUMNS), counts, metadata(REPORT_TRAILING_COLUMNS)],
+        axis=1
+    )
@@ -0,0 +1,296 @@
+"""
+Run Profiler Module
+Per-stage wall time, CPU time, memory and row counts for pipeline runs
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import logging
+from typing import Optional, List, Dict, Any
+
+import config
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+_MB = 1024 * 1024
+
+
+_STATM = Path('/proc/self/statm')
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident memory of the process right now in MB (psutil, else /proc), if available"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / _MB
+    try:
+        resident_pages = int(_STATM.read_text().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / _MB
+
+
+def peak_rss_mb() -> Optional[float]:
+    """High-water mark of the process's resident memory in MB, if the OS reports it"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / _MB if sys.platform == 'darwin' else peak / 1024
+
+
+class RunProfiler:
+    """
+    Measures pipeline stages and writes a JSON run report
+
+    Each stage records wall time, CPU time, rows in/out and its memory:
+    the process's resident memory (RSS) when it started and finished, the
+    difference, and the highest RSS sampled while it ran (every
+    rss_interval seconds, on a background thread). The process-lifetime
+    RSS high-water mark is reported next to them; it only grows, so it is
+    not a per-stage figure. With tracemalloc on, the traced allocation
+    peak is recorded as well. Stages may nest (e.g. the session filter
+    inside specimen cleaning); an outer stage's memory peak includes its
+    inner stages. Optionally each top-level stage is run under cProfile and
+    dumped to <stage>.prof.
+    """
+
+    def __init__(self, run_id: Optional[str] = None, output_dir: Optional[Path] = None,
+                 trace_memory: bool = config.PROFILE_TRACEMALLOC,
+                 cprofile: bool = config.PROFILE_CPROFILE,
+                 rss_interval: float = config.PROFILE_RSS_INTERVAL_S):
+        """
+        Initialize RunProfiler
+
+        Args:
+            run_id: Run timestamp (YYYYmmdd_HHMMSS). If None, uses current time
+            output_dir: Where reports go. If None, uses config.LOGS_DIR
+            trace_memory: Track Python/NumPy allocations with tracemalloc.
+                Slows allocation-heavy stages several-fold and serializes
+                allocations across threads, so it is off by default
+            cprofile: Dump a cProfile file per top-level stage
+            rss_interval: Seconds between RSS samples while a stage is open (0 disables sampling)
+        """
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.output_dir = Path(output_dir or config.LOGS_DIR)
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.stages: List[Dict[str, Any]] = []
+        self._started_tracing = False
+        # Stages may run on several threads: each thread nests its own stages
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open: Dict[int, List[Dict[str, Any]]] = {}
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self.rss_interval = rss_interval
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_stop = threading.Event()
+
+    @property
+    def report_path(self) -> Path:
+        """JSON run report, next to the summary report"""
+        return self.output_dir / f'run_report_{self.run_id}.json'
+
+    @property
+    def profile_dir(self) -> Path:
+        """Directory for per-stage cProfile dumps"""
+        return self.output_dir / f'profile_{self.run_id}'
+
+    def _traced_peak(self) -> int:
+        """Peak traced bytes since the last reset"""
+        return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+    def _thread_stack(self) -> List[Dict[str, Any]]:
+        """Open stages of the calling thread, outermost first"""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _sample_rss(self):
+        """Raise the RSS peak of every open stage to the current RSS while any stage is open"""
+        while True:
+            self._sampler_stop.wait(self.rss_interval)
+            rss = current_rss_mb()
+            with self._lock:
+                if rss is None or self._sampler_stop.is_set() or not any(self._open.values()):
+                    self._sampler = None
+                    return
+                for open_stack in self._open.values():
+                    for open_record in open_stack:
+                        open_record['_rss_peak'] = max(open_record['_rss_peak'], rss)
+
+    def _start_sampler(self):
+        """Start the RSS sampling thread if it is not running (caller holds the lock)"""
+        if self.rss_interval <= 0 or self._sampler is not None:
+            return
+        self._sampler_stop.clear()
+        self._sampler = threading.Thread(target=self._sample_rss, name='rss-sampler', daemon=True)
+        self._sampler.start()
+
+    def _others_running(self) -> bool:
+        """Whether a stage is open on another thread (caller holds the lock)"""
+        me = threading.get_ident()
+        return any(stack for ident, stack in self._open.items() if ident != me)
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """
+        Measure a block as one stage
+
+        The yielded record is a dict; set record['rows_out'] (or any other
+        field) inside the block to include it in the report.
+
+        Stages running at the same time on other threads share the process's
+        memory; such records are marked concurrent=True and their traced
+        peak is the peak of the whole overlapping window. cpu_s is process
+        CPU time during the stage, thread_cpu_s the stage's own thread.
+
+        Args:
+            name: Stage name
+            rows_in: Rows the stage reads, if known up front
+        """
+        stack = self._thread_stack()
+        parent = stack[-1] if stack else None
+        record = {
+            'stage': name,
+            'parent': parent['stage'] if parent else None,
+            'status': 'ok',
+            'rows_in': rows_in,
+            'rows_out': None,
+            'concurrent': False,
+            '_peak': 0,
+        }
+        rss_start = current_rss_mb()
+        record['_rss_peak'] = rss_start or 0
+
+        with self._lock:
+            if self.trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if parent is not None:
+                parent['_peak'] = max(parent['_peak'], self._traced_peak())
+            if self._others_running():
+                # Resetting the peak would hide memory used by the other stages
+                for open_stack in self._open.values():
+                    for open_record in open_stack:
+                        open_record['concurrent'] = True
+                record['concurrent'] = True
+            elif tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            record['_traced_start'] = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+            stack.append(record)
+            self._open[threading.get_ident()] = stack
+            self.stages.append(record)
+            if rss_start is not None:
+                self._start_sampler()
+
+        profiler = None
+        if self.cprofile and parent is None:
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        thread_cpu_start = time.thread_time()
+        try:
+            yield record
+        except BaseException:
+            record['status'] = 'error'
+            raise
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+            record['thread_cpu_s'] = round(time.thread_time() - thread_cpu_start, 4)
+
+            if profiler is not None:
+                profiler.disable()
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profile_path = self.profile_dir / f'{name}.prof'
+                profiler.dump_stats(profile_path)
+                record['profile'] = str(profile_path)
+
+            with self._lock:
+                stack.pop()
+                peak = max(record.pop('_peak'), self._traced_peak())
+                traced_start = record.pop('_traced_start')
+                if tracemalloc.is_tracing():
+                    record['traced_peak_mb'] = round(peak / _MB, 2)
+                    record['traced_growth_mb'] = round((peak - traced_start) / _MB, 2)
+                    if not self._others_running():
+                        tracemalloc.reset_peak()
+                if parent is not None:
+                    parent['_peak'] = max(parent['_peak'], peak)
+                    parent['concurrent'] = parent['concurrent'] or record['concurrent']
+                rss_end = current_rss_mb()
+                rss_peak = record.pop('_rss_peak')
+                if rss_start is not None and rss_end is not None:
+                    record['rss_start_mb'] = round(rss_start, 2)
+                    record['rss_end_mb'] = round(rss_end, 2)
+                    record['rss_delta_mb'] = round(rss_end - rss_start, 2)
+                    record['rss_peak_mb'] = round(max(rss_peak, rss_end), 2)
+                    if parent is not None:
+                        parent['_rss_peak'] = max(parent['_rss_peak'], record['rss_peak_mb'])
+                record['lifetime_peak_rss_mb'] = peak_rss_mb()
+
+            logger.info(
+                f"Stage {name}: {record['wall_s']:.2f}s wall, {record['cpu_s']:.2f}s CPU"
+                + (f", rows {record['rows_in']} -> {record['rows_out']}"
+                   if record['rows_in'] is not None or record['rows_out'] is not None else "")
+            )
+
+    def write_report(self, **extra) -> Path:
+        """
+        Write the JSON run report
+
+        Can be called again as later stages finish; the file is rewritten.
+
+        Args:
+            **extra: Run-level fields to include (e.g. success, options)
+
+        Returns:
+            Report path
+        """
+        with self._lock:
+            stages = [dict(record) for record in self.stages]
+        report = {
+            'run_id': self.run_id,
+            'written_at': datetime.now().isoformat(),
+            'wall_s': round(time.perf_counter() - self._wall_start, 4),
+            'cpu_s': round(time.process_time() - self._cpu_start, 4),
+            # Exceeds wall_s when stages overlap
+            'stage_wall_s': round(sum(s.get('wall_s', 0) for s in stages if s['parent'] is None), 4),
+            'peak_rss_mb': peak_rss_mb(),
+            'rss_mb': current_rss_mb(),
+            'tracemalloc': self.trace_memory,
+            **extra,
+            'stages': stages,
+        }
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.report_path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info(f"Run report written: {self.report_path}")
+        return self.report_path
+
+    def stop(self):
+        """Stop RSS sampling, and tracemalloc if this profiler started it"""
+        self._sampler_stop.set()
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
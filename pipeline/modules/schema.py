@@ -0,0 +1,283 @@
+"""
+Schema Module
+Typed column registry for the VectorCam surveillance and specimens CSVs
+"""
+import logging
+from typing import Dict, Optional, Any
+
+import pandas as pd
+
+from modules.timestamps import parse_timestamps
+
+logger = logging.getLogger(__name__)
+
+
+# Column kinds and the pandas dtype each one is parsed into.
+# 'category' columns are low-cardinality labels; they are read as plain
+# strings unless a reader asks for categorical=True.
+# 'timestamp' columns are parsed after reading into tz-aware UTC datetimes
+# by the shared parser in modules.timestamps.
+# 'int', 'float' and 'bool' columns are read as strings (LENIENT_KINDS) and
+# coerced by apply_schema, so a malformed cell ('2.5' in an int column,
+# 'yes' in a bool one) becomes missing instead of failing the whole read.
+KIND_DTYPES = {
+    'int': 'Int64',
+    'float': 'float64',
+    'bool': 'boolean',
+    'string': 'object',
+    'category': 'category',
+    'timestamp': 'datetime64[ns, UTC]',
+}
+
+LENIENT_KINDS = ('int', 'float', 'bool')
+
+# Spellings of booleans accepted in CSVs and older snapshots (compared lower-cased)
+BOOL_VALUES = {'true': True, 'false': False}
+
+# Session, site, program and device columns shared by both exports
+_SESSION_COLUMNS = {
+    'SessionID': 'int',
+    'SessionFrontendID': 'string',
+    'SessionHouseNumber': 'string',
+    'SessionCollectorTitle': 'category',
+    'SessionCollectorName': 'category',
+    'SessionCollectionDate': 'timestamp',
+    'SessionCollectionMethod': 'category',
+    'SessionSpecimenCondition': 'category',
+    'SessionNotes': 'string',
+    'SessionCreatedAt': 'timestamp',
+    'SessionCompletedAt': 'timestamp',
+    'SessionSubmittedAt': 'timestamp',
+    'SessionUpdatedAt': 'timestamp',
+    'SessionLatitude': 'float',
+    'SessionLongitude': 'float',
+    'SessionType': 'category',
+    'SessionCollectorLastTrainedOn': 'timestamp',
+    'SessionHardwareID': 'category',
+    'SiteID': 'int',
+    'SiteDistrict': 'category',
+    'SiteSubCounty': 'category',
+    'SiteParish': 'category',
+    'SiteVillageName': 'category',
+    'SiteHouseNumber': 'string',
+    'SiteIsActive': 'bool',
+    'SiteHealthCenter': 'category',
+    'ProgramID': 'int',
+    'ProgramName': 'category',
+    'ProgramCountry': 'category',
+    'DeviceID': 'int',
+    'DeviceModel': 'category',
+    'DeviceRegisteredAt': 'timestamp',
+    'DataQualityFlag': 'category',
+}
+
+SURVEILLANCE_SCHEMA = {
+    'ID': 'int',
+    'NumPeopleSleptInHouse': 'int',
+    'WasIrsConducted': 'category',
+    'MonthsSinceIrs': 'float',
+    'NumLlinsAvailable': 'int',
+    'LlinType': 'category',
+    'LlinBrand': 'category',
+    'NumPeopleSleptUnderLlin': 'int',
+    'CreatedAt': 'timestamp',
+    'UpdatedAt': 'timestamp',
+    **_SESSION_COLUMNS,
+    # Added by DataProcessor.clean_surveillance_data
+    'CollectionYear': 'int',
+    'CollectionMonth': 'int',
+    'CollectionYearMonth': 'string',
+    'CollectionQuarter': 'int',
+    'LlinUsageRate': 'float',
+}
+
+SPECIMENS_SCHEMA = {
+    'SpecimenID': 'string',
+    'ShouldProcessFurther': 'bool',
+    'ImageID': 'int',
+    'ImageUrl': 'string',
+    'ImageS3Key': 'string',
+    'Species': 'category',
+    'Sex': 'category',
+    'AbdomenStatus': 'category',
+    'CapturedAt': 'timestamp',
+    'ImageSubmittedAt': 'timestamp',
+    'ImageUpdatedAt': 'timestamp',
+    **_SESSION_COLUMNS,
+    # Added by DataProcessor.clean_specimens_data
+    'CaptureYear': 'int',
+    'CaptureMonth': 'int',
+    'CaptureYearMonth': 'string',
+    'CaptureQuarter': 'int',
+    'SpeciesGroup': 'category',
+    'IsFed': 'bool',
+    'IsUnfed': 'bool',
+}
+
+SCHEMAS = {
+    'surveillance': SURVEILLANCE_SCHEMA,
+    'specimens': SPECIMENS_SCHEMA,
+}
+
+
+def get_schema(data_type: str) -> Dict[str, str]:
+    """
+    Column -> kind mapping for a data type
+
+    Args:
+        data_type: 'surveillance' or 'specimens'
+
+    Returns:
+        Schema dict
+    """
+    try:
+        return SCHEMAS[data_type]
+    except KeyError:
+        raise ValueError(f"Unknown data type: {data_type!r} (expected one of {sorted(SCHEMAS)})")
+
+
+def _column_dtype(kind: str, categorical: bool) -> str:
+    """Pandas dtype for a column kind"""
+    if kind == 'category' and not categorical:
+        return 'object'
+    return KIND_DTYPES[kind]
+
+
+def csv_dtypes(data_type: str, categorical: bool = False) -> Dict[str, str]:
+    """
+    dtype mapping to pass to pd.read_csv
+
+    Timestamp columns are left out and LENIENT_KINDS columns are read as
+    strings; apply_schema parses both after reading. Columns missing from a
+    file are ignored by pandas.
+
+    Args:
+        data_type: 'surveillance' or 'specimens'
+        categorical: Read 'category' columns as pandas categoricals
+
+    Returns:
+        Column -> dtype dict
+    """
+    return {
+        col: 'object' if kind in LENIENT_KINDS else _column_dtype(kind, categorical)
+        for col, kind in get_schema(data_type).items()
+        if kind != 'timestamp'
+    }
+
+
+def apply_schema(df: pd.DataFrame, data_type: str, categorical: bool = False) -> pd.DataFrame:
+    """
+    Cast a frame to the registry dtypes
+
+    Columns already holding their registry dtype are left untouched.
+    Everything else is coerced: values that do not fit a numeric column
+    (including non-integers in an int column) or a bool column become
+    missing.
+
+    Args:
+        df: Surveillance or specimens DataFrame
+        data_type: 'surveillance' or 'specimens'
+        categorical: Cast 'category' columns to pandas categoricals
+
+    Returns:
+        DataFrame with registry dtypes (unknown columns are kept as-is)
+    """
+    converted: Dict[str, Any] = {}
+
+    for col, kind in get_schema(data_type).items():
+        if col not in df.columns:
+            continue
+        values = df[col]
+        dtype = _column_dtype(kind, categorical)
+
+        if kind == 'timestamp':
+            if str(values.dtype) != dtype:
+                converted[col] = parse_timestamps(values)
+        elif str(values.dtype) == dtype:
+            continue
+        elif kind in ('int', 'float'):
+            numbers = pd.to_numeric(values, errors='coerce')
+            if kind == 'int':
+                numbers = numbers.where(numbers % 1 == 0)
+            converted[col] = numbers.astype(dtype)
+        elif kind == 'bool':
+            if values.dtype == object:
+                values = values.astype(str).str.strip().str.lower().map(BOOL_VALUES)
+            converted[col] = values.astype(dtype)
+        elif kind == 'category' and not categorical and isinstance(values.dtype, pd.CategoricalDtype):
+            converted[col] = values.astype(object)
+        else:
+            converted[col] = values.astype(dtype)
+
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def categorize(df: pd.DataFrame, data_type: str) -> pd.DataFrame:
+    """
+    Cast the schema's 'category' columns to pandas categoricals
+
+    Categories are limited to the values present, so counts and groupbys on
+    the result do not report empty labels. Filtering a categorical frame
+    later keeps its categories; use observed=True in groupbys and
+    observed_counts() instead of value_counts() on such subsets.
+
+    Args:
+        df: Surveillance or specimens DataFrame
+        data_type: 'surveillance' or 'specimens'
+
+    Returns:
+        DataFrame with categorical label columns
+    """
+    converted = {}
+    for col, kind in get_schema(data_type).items():
+        if kind != 'category' or col not in df.columns:
+            continue
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            converted[col] = values.cat.remove_unused_categories()
+        else:
+            converted[col] = values.astype('category')
+
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def observed_counts(values: pd.Series) -> pd.Series:
+    """
+    value_counts() without the zero rows a categorical adds for unused labels
+
+    Args:
+        values: Series of labels (categorical or not)
+
+    Returns:
+        Counts per label present, largest first
+    """
+    counts = values.value_counts()
+    return counts[counts > 0]
+
+
+def read_vectorcam_csv(source, data_type: str, engine: Optional[str] = 'pyarrow',
+                       categorical: bool = False, **kwargs) -> pd.DataFrame:
+    """
+    Read a VectorCam CSV straight into registry dtypes
+
+    Args:
+        source: Path or file-like object
+        data_type: 'surveillance' or 'specimens'
+        engine: pandas CSV engine ('pyarrow', 'c' or 'python')
+        categorical: Read 'category' columns as pandas categoricals
+        **kwargs: Passed through to pd.read_csv
+
+    Returns:
+        Typed DataFrame
+    """
+    df = pd.read_csv(
+        source,
+        engine=engine,
+        dtype=csv_dtypes(data_type, categorical=categorical),
+        **kwargs
+    )
+    return apply_schema(df, data_type, categorical=categorical)
@@ -0,0 +1,241 @@
+"""
+Snapshot Store Module
+Content-addressed storage for raw extracted data
+"""
+import bisect
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+import logging
+from typing import Optional, List, Dict, Any, Union
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def frame_hash(df: pd.DataFrame) -> str:
+    """
+    Hash a DataFrame's schema and content
+
+    Row order is ignored, so an incremental merge that only reorders rows
+    maps to the same object.
+
+    Args:
+        df: DataFrame to hash
+
+    Returns:
+        Hex digest that changes whenever columns, dtypes or any row change
+    """
+    digest = hashlib.sha256()
+    schema = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    digest.update(json.dumps(schema).encode())
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digest.update(np.sort(row_hashes).tobytes())
+    return digest.hexdigest()
+
+
+class RawSnapshotStore:
+    """
+    Stores each extracted frame once, keyed by its content hash
+
+    Layout under the root directory:
+        objects/<hash>.parquet       one file per distinct frame content
+        manifest.json                snapshot catalog (see below)
+        <type>_<YYYY_MM>.parquet     monthly alias linked to the latest object
+
+    The manifest indexes snapshots per data type:
+        {"latest": {type: entry}, "snapshots": {type: [entry, ...]}}
+    where each entry holds timestamp, hash, rows and schema, and each list is
+    in timestamp order. Latest lookups are a dict access and as-of lookups a
+    binary search; no snapshot files are listed or stat()ed.
+
+    A list only grows when content changes (a run storing the same content
+    as the snapshot in effect adds no entry), and keeps the newest
+    `history` entries; objects no entry refers to any more are deleted.
+    """
+
+    def __init__(self, root: Optional[Path] = None, history: Optional[int] = None):
+        """
+        Initialize RawSnapshotStore
+
+        Args:
+            root: Store directory. If None, uses config.RAW_DATA_DIR
+            history: Entries kept per data type (0 keeps all). If None, uses config.SNAPSHOT_HISTORY
+        """
+        self.root = Path(root or config.RAW_DATA_DIR)
+        self.history = config.SNAPSHOT_HISTORY if history is None else history
+        self.objects_dir = self.root / 'objects'
+        self.manifest_path = self.root / 'manifest.json'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        """Load the snapshot catalog"""
+        if not self.manifest_path.exists():
+            return {'latest': {}, 'snapshots': {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        """Atomically replace the manifest"""
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def object_path(self, object_hash: str) -> Path:
+        """Path of the Parquet object for a content hash"""
+        return self.objects_dir / f"{object_hash}.parquet"
+
+    def _link_alias(self, alias: Path, target: Path):
+        """Point alias at target without copying data where the filesystem allows"""
+        # rename() is a no-op between two links to the same file, so skip early
+        if alias.exists() and os.path.samefile(alias, target):
+            return
+        
+        tmp_alias = alias.with_suffix('.parquet.tmp')
+        if tmp_alias.exists():
+            tmp_alias.unlink()
+        try:
+            os.link(target, tmp_alias)
+        except OSError:
+            shutil.copyfile(target, tmp_alias)
+        os.replace(tmp_alias, alias)
+
+    def put(self, data_type: str, df: pd.DataFrame,
+            timestamp: Optional[str] = None) -> Path:
+        """
+        Store a frame, writing Parquet only if its content is new
+
+        Args:
+            data_type: 'surveillance' or 'specimens'
+            df: Frame to store
+            timestamp: Snapshot time (YYYYmmdd_HHMMSS). If None, uses current time
+
+        Returns:
+            Path of the monthly alias now pointing at this content
+        """
+        if timestamp is None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        object_hash = frame_hash(df)
+        object_path = self.object_path(object_hash)
+
+        if object_path.exists():
+            logger.info(f"Raw {data_type} unchanged ({object_hash[:12]}) - no new object written")
+        else:
+            tmp_path = object_path.with_suffix('.parquet.tmp')
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, object_path)
+            logger.info(f"Wrote raw {data_type} object {object_hash[:12]} ({len(df)} rows)")
+
+        entry = {
+            'timestamp': timestamp,
+            'data_type': data_type,
+            'hash': object_hash,
+            'rows': len(df),
+            'schema': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        }
+        manifest = self._read_manifest()
+        entries = manifest['snapshots'].setdefault(data_type, [])
+        # Keep each list in timestamp order even if a timestamp is passed in
+        position = bisect.bisect_right(entries, timestamp, key=lambda e: e['timestamp'])
+        if position > 0 and entries[position - 1]['hash'] == object_hash:
+            # The snapshot in effect at this time already has this content
+            logger.info(f"Raw {data_type} snapshot {entries[position - 1]['timestamp']} still current")
+        else:
+            entries.insert(position, entry)
+            manifest['latest'][data_type] = entries[-1]
+            self._prune(manifest, data_type)
+            self._write_manifest(manifest)
+
+        alias = self._alias_path(data_type)
+        self._link_alias(alias, object_path)
+
+        return alias
+
+    def _alias_path(self, data_type: str) -> Path:
+        """Monthly alias (YYYY_MM), always pointing at the latest content"""
+        return self.root / f"{data_type}_{datetime.now().strftime('%Y_%m')}.parquet"
+
+    def _prune(self, manifest: Dict[str, Any], data_type: str):
+        """
+        Drop a data type's entries beyond self.history, oldest first
+
+        Objects that no remaining entry (of any data type) refers to are deleted.
+        """
+        entries = manifest['snapshots'][data_type]
+        if self.history <= 0 or len(entries) <= self.history:
+            return
+        dropped = entries[:-self.history]
+        del entries[:-self.history]
+
+        kept = {entry['hash'] for kept_entries in manifest['snapshots'].values() for entry in kept_entries}
+        orphans = {entry['hash'] for entry in dropped} - kept
+        for object_hash in orphans:
+            self.object_path(object_hash).unlink(missing_ok=True)
+        logger.info(f"Pruned {len(dropped)} old {data_type} snapshot(s) and {len(orphans)} object(s)")
+
+    def latest(self, data_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the newest manifest entry for a data type
+
+        Args:
+            data_type: 'surveillance' or 'specimens'
+
+        Returns:
+            Manifest entry dict, or None if nothing was stored yet
+        """
+        return self._read_manifest()['latest'].get(data_type)
+
+    def resolve(self, data_type: str,
+                as_of: Optional[Union[str, datetime]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the snapshot in effect at a point in time
+
+        Args:
+            data_type: 'surveillance' or 'specimens'
+            as_of: Any timestamp pandas can parse. If None, returns the latest snapshot
+
+        Returns:
+            Newest manifest entry taken at or before as_of, or None if there is none
+        """
+        if as_of is None:
+            return self.latest(data_type)
+
+        cutoff = pd.Timestamp(as_of).strftime('%Y%m%d_%H%M%S')
+        entries = self._read_manifest()['snapshots'].get(data_type, [])
+        position = bisect.bisect_right(entries, cutoff, key=lambda e: e['timestamp'])
+        return entries[position - 1] if position > 0 else None
+
+    def load(self, data_type: str,
+             as_of: Optional[Union[str, datetime]] = None,
+             columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        Load a snapshot, optionally reading only some columns
+
+        Args:
+            data_type: 'surveillance' or 'specimens'
+            as_of: Any timestamp pandas can parse. If None, loads the latest snapshot
+            columns: Columns to read; names not in the snapshot are skipped.
+                If None, reads all columns
+
+        Returns:
+            DataFrame, or None if no matching snapshot exists
+        """
+        entry = self.resolve(data_type, as_of)
+        if entry is None:
+            return None
+
+        if columns is not None:
+            columns = [col for col in columns if col in entry['schema']]
+
+        path = self.object_path(entry['hash'])
+        logger.info(f"Loading {data_type} snapshot {entry['timestamp']} from {path}")
+        return pd.read_parquet(path, columns=columns)
@@ -0,0 +1,147 @@
+"""
+Species Module
+Normalizes species labels and assigns species groups on distinct values only
+"""
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# Canonical name for each known spelling. Keys are lookup keys (see
+# species_key): case-folded with whitespace collapsed, so one entry covers
+# 'culex', 'CULEX' and ' Culex '.
+SPECIES_ALIASES = {
+    # Non-mosquito variations
+    'non-mosquito': 'Non-Mosquito',
+    'non mosquito': 'Non-Mosquito',
+
+    # Unknown variations, including missing values
+    'unknown': 'Unknown',
+    '': 'Unknown',
+    'nan': 'Unknown',
+    'none': 'Unknown',
+    'null': 'Unknown',
+
+    # Anopheles variations
+    'anopheles gambiae': 'Anopheles gambiae',
+    'anopheles funestus': 'Anopheles funestus',
+    'anopheles other': 'Anopheles other',
+
+    # Other genera
+    'culex': 'Culex',
+    'mansonia': 'Mansonia',
+    'aedes': 'Aedes',
+}
+
+# Species group rules: (needles, group). Matched in order against the
+# lower-cased canonical name, so 'gambiae' wins over 'anopheles'.
+SPECIES_GROUP_RULES = [
+    (('gambiae',), 'Anopheles gambiae complex'),
+    (('funestus',), 'Anopheles funestus group'),
+    (('arabiensis',), 'Anopheles arabiensis'),
+    (('anopheles',), 'Other Anopheles'),
+    (('culex',), 'Culex (nuisance)'),
+    (('aedes',), 'Aedes (arbovirus vector)'),
+    (('non-mosquito', 'non mosquito'), 'Non-mosquito'),
+]
+
+# Labels that mean "not identified"; their group is 'Unknown'
+UNIDENTIFIED_SPECIES = ('N/A', 'Unknown')
+DEFAULT_SPECIES_GROUP = 'Other'
+
+
+def species_key(value) -> str:
+    """Lookup key for a raw species label: case-folded, whitespace collapsed"""
+    return ' '.join(str(value).split()).casefold()
+
+
+def map_unique(values: pd.Series, func: Callable[[object], str]) -> pd.Series:
+    """
+    Map a column through func, calling it once per distinct value
+
+    Args:
+        values: Column to map (missing values are passed to func as-is)
+        func: Function from a raw value to its label
+
+    Returns:
+        Categorical Series of labels, aligned with values
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    labels = pd.Index([func(value) for value in uniques], dtype=object)
+    label_codes, categories = pd.factorize(labels)
+    return pd.Series(
+        pd.Categorical.from_codes(label_codes[codes], categories=categories),
+        index=values.index,
+        name=values.name
+    )
+
+
+class SpeciesNormalizer:
+    """Resolves raw species labels to canonical names and species groups"""
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None,
+                 group_rules: Optional[List[Tuple[Tuple[str, ...], str]]] = None,
+                 default_group: str = DEFAULT_SPECIES_GROUP):
+        """
+        Initialize SpeciesNormalizer
+
+        Args:
+            aliases: Raw spelling -> canonical name. If None, uses SPECIES_ALIASES.
+                Keys are normalized with species_key
+            group_rules: Ordered (needles, group) rules. If None, uses SPECIES_GROUP_RULES
+            default_group: Group for identified species that match no rule
+        """
+        aliases = SPECIES_ALIASES if aliases is None else aliases
+        self.aliases = {species_key(raw): name for raw, name in aliases.items()}
+        self.group_rules = SPECIES_GROUP_RULES if group_rules is None else group_rules
+        self.default_group = default_group
+
+    def canonical(self, value) -> str:
+        """
+        Canonical name for one raw label
+
+        Known spellings resolve through the alias table; anything else is
+        kept with surrounding and repeated whitespace removed.
+        """
+        key = species_key(value)
+        if key in self.aliases:
+            return self.aliases[key]
+        return ' '.join(str(value).split())
+
+    def group(self, species) -> str:
+        """Species group for one canonical name"""
+        if pd.isna(species) or species in UNIDENTIFIED_SPECIES:
+            return 'Unknown'
+
+        species_lower = str(species).lower()
+        for needles, group in self.group_rules:
+            if any(needle in species_lower for needle in needles):
+                return group
+        return self.default_group
+
+    def normalize(self, species: pd.Series) -> pd.Series:
+        """
+        Canonical species names for a column
+
+        Args:
+            species: Raw Species column
+
+        Returns:
+            Categorical Series of canonical names; never missing
+        """
+        return map_unique(species, self.canonical)
+
+    def groups(self, species: pd.Series) -> pd.Series:
+        """
+        Species groups for a column of canonical names
+
+        Args:
+            species: Normalized Species column
+
+        Returns:
+            Categorical Series of species groups
+        """
+        return map_unique(species, self.group)
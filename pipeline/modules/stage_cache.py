@@ -0,0 +1,363 @@
+"""
+Stage Cache Module
+Fingerprint-keyed cache of pipeline stage results
+"""
+import hashlib
+import json
+import os
+import pickle
+import threading
+from datetime import datetime
+from pathlib import Path
+import logging
+from typing import Optional, List, Dict, Any, Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# Source files whose contents version every cache key: editing the cleaning,
+# report or metrics code invalidates results computed by the old code
+CODE_FILES = [config.PROJECT_ROOT / 'pipeline.py', *sorted((config.PROJECT_ROOT / 'modules').glob('*.py'))]
+
+_MISSING = object()
+
+
+def _column_bytes(values: pd.Series) -> bytes:
+    """Bytes that identify a column's values in order"""
+    if values.dtype == object:
+        # Hashing Python strings one by one dominates the fingerprint of
+        # frames with ID columns; joined, they are hashed as one buffer
+        # (the null mask is only built when a join fails)
+        array = values.to_numpy()
+        try:
+            return b'S' + '\x00'.join(array).encode('utf-8', 'surrogatepass')
+        except TypeError:  # nulls, or not all strings
+            pass
+        missing = pd.isna(array)
+        try:
+            text = '\x00'.join(array[~missing])
+        except TypeError:  # not all strings
+            pass
+        else:
+            return b'N' + np.packbits(missing).tobytes() + text.encode('utf-8', 'surrogatepass')
+    elif isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufmM':
+        # Plain NumPy columns are their own bytes
+        return b'A' + np.ascontiguousarray(values.to_numpy()).tobytes()
+    return pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes()
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Fingerprint a DataFrame's schema, content and row order
+
+    Unlike snapshot_store.frame_hash, row order counts: stage outputs such
+    as CSV exports are written in frame order.
+
+    Args:
+        df: DataFrame to fingerprint
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    schema = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    digest.update(json.dumps([schema, len(df)]).encode())
+    for position in range(df.shape[1]):
+        column = _column_bytes(df.iloc[:, position])
+        digest.update(len(column).to_bytes(8, 'little'))
+        digest.update(column)
+    return digest.hexdigest()
+
+
+def values_fingerprint(values: Iterable) -> str:
+    """Fingerprint an unordered set of values (e.g. session IDs)"""
+    distinct = sorted(str(value) for value in set(values))
+    return hashlib.sha256(json.dumps(distinct).encode()).hexdigest()
+
+
+def code_version(paths: Optional[List[Path]] = None) -> str:
+    """
+    Hash the pipeline source code
+
+    Args:
+        paths: Files to hash. If None, uses CODE_FILES
+
+    Returns:
+        Hex digest of the files' names and contents
+    """
+    digest = hashlib.sha256()
+    for path in paths or CODE_FILES:
+        digest.update(Path(path).name.encode())
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+class StageResult:
+    """Output of a cached stage: its fingerprint, and its value loaded on first use"""
+
+    def __init__(self, fingerprint: str, value: Any = _MISSING,
+                 loader: Optional[Callable[[], Any]] = None):
+        self.fingerprint = fingerprint
+        self._value = value
+        self._loader = loader
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> Any:
+        # Several stages may ask for the same output at once; load it once
+        with self._lock:
+            if self._value is _MISSING:
+                self._value = self._loader()
+        return self._value
+
+
+class StageCache:
+    """
+    Caches pipeline stage results on disk, keyed by their inputs
+
+    A stage's key hashes its name, the code version and the fingerprints of
+    its inputs. If the key matches the one recorded for the stage on the
+    last run, the stage is skipped: data stages return their stored output,
+    side-effect stages (DB writes, exports) are known to be done already.
+
+    Layout under the root directory:
+        manifest.json            {stage: {key, fingerprint, outputs, created_at}}
+        objects/<key>.parquet    frame outputs
+        objects/<key>.pkl        other outputs (e.g. the metrics dict)
+
+    Only the latest entry per stage is kept, so the cache holds one run's
+    worth of objects. Stages may be looked up and recorded from several
+    threads at once.
+    """
+
+    def __init__(self, root: Optional[Path] = None, enabled: bool = True,
+                 version: Optional[str] = None):
+        """
+        Initialize StageCache
+
+        Args:
+            root: Cache directory. If None, uses config.STAGE_CACHE_DIR
+            enabled: If False, every lookup misses (results are still recorded)
+            version: Code version mixed into every key. If None, hashes CODE_FILES
+        """
+        self.root = Path(root or config.STAGE_CACHE_DIR)
+        self.objects_dir = self.root / 'objects'
+        self.manifest_path = self.root / 'manifest.json'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.enabled = enabled
+        self.version = version or code_version()
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        """Load the stage catalog"""
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable stage cache manifest: {e}")
+            return {}
+
+    def _write_manifest(self):
+        """Atomically replace the manifest"""
+        tmp_path = self.manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def key(self, stage: str, inputs: List[str]) -> str:
+        """
+        Cache key for a stage run
+
+        Args:
+            stage: Stage name
+            inputs: Input fingerprints and parameters, in a fixed order
+
+        Returns:
+            Hex digest
+        """
+        payload = json.dumps([stage, self.version, [str(value) for value in inputs]])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def lookup(self, stage: str, key: str,
+               validate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the recorded entry for a stage if it is still valid
+
+        An entry is valid when its key matches, every path in its 'files'
+        output still exists, and validate (if given) accepts it.
+
+        Args:
+            stage: Stage name
+            key: Key from key()
+            validate: Optional extra check on the entry, e.g. a DB row count
+
+        Returns:
+            Manifest entry on a hit, None on a miss
+        """
+        with self._lock:
+            entry = self._manifest.get(stage)
+        reason = None
+        if not self.enabled:
+            reason = 'cache disabled'
+        elif entry is None:
+            reason = 'not cached'
+        elif entry['key'] != key:
+            reason = 'inputs changed'
+        elif not all(Path(path).exists() for path in entry['outputs'].get('files', [])):
+            reason = 'output files missing'
+        elif validate is not None:
+            try:
+                if not validate(entry):
+                    reason = 'output no longer current'
+            except Exception as e:
+                reason = f'validation failed ({e})'
+
+        if reason is None:
+            self.hits.append(stage)
+            logger.info(f"Stage cache HIT  {stage} ({key[:12]})")
+            return entry
+
+        self.misses.append(stage)
+        logger.info(f"Stage cache MISS {stage} ({key[:12]}): {reason}")
+        return None
+
+    def record(self, stage: str, key: str, fingerprint: Optional[str] = None,
+               outputs: Optional[Dict[str, Any]] = None):
+        """
+        Record a completed stage, replacing (and cleaning up) its previous entry
+
+        Args:
+            stage: Stage name
+            key: Key the stage ran under
+            fingerprint: Fingerprint of the stage's output, for its dependents
+            outputs: JSON-serializable details (paths under 'files' are checked on lookup)
+        """
+        with self._lock:
+            previous = self._manifest.get(stage)
+            self._manifest[stage] = {
+                'key': key,
+                'fingerprint': fingerprint,
+                'outputs': outputs or {},
+                'created_at': datetime.now().isoformat(),
+            }
+            self._write_manifest()
+
+        if previous is not None and previous['key'] != key:
+            for suffix in ('.parquet', '.pkl'):
+                stale = self.objects_dir / f"{previous['key']}{suffix}"
+                if stale.exists():
+                    stale.unlink()
+
+    def _write_object(self, key: str, suffix: str, write: Callable[[Path], None]) -> Path:
+        """Write an object file atomically"""
+        path = self.objects_dir / f"{key}{suffix}"
+        tmp_path = path.with_name(path.name + '.tmp')
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def frame(self, stage: str, inputs: List[str],
+              compute: Callable[[], pd.DataFrame]) -> StageResult:
+        """
+        Run a stage producing a DataFrame, or reuse its stored output
+
+        Args:
+            stage: Stage name
+            inputs: Input fingerprints and parameters
+            compute: Produces the frame on a miss
+
+        Returns:
+            StageResult; on a hit the frame is read from disk only if used
+        """
+        key = self.key(stage, inputs)
+        entry = self.lookup(stage, key, validate=lambda e: (self.objects_dir / f"{key}.parquet").exists())
+        if entry is not None:
+            path = self.objects_dir / f"{key}.parquet"
+            return StageResult(entry['fingerprint'], loader=lambda: pd.read_parquet(path))
+
+        df = compute()
+        fingerprint = frame_fingerprint(df)
+        self._write_object(key, '.parquet', lambda path: df.to_parquet(path, index=False))
+        self.record(stage, key, fingerprint, {'rows': len(df)})
+        return StageResult(fingerprint, value=df)
+
+    def value(self, stage: str, inputs: List[str],
+              compute: Callable[[], Any]) -> StageResult:
+        """
+        Run a stage producing a picklable value, or reuse its stored output
+
+        Args:
+            stage: Stage name
+            inputs: Input fingerprints and parameters
+            compute: Produces the value on a miss
+
+        Returns:
+            StageResult; on a hit the value is unpickled only if used
+        """
+        key = self.key(stage, inputs)
+        entry = self.lookup(stage, key, validate=lambda e: (self.objects_dir / f"{key}.pkl").exists())
+        if entry is not None:
+            path = self.objects_dir / f"{key}.pkl"
+            return StageResult(entry['fingerprint'], loader=lambda: pickle.loads(path.read_bytes()))
+
+        value = compute()
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        fingerprint = hashlib.sha256(data).hexdigest()
+        self._write_object(key, '.pkl', lambda path: path.write_bytes(data))
+        self.record(stage, key, fingerprint)
+        return StageResult(fingerprint, value=value)
+
+    def action(self, stage: str, inputs: List[str],
+               run: Callable[[], Optional[Dict[str, Any]]],
+               validate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+        """
+        Run a side-effect stage (DB write, file export) unless already done
+
+        Args:
+            stage: Stage name
+            inputs: Input fingerprints and parameters
+            run: Performs the stage on a miss; returns JSON-serializable
+                outputs, with any written paths under 'files'
+            validate: Optional check that the side effect is still in place
+
+        Returns:
+            The stage's outputs, from this run or the cached one
+        """
+        key = self.key(stage, inputs)
+        entry = self.lookup(stage, key, validate=validate)
+        if entry is not None:
+            return entry['outputs']
+
+        outputs = run() or {}
+        self.record(stage, key, outputs=outputs)
+        return outputs
+
+    def status(self, stage: str) -> Optional[str]:
+        """'hit' or 'miss' if the stage was looked up in this run, else None"""
+        if stage in self.hits:
+            return 'hit'
+        if stage in self.misses:
+            return 'miss'
+        return None
+
+    def rows(self, stage: str) -> Optional[int]:
+        """Row count recorded for a frame stage"""
+        with self._lock:
+            entry = self._manifest.get(stage)
+        return entry['outputs'].get('rows') if entry else None
+
+    def summary(self) -> str:
+        """One-line hit/miss summary of this run"""
+        return f"{len(self.hits)} hit(s), {len(self.misses)} miss(es)" + (
+            f" - recomputed: {', '.join(self.misses)}" if self.misses else ""
+        )
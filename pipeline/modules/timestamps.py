@@ -0,0 +1,132 @@
+"""
+Timestamps Module
+Shared, cached parsing of VectorCam timestamp columns into tz-aware UTC
+"""
+import logging
+import threading
+from typing import Dict, Any
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+TIMESTAMP_DTYPE = 'datetime64[ns, UTC]'
+
+# UTC offsets seen in VectorCam data: the API writes '...Z', pandas and
+# SQLite round-trips write '...+00:00'. Columns using one of these are parsed
+# as naive ISO 8601 after stripping it, which is several times faster than
+# parsing the offset on every value.
+UTC_SUFFIXES = ('+00:00', 'Z', '+0000')
+
+# Parsed values kept across calls (session timestamps repeat in both exports)
+TIMESTAMP_CACHE_SIZE = 500_000
+
+_NAT = np.iinfo(np.int64).min
+
+
+class TimestampParser:
+    """
+    Parses timestamp strings once per distinct value
+
+    Each call factorizes the column, looks the distinct strings up in a
+    bounded value cache, and parses only the misses. The layout of the misses
+    is detected once per call: a shared UTC suffix takes the fast naive path,
+    anything else falls back to general ISO 8601 parsing with offsets.
+    """
+
+    def __init__(self, max_cache_size: int = TIMESTAMP_CACHE_SIZE):
+        """
+        Initialize TimestampParser
+
+        Args:
+            max_cache_size: Distinct strings to remember; the cache is
+                cleared when it would grow past this
+        """
+        self.max_cache_size = max_cache_size
+        self._cache: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _parse_distinct(self, strings: pd.Series) -> np.ndarray:
+        """Parse distinct non-null values to int64 nanoseconds since the epoch (UTC)"""
+        if strings.map(type).eq(str).all():
+            for suffix in UTC_SUFFIXES:
+                if strings.str.endswith(suffix).all():
+                    naive = pd.to_datetime(
+                        strings.str.slice(0, -len(suffix)), errors='coerce', format='ISO8601'
+                    )
+                    return naive.astype('datetime64[ns]').to_numpy().view(np.int64)
+
+        parsed = pd.to_datetime(strings, errors='coerce', utc=True, format='ISO8601')
+        return parsed.astype(TIMESTAMP_DTYPE).dt.tz_convert(None).to_numpy().view(np.int64)
+
+    def parse(self, values: pd.Series) -> pd.Series:
+        """
+        Parse a column of timestamps into tz-aware UTC datetimes
+
+        Args:
+            values: Strings or datetimes; unparseable values become NaT
+
+        Returns:
+            datetime64[ns, UTC] Series aligned with values
+        """
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            # The pyarrow engine yields second resolution; keep one unit throughout
+            return values.dt.tz_convert('UTC').astype(TIMESTAMP_DTYPE)
+        if pd.api.types.is_datetime64_dtype(values.dtype):
+            return values.dt.tz_localize('UTC').astype(TIMESTAMP_DTYPE)
+
+        codes, uniques = pd.factorize(values)
+        with self._lock:
+            known = [self._cache.get(value) for value in uniques]
+        missing = [i for i, ns in enumerate(known) if ns is None]
+
+        if missing:
+            parsed = self._parse_distinct(pd.Series(uniques[missing], dtype=object))
+            with self._lock:
+                if len(self._cache) + len(missing) > self.max_cache_size:
+                    self._cache.clear()
+                for i, ns in zip(missing, parsed.tolist()):
+                    known[i] = ns
+                    self._cache[uniques[i]] = ns
+        with self._lock:
+            self.hits += len(uniques) - len(missing)
+            self.misses += len(missing)
+
+        lookup = np.append(np.asarray(known, dtype=np.int64), _NAT)
+        nanos = lookup[codes]  # code -1 (missing) picks the trailing NaT
+        return pd.Series(
+            pd.DatetimeIndex(nanos.view('datetime64[ns]')).tz_localize('UTC'),
+            index=values.index,
+            name=values.name
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Distinct values served from the cache vs parsed"""
+        return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache)}
+
+
+_parser = TimestampParser()
+
+
+def parse_timestamps(values: pd.Series) -> pd.Series:
+    """
+    Parse a column of ISO 8601 timestamps into tz-aware UTC datetimes
+
+    Uses the process-wide TimestampParser, so repeated values are parsed once.
+
+    Args:
+        values: Strings or datetimes; unparseable values become NaT
+
+    Returns:
+        datetime64[ns, UTC] Series
+    """
+    return _parser.parse(values)
+
+
+def timestamp_cache_stats() -> Dict[str, int]:
+    """Hit/miss counts of the shared timestamp parser"""
+    return _parser.stats()
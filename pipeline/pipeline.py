@@ -2,9 +2,10 @@
 VectorInsight Data Pipeline
 Main orchestration script that runs the complete pipeline
 """
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
-import json
 from pathlib import Path
 import sys
 
@@ -16,13 +17,17 @@ sys.path.append(str(Path(__file__).parent))
 import config
 from modules.data_extraction import extract_data
 from modules.data_processing import DataProcessor
-from modules.metrics_calculator import calculate_metrics
+from modules.metrics_calculator import flatten_metrics
+from modules.metric_partitions import (
+    ALL_TIME, calculate_partitions, metrics_code_version, partitions_fingerprint, rollup_metrics,
+    stored_partitions
+)
 from modules.database import VectorInsightDB
 from modules.user_tracking import update_user_logs
-from modules.data_processing import (
-    process_data,
-    filter_surveillance_sessions,
-)
+from modules.snapshot_store import RawSnapshotStore
+from modules.run_profiler import RunProfiler
+from modules.stage_cache import StageCache, frame_fingerprint, values_fingerprint
+from modules.data_processing import filter_surveillance_sessions
 
 # Setup logging
 logging.basicConfig(
@@ -36,93 +41,351 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class StageScheduler:
+    """
+    Runs pipeline stages on a thread pool as soon as their dependencies finish
+    
+    Stages that share a resource never run at the same time (SQLite allows
+    one writer, so every stage writing the database uses resource='db').
+    If a required stage fails, no new stages are started, the running ones
+    finish, and the first error is re-raised. A failed optional stage is
+    logged as a warning and only the stages depending on it are skipped.
+    """
+    
+    def __init__(self, max_workers: int = config.PIPELINE_WORKERS, profiler: RunProfiler = None):
+        """
+        Initialize StageScheduler
+        
+        Args:
+            max_workers: Stages run at once (1 runs them one by one in the order added)
+            profiler: If given, each stage is measured as a profiler stage
+        """
+        self.max_workers = max(1, max_workers)
+        self.profiler = profiler
+        self.stages = {}
+        self.results = {}
+        self.skipped = []
+    
+    def add(self, name: str, func, after: tuple = (), resource: str = None,
+            rows_in: int = None, required: bool = True):
+        """
+        Register a stage
+        
+        Args:
+            name: Stage name
+            func: Callable taking no arguments; its return value is stored in results[name].
+                A dict result with a 'rows' key is reported as the stage's rows out
+            after: Names of stages that must finish first
+            resource: Stages with the same resource run one at a time
+            rows_in: Rows the stage reads, for the run report
+            required: If False, a failure is logged and does not fail the run
+        """
+        self.stages[name] = {
+            'func': func,
+            'after': tuple(after),
+            'resource': resource,
+            'rows_in': rows_in,
+            'required': required,
+        }
+    
+    def _run_stage(self, name: str):
+        """Run one stage, measured by the profiler if there is one"""
+        stage = self.stages[name]
+        if self.profiler is None:
+            return stage['func']()
+        
+        with self.profiler.stage(name, rows_in=stage['rows_in']) as record:
+            result = stage['func']()
+            if isinstance(result, dict) and 'rows' in result:
+                record['rows_out'] = result['rows']
+        return result
+    
+    def run(self) -> dict:
+        """
+        Run all registered stages
+        
+        Returns:
+            Stage name -> return value
+        """
+        for name, stage in self.stages.items():
+            unknown = [dep for dep in stage['after'] if dep not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {name} depends on unknown stage(s): {unknown}")
+        
+        pending = dict(self.stages)
+        running = {}
+        busy = set()
+        error = None
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage') as pool:
+            while True:
+                # Start every stage whose dependencies are done and whose resource is free
+                progressed = error is None
+                while progressed:
+                    progressed = False
+                    for name, stage in list(pending.items()):
+                        if any(dep in self.skipped for dep in stage['after']):
+                            logger.warning(f"Skipping stage {name}: a stage it depends on failed")
+                            self.skipped.append(name)
+                            del pending[name]
+                            progressed = True
+                        elif (len(running) < self.max_workers
+                              and all(dep in self.results for dep in stage['after'])
+                              and stage['resource'] not in busy):
+                            if stage['resource'] is not None:
+                                busy.add(stage['resource'])
+                            running[pool.submit(self._run_stage, name)] = name
+                            del pending[name]
+                
+                if not running:
+                    break
+                
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage = self.stages[name]
+                    busy.discard(stage['resource'])
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        if stage['required']:
+                            logger.error(f"Stage {name} failed: {e}")
+                            error = error or e
+                        else:
+                            logger.warning(f"⚠ Optional stage {name} failed: {e}")
+                            self.skipped.append(name)
+        
+        if error is not None:
+            raise error
+        if pending:
+            raise ValueError(f"Stages could not be scheduled (dependency cycle?): {sorted(pending)}")
+        return self.results
+
+
 class VectorInsightPipeline:
     """Main pipeline orchestrator"""
     
-    def __init__(self):
-        """Initialize pipeline"""
+    def __init__(self, profile: bool = config.PROFILE_CPROFILE):
+        """
+        Initialize pipeline
+        
+        Args:
+            profile: If True, dumps a cProfile file per stage next to the run report
+        """
         self.db = VectorInsightDB()
         self.processor = DataProcessor()
         self.start_time = datetime.now()
+        self.profiler = RunProfiler(
+            run_id=self.start_time.strftime('%Y%m%d_%H%M%S'),
+            cprofile=profile
+        )
+        self.cache = None
         
-    def run(self, skip_extraction: bool = False):
+    def run(self, skip_extraction: bool = False, full_refresh: bool = False,
+            backfill: tuple = None, backfill_window: str = None, as_of: str = None,
+            use_cache: bool = config.STAGE_CACHE_ENABLED, workers: int = None):
         """
         Run the complete pipeline
         
         Args:
             skip_extraction: If True, loads from existing files instead of API
+            as_of: With skip_extraction, load the raw snapshot in effect at this time
+            full_refresh: If True, ignores extraction watermarks and re-downloads everything
+            backfill: Optional (start_date, end_date) range to download in date-window shards
+            backfill_window: Shard size for backfill ('week' or 'month')
+            use_cache: If False, recomputes every stage instead of reusing
+                results whose inputs are unchanged since the last run
+            workers: Post-processing stages run at once. If None, uses
+                config.PIPELINE_WORKERS (forced to 1 when profiling with cProfile)
         """
         logger.info("="*80)
         logger.info("Starting VectorInsight Data Pipeline")
         logger.info(f"Timestamp: {self.start_time}")
         logger.info("="*80)
         
+        success = False
         try:
             # Step 1: Data Extraction
-            if skip_extraction:
-                logger.info("Skipping extraction - loading from existing files")
-                surveillance_df, specimens_df = self._load_existing_data()
-            else:
-                logger.info("STEP 1: Extracting data from API")
-                surveillance_df, specimens_df = extract_data(save_raw=True)
+            with self.profiler.stage('extract') as stage:
+                if skip_extraction:
+                    logger.info("Skipping extraction - loading from existing files")
+                    surveillance_df, specimens_df = self._load_existing_data(as_of=as_of)
+                    
+                    if surveillance_df is None or specimens_df is None:
+                        logger.error("No raw snapshot to load!")
+                        return False
+                else:
+                    logger.info("STEP 1: Extracting data from API")
+                    surveillance_df, specimens_df = extract_data(
+                        save_raw=True,
+                        full_refresh=full_refresh,
+                        backfill=backfill,
+                        backfill_window=backfill_window
+                    )
+                    
+                    if surveillance_df is None or specimens_df is None:
+                        logger.error("Data extraction failed!")
+                        return False
+                stage['rows_out'] = len(surveillance_df) + len(specimens_df)
                 
-                if surveillance_df is None or specimens_df is None:
-                    logger.error("Data extraction failed!")
-                    return False
-                
-            from modules.data_processing import filter_surveillance_sessions
-
-            # Filter surveillance to only include completed sessions
-            logger.info("Applying SURVEILLANCE filter to specimens data")
-            specimens_df = filter_surveillance_sessions(specimens_df)
-
-            # Keep only specimens that belong to those sessions
-            # ✅ CORRECT - uses 'SessionID' (capital)
-            if 'SessionID' in specimens_df.columns and 'SessionID' in surveillance_df.columns:
-                surveillance_session_ids = set(surveillance_df['SessionID'].unique())
-                before_count = len(specimens_df)
-                specimens_df = specimens_df[specimens_df['SessionID'].isin(surveillance_session_ids)].copy()
-                after_count = len(specimens_df)
-                logger.info(f"✅ Filtered specimens to match surveillance sessions:")
-                logger.info(f"   Before: {before_count} specimens")
-                logger.info(f"   After: {after_count} specimens")
-                logger.info(f"   Removed: {before_count - after_count} orphaned specimens")
+                cache = StageCache(enabled=use_cache)
+                self.cache = cache
+                raw_surveillance = frame_fingerprint(surveillance_df)
+                raw_specimens = frame_fingerprint(specimens_df)
             
             # Step 2: Data Processing
+            # Each table is cleaned as its own stage, so a change confined to one
+            # table only recomputes that table and the stages that read it
             logger.info("STEP 2: Processing and cleaning data")
-            clean_surveillance, clean_specimens, merged_data = process_data(
-                surveillance_df, specimens_df
-            )
+            with self.profiler.stage('clean_surveillance', rows_in=len(surveillance_df)) as stage:
+                surveillance = cache.frame(
+                    'clean_surveillance', [raw_surveillance],
+                    lambda: self.processor.clean_surveillance_data(surveillance_df)
+                )
+                stage['rows_out'] = cache.rows('clean_surveillance')
             
-            # Step 3: Store in Database
-            logger.info("STEP 3: Storing data in database")
+            session_ids = None
+            if 'SessionID' in surveillance_df.columns:
+                session_ids = surveillance_df['SessionID'].unique()
+            with self.profiler.stage('clean_specimens', rows_in=len(specimens_df)) as stage:
+                specimens = cache.frame(
+                    'clean_specimens',
+                    [raw_specimens, values_fingerprint(session_ids) if session_ids is not None else None],
+                    lambda: self.processor.clean_specimens_data(
+                        self._filter_specimens(specimens_df, session_ids)
+                    )
+                )
+                stage['rows_out'] = cache.rows('clean_specimens')
+            
+            # Steps 3-8 only read the cleaned frames, so they run as a dependency
+            # graph: independent stages overlap, and the run takes about as long
+            # as its longest chain (loads -> metric partitions -> metrics) instead of the sum
+            workers = 1 if self.profiler.cprofile else (workers or config.PIPELINE_WORKERS)
+            logger.info(f"STEPS 3-8: Storing, exporting and calculating metrics ({workers} worker(s))")
             self.db.create_tables()
-            self.db.insert_surveillance_data(clean_surveillance, replace=True)
-            self.db.insert_specimens_data(clean_specimens, replace=True)
+            clean_rows = cache.rows('clean_surveillance') + cache.rows('clean_specimens')
+            
+            scheduler = StageScheduler(max_workers=workers, profiler=self.profiler)
+            
+            # Step 3: Store in Database
+            scheduler.add(
+                'db_surveillance',
+                lambda: cache.action(
+                    'db_surveillance', [surveillance.fingerprint],
+                    lambda: self._insert_table('surveillance_sessions', surveillance.value,
+                                               self.db.insert_surveillance_data),
+                    validate=lambda entry: self._table_rows('surveillance_sessions') == entry['outputs']['rows']
+                ),
+                resource='db', rows_in=cache.rows('clean_surveillance')
+            )
+            scheduler.add(
+                'db_specimens',
+                lambda: cache.action(
+                    'db_specimens', [specimens.fingerprint],
+                    lambda: self._insert_table('specimens', specimens.value,
+                                               self.db.insert_specimens_data),
+                    validate=lambda entry: self._table_rows('specimens') == entry['outputs']['rows']
+                ),
+                resource='db', rows_in=cache.rows('clean_specimens')
+            )
+            # Rebuild the pre-aggregated counts for the days and sessions the
+            # loads touched (a no-op when both loads were cache hits)
+            scheduler.add(
+                'db_aggregates',
+                self.db.refresh_aggregates,
+                after=['db_surveillance', 'db_specimens'], resource='db'
+            )
             
             # Step 4: Export CSV Files
-            logger.info("STEP 4: Exporting CSV files")
-            surv_file, spec_file = self.processor.export_to_csv(
-                clean_surveillance, clean_specimens
+            scheduler.add(
+                'export_csv',
+                lambda: cache.action(
+                    'export_csv', [surveillance.fingerprint, specimens.fingerprint],
+                    lambda: {'files': list(self.processor.export_to_csv(surveillance.value, specimens.value))}
+                ),
+                rows_in=clean_rows
             )
-            report_file = self.processor.export_report_format(
-                clean_surveillance, clean_specimens
+            scheduler.add(
+                'export_report',
+                lambda: cache.action(
+                    'export_report', [surveillance.fingerprint, specimens.fingerprint],
+                    lambda: {'files': [self.processor.export_report_format(surveillance.value, specimens.value)]}
+                ),
+                rows_in=clean_rows
             )
-            logger.info(f"Clean surveillance CSV: {surv_file}")
-            logger.info(f"Clean specimens CSV: {spec_file}")
-            logger.info(f"VectorCam report CSV: {report_file}")
             
             # Step 5: Calculate Metrics
-            logger.info("STEP 5: Calculating metrics")
-            metrics = calculate_metrics(clean_surveillance, clean_specimens, merged_data)
+            # Metrics are stored per data month; only the months whose rows the
+            # loads touched are recalculated, so the work follows the size of
+            # the update rather than the length of the history
+            scheduler.add(
+                'metric_partitions',
+                lambda: self._calculate_metric_partitions(surveillance, specimens),
+                after=['db_surveillance', 'db_specimens'], rows_in=clean_rows
+            )
+            scheduler.add(
+                'store_metric_partitions',
+                lambda: self._store_metric_partitions(scheduler.results['metric_partitions']),
+                after=['metric_partitions'], resource='db'
+            )
+            # All-time metrics are merged from the stored partitions instead of
+            # recalculated from the rows, so they are keyed on the stored
+            # partitions (a partition write retried on a later run, or a
+            # restored database, changes them without changing the frames)
+            scheduler.add(
+                'metrics',
+                lambda: cache.value(
+                    'metrics', [partitions_fingerprint(self.db)],
+                    lambda: rollup_metrics(stored_partitions(self.db))
+                ),
+                after=['store_metric_partitions']
+            )
             
             # Step 6: Store Metrics
-            logger.info("STEP 6: Storing calculated metrics")
-            self._store_metrics(metrics)
+            scheduler.add(
+                'store_metrics',
+                lambda: cache.action(
+                    'store_metrics', [scheduler.results['metrics'].fingerprint],
+                    lambda: self._store_metrics(scheduler.results['metrics'].value),
+                    validate=lambda entry: not self.db.query(
+                        "SELECT 1 FROM monthly_metrics WHERE year_month = ? LIMIT 1", (ALL_TIME,)
+                    ).empty
+                ),
+                after=['metrics'], resource='db'
+            )
             
             # Step 7: Generate Summary Report
-            logger.info("STEP 7: Generating summary report")
-            self._generate_summary_report(metrics)
+            scheduler.add(
+                'summary_report',
+                lambda: cache.action(
+                    'summary_report', [scheduler.results['metrics'].fingerprint],
+                    lambda: {'files': [str(self._generate_summary_report(scheduler.results['metrics'].value))]}
+                ),
+                after=['metrics']
+            )
+            
+            # Step 8: Update user tracking (reads the surveillance table; a
+            # failure here does not fail the run)
+            scheduler.add(
+                'update_user_logs', update_user_logs,
+                after=['db_surveillance'], resource='db', required=False
+            )
+            
+            results = scheduler.run()
+            surv_file, spec_file = results['export_csv']['files']
+            report_file, = results['export_report']['files']
+            logger.info(f"Clean surveillance CSV: {surv_file}")
+            logger.info(f"Clean specimens CSV: {spec_file}")
+            logger.info(f"VectorCam report CSV: {report_file}")
+            if 'update_user_logs' in results:
+                logger.info("✓ User tracking updated successfully")
+            else:
+                logger.warning("Pipeline will continue without user tracking")
+            
+            if cache.misses:
+                logger.info(f"Stage cache: {cache.summary()}")
+            else:
+                logger.info(f"Stage cache: {cache.summary()} - inputs unchanged, nothing to do")
             
             # Pipeline Complete
             end_time = datetime.now()
@@ -131,114 +394,149 @@ class VectorInsightPipeline:
             logger.info("="*80)
             logger.info("Pipeline completed successfully!")
             logger.info(f"Duration: {duration:.2f} seconds")
-            logger.info(f"Surveillance records: {len(clean_surveillance)}")
-            logger.info(f"Specimen records: {len(clean_specimens)}")
+            logger.info(f"Surveillance records: {cache.rows('clean_surveillance')}")
+            logger.info(f"Specimen records: {cache.rows('clean_specimens')}")
             logger.info("="*80)
             
+            success = True
             return True
             
         except Exception as e:
             logger.error(f"Pipeline failed with error: {str(e)}", exc_info=True)
             return False
+        
+        finally:
+            self.write_run_report(success=success)
+            self.db.close()
     
-    def _load_existing_data(self):
-        """Load data from existing Parquet files"""
-        import pandas as pd
+    def write_run_report(self, **extra):
+        """
+        Write the per-stage JSON run report to LOGS_DIR
+        
+        Args:
+            **extra: Run-level fields to include in the report
+        """
+        for record in self.profiler.stages:
+            if self.cache is not None and record['parent'] is None:
+                record['cache'] = self.cache.status(record['stage'])
+        try:
+            self.profiler.write_report(**extra)
+        except OSError as e:
+            logger.warning(f"Could not write run report: {e}")
+    
+    def _load_existing_data(self, as_of: str = None, columns: list = None):
+        """
+        Load data from the raw snapshot store
+        
+        Args:
+            as_of: Load the snapshot in effect at this time. If None, loads the latest
+            columns: Optional subset of columns to read
+        """
+        store = RawSnapshotStore()
+        surveillance_df = store.load('surveillance', as_of=as_of, columns=columns)
+        specimens_df = store.load('specimens', as_of=as_of, columns=columns)
         
-        # Find most recent files
-        raw_files = list(config.RAW_DATA_DIR.glob('*.parquet'))
+        if surveillance_df is not None and specimens_df is not None:
+            return surveillance_df, specimens_df
         
-        if not raw_files:
-            logger.error("No existing data files found!")
+        if as_of is not None:
+            logger.error(f"No raw snapshot found at or before {as_of}")
             return None, None
         
-        # Get most recent surveillance and specimens files
-        surv_files = [f for f in raw_files if 'surveillance' in f.name]
-        spec_files = [f for f in raw_files if 'specimens' in f.name]
+        # Raw directories written before the snapshot store existed
+        logger.warning("No snapshot manifest found - falling back to newest Parquet files")
+        import pandas as pd
+        
+        surv_files = list(config.RAW_DATA_DIR.glob('surveillance_*.parquet'))
+        spec_files = list(config.RAW_DATA_DIR.glob('specimens_*.parquet'))
         
         if not surv_files or not spec_files:
             logger.error("Missing surveillance or specimens files!")
             return None, None
         
-        # Sort by modification time and get most recent
-        surv_file = sorted(surv_files, key=lambda x: x.stat().st_mtime)[-1]
-        spec_file = sorted(spec_files, key=lambda x: x.stat().st_mtime)[-1]
+        surv_file = max(surv_files, key=lambda x: x.stat().st_mtime)
+        spec_file = max(spec_files, key=lambda x: x.stat().st_mtime)
         
         logger.info(f"Loading surveillance data from: {surv_file}")
         logger.info(f"Loading specimens data from: {spec_file}")
         
-        surveillance_df = pd.read_parquet(surv_file)
-        specimens_df = pd.read_parquet(spec_file)
-        
-        return surveillance_df, specimens_df
+        return pd.read_parquet(surv_file, columns=columns), pd.read_parquet(spec_file, columns=columns)
     
-    def _store_metrics(self, metrics: dict):
-        """Store calculated metrics in database"""
-        year_month = datetime.now().strftime('%Y-%m')
-        
-        # Store summary metrics
-        summary = metrics.get('summary', {})
-        for key, value in summary.items():
-            if isinstance(value, (int, float)):
-                self.db.insert_metric(
-                    year_month=year_month,
-                    metric_name=key,
-                    metric_value=float(value),
-                    category='summary'
-                )
+    def _filter_specimens(self, specimens_df, session_ids):
+        """Keep only SURVEILLANCE specimens that belong to a surveillance session"""
+        logger.info("Applying SURVEILLANCE filter to specimens data")
+        before_count = len(specimens_df)
+        with self.profiler.stage('session_filter', rows_in=before_count) as stage:
+            specimens_df = filter_surveillance_sessions(specimens_df, session_ids=session_ids)
+            stage['rows_out'] = len(specimens_df)
+        after_count = len(specimens_df)
+        logger.info(f"✅ Filtered specimens to SURVEILLANCE sessions:")
+        logger.info(f"   Before: {before_count} specimens")
+        logger.info(f"   After: {after_count} specimens")
+        logger.info(f"   Removed: {before_count - after_count} specimens")
+        return specimens_df
+    
+    def _insert_table(self, table: str, df, insert) -> dict:
+        """Sync a table to a frame by upsert; returns the stage outputs to cache"""
+        counts = insert(df, replace=True)
+        return {'table': table, **counts}
+    
+    def _table_rows(self, table: str) -> int:
+        """Current row count of a database table"""
+        return int(self.db.query(f"SELECT COUNT(*) AS n FROM {table}")['n'].iloc[0])
+    
+    def _calculate_metric_partitions(self, surveillance, specimens) -> dict:
+        """
+        Calculate the metrics of the data months whose stored partition is stale
         
-        # Store temporal metrics with JSON
-        temporal = metrics.get('temporal', {})
-        for key, value in temporal.items():
-            # Convert tuple keys to strings for JSON serialization
-            if isinstance(value, dict):
-                value = {str(k): v for k, v in value.items()}
+        Args:
+            surveillance: Cleaned surveillance stage result
+            specimens: Cleaned specimens stage result
             
-            self.db.insert_metric(
-                year_month=year_month,
-                metric_name=key,
-                metric_value=0,  # placeholder
-                metric_json=json.dumps(value),
-                category='temporal'
-            )
-        
-        # Store intervention metrics
-        interventions = metrics.get('interventions', {})
-        if 'irs_rate_percent' in interventions:
-            self.db.insert_metric(
-                year_month=year_month,
-                metric_name='irs_coverage_rate',
-                metric_value=interventions['irs_rate_percent'],
-                category='interventions'
-            )
-        
-        if 'avg_llin_usage_rate' in interventions:
-            self.db.insert_metric(
-                year_month=year_month,
-                metric_name='llin_usage_rate',
-                metric_value=interventions['avg_llin_usage_rate'],
-                category='interventions'
-            )
-        
-        # Store indoor density
-        indoor_density = metrics.get('indoor_density', {})
-        if 'avg_mosquitoes_per_house' in indoor_density:
-            self.db.insert_metric(
-                year_month=year_month,
-                metric_name='avg_mosquitoes_per_house',
-                metric_value=indoor_density['avg_mosquitoes_per_house'],
-                category='indoor_density'
-            )
+        Returns:
+            code_version, months (None when every partition is rebuilt) and
+            partitions (metric rows and rollup state JSON per month)
+        """
+        version = metrics_code_version()
+        months, rebuild = self.db.get_stale_metric_months(version)
+        if rebuild:
+            logger.info("Recalculating every metric partition")
+            months = None
+        elif not months:
+            logger.info("Metric partitions are up to date")
+            return {'code_version': version, 'months': [], 'partitions': {}}
         
-        if 'avg_anopheles_per_house' in indoor_density:
-            self.db.insert_metric(
-                year_month=year_month,
-                metric_name='avg_anopheles_per_house',
-                metric_value=indoor_density['avg_anopheles_per_house'],
-                category='indoor_density'
-            )
+        partitions = calculate_partitions(surveillance.value, specimens.value, months)
+        logger.info(f"Calculated metrics for {len(partitions)} month(s): {', '.join(partitions)}")
+        return {
+            'code_version': version,
+            'months': months,
+            'partitions': {
+                month: (flatten_metrics(metrics), json.dumps(state))
+                for month, (metrics, state) in partitions.items()
+            },
+        }
+    
+    def _store_metric_partitions(self, result: dict) -> dict:
+        """Store the recalculated partitions; returns the months written and rows"""
+        if result['months'] is not None and not result['months']:
+            return {'months': 0, 'rows': 0}
+        written = self.db.replace_metric_partitions(
+            result['partitions'], result['code_version'], result['months']
+        )
+        logger.info(f"Stored {written} metrics for {len(result['partitions'])} month partition(s)")
+        return {'months': len(result['partitions']), 'rows': written}
+    
+    def _store_metrics(self, metrics: dict, year_month: str = ALL_TIME):
+        """
+        Store every calculated metric in the database in one transaction
         
-        logger.info("Metrics stored in database")
+        Args:
+            metrics: Metric families (calculate_metrics / rollup_metrics output)
+            year_month: Key to store the metrics under (default: the all-time rollup)
+        """
+        written = self.db.insert_metrics(year_month, flatten_metrics(metrics), replace=True)
+        logger.info(f"Stored {written} metrics in database")
     
     def _generate_summary_report(self, metrics: dict):
         """Generate a summary report file"""
@@ -286,6 +584,7 @@ class VectorInsightPipeline:
             f.write(f"LLIN Usage Rate: {interventions.get('avg_llin_usage_rate', 0):.1f}%\n")
             
         logger.info(f"Summary report generated: {report_path}")
+        return report_path
 
 
 def main():
@@ -298,6 +597,43 @@ def main():
         action='store_true',
         help='Skip API extraction and use existing data files'
     )
+    parser.add_argument(
+        '--as-of',
+        metavar='TIMESTAMP',
+        help='With --skip-extraction, load the raw snapshot in effect at TIMESTAMP (e.g. 2025-12-04 or "2025-12-04 18:00")'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Recompute every stage even if its inputs are unchanged since the last run'
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Dump a cProfile file per stage to LOGS_DIR/profile_<run>/ (see the run report)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        metavar='N',
+        help='Post-processing stages to run at once (default: PIPELINE_WORKERS; 1 = sequential)'
+    )
+    parser.add_argument(
+        '--full-refresh',
+        action='store_true',
+        help='Ignore extraction watermarks and re-download all data since EXTRACT_START_DATE'
+    )
+    parser.add_argument(
+        '--backfill',
+        nargs=2,
+        metavar=('START', 'END'),
+        help='Download START..END (YYYY-MM-DD, END exclusive) in parallel date-window shards'
+    )
+    parser.add_argument(
+        '--backfill-window',
+        choices=['week', 'month'],
+        help='Shard size for --backfill (default: BACKFILL_WINDOW)'
+    )
     
     args = parser.parse_args()
     
@@ -308,20 +644,18 @@ def main():
         sys.exit(1)
     
     # Run pipeline
-    pipeline = VectorInsightPipeline()
-    success = pipeline.run(skip_extraction=args.skip_extraction)
+    pipeline = VectorInsightPipeline(profile=args.profile or config.PROFILE_CPROFILE)
+    success = pipeline.run(
+        skip_extraction=args.skip_extraction,
+        full_refresh=args.full_refresh,
+        backfill=tuple(args.backfill) if args.backfill else None,
+        backfill_window=args.backfill_window,
+        as_of=args.as_of,
+        use_cache=not args.no_cache,
+        workers=args.workers
+    )
     
-    # IMPORTANT: Update user tracking BEFORE sys.exit()!
-    if success:
-        logger.info("\n" + "="*80)
-        logger.info("STEP 8: Updating user tracking")
-        logger.info("="*80)
-        try:
-            update_user_logs()
-            logger.info("✓ User tracking updated successfully")
-        except Exception as e:
-            logger.warning(f"⚠ User tracking warning: {e}")
-            logger.warning("Pipeline will continue without user tracking")
+    pipeline.profiler.stop()
     
     # Now exit
     if success:
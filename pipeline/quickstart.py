@@ -75,9 +75,9 @@ def test_pipeline():
     
     try:
         sys.path.append(str(Path.cwd()))
-        import pandas as pd
         from modules.data_processing import process_data
         from modules.database import VectorInsightDB
+        from modules.schema import read_vectorcam_csv
         
         print("Loading sample data...")
         
@@ -90,8 +90,8 @@ def test_pipeline():
             print("   You can run the pipeline when you have data")
             return True
         
-        surv = pd.read_csv(surv_path)
-        spec = pd.read_csv(spec_path)
+        surv = read_vectorcam_csv(surv_path, 'surveillance')
+        spec = read_vectorcam_csv(spec_path, 'specimens')
         
         print(f"✓ Loaded {len(surv)} surveillance records")
         print(f"✓ Loaded {len(spec)} specimen records")
@@ -108,6 +108,7 @@ def test_pipeline():
         print("\nStoring data...")
         db.insert_surveillance_data(clean_surv)
         db.insert_specimens_data(clean_spec)
+        db.refresh_aggregates()
         print(f"✓ Data stored successfully")
         
         print("\n✅ Pipeline test passed!")
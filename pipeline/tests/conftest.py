@@ -0,0 +1,100 @@
+"""
+Shared fixtures: a small cleaned surveillance/specimens data set
+"""
+import math
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from modules.data_processing import DataProcessor
+
+
+def _sessions() -> pd.DataFrame:
+    """Raw surveillance rows: two months, two districts, PSC and HLC sessions"""
+    rows = [
+        # ID, SessionID, date, method, district, IRS, LLINs, people, under LLIN
+        (1, 101, '2025-01-05', 'PSC', 'Kampala', 'Yes', 2, 4, 3),
+        (2, 102, '2025-01-12', 'PSC', 'Kampala', 'No', 1, 5, 2),
+        (3, 103, '2025-01-30', 'PSC', 'Wakiso', 'No', 0, 3, 0),
+        (4, 104, '2025-01-20', 'HLC', 'Wakiso', 'Yes', 3, 6, 6),
+        (5, 105, '2025-02-03', 'PSC', 'Wakiso', 'Yes', 2, 2, 2),
+        (6, 106, '2025-02-14', 'PSC', 'Kampala', 'No', None, 4, 1),
+        (7, 107, '2025-02-21', 'CDC', 'Kampala', None, 1, 3, 1),
+    ]
+    df = pd.DataFrame(rows, columns=[
+        'ID', 'SessionID', 'SessionCollectionDate', 'SessionCollectionMethod', 'SiteDistrict',
+        'WasIrsConducted', 'NumLlinsAvailable', 'NumPeopleSleptInHouse', 'NumPeopleSleptUnderLlin',
+    ])
+    return df.assign(
+        SiteID=20,
+        SessionCollectorName=['Amy', 'Ben', 'Amy', 'Cal', 'Ben', 'Dee', 'Amy'],
+        ProgramCountry='Uganda',
+        LlinType='PermaNet',
+        LlinBrand='Olyset',
+    )
+
+
+def _specimens() -> pd.DataFrame:
+    """
+    Raw specimen rows
+
+    Session 103 (collected 2025-01-30) has specimens imaged in February and
+    one without a capture date, so it spans two months.
+    """
+    rows = [
+        # SpecimenID, ImageID, SessionID, species, sex, abdomen, captured
+        ('S1', 1, 101, 'Anopheles gambiae', 'Female', 'Fully Fed', '2025-01-05'),
+        ('S2', 2, 101, 'Anopheles funestus', 'Female', 'Unfed', '2025-01-05'),
+        ('S3', 3, 101, 'Culex', 'Male', 'Unfed', '2025-01-06'),
+        ('S4', 4, 102, 'Anopheles gambiae', 'Female', 'Gravid', '2025-01-12'),
+        ('S5', 5, 103, 'Anopheles gambiae', 'Female', 'Half Gravid', '2025-01-30'),
+        ('S6', 6, 103, 'Anopheles funestus', 'Female', 'Fully Fed', '2025-02-02'),
+        ('S7', 7, 103, 'Culex', 'Female', 'Unfed', '2025-02-02'),
+        ('S8', 8, 103, 'Aedes', 'Male', 'Unfed', None),
+        ('S9', 9, 104, 'Anopheles gambiae', 'Female', 'Unfed', '2025-01-20'),
+        ('S10', 10, 105, 'Culex', 'Female', 'Fully Fed', '2025-02-03'),
+        ('S11', 11, 105, 'Anopheles gambiae', 'Male', 'Unfed', '2025-02-04'),
+        ('S12', 12, 107, 'Anopheles funestus', 'Female', 'Gravid', '2025-02-21'),
+        ('S1', 13, 101, 'Anopheles gambiae', 'Female', 'Fully Fed', '2025-01-05'),
+    ]
+    df = pd.DataFrame(rows, columns=[
+        'SpecimenID', 'ImageID', 'SessionID', 'Species', 'Sex', 'AbdomenStatus', 'CapturedAt',
+    ])
+    sessions = _sessions().set_index('SessionID')
+    return df.assign(
+        SessionCollectionMethod=df['SessionID'].map(sessions['SessionCollectionMethod']),
+        SiteDistrict=df['SessionID'].map(sessions['SiteDistrict']),
+        SiteID=20,
+        ProgramCountry='Uganda',
+    )
+
+
+@pytest.fixture
+def clean_frames():
+    """(surveillance, specimens) as the pipeline's cleaning stages leave them"""
+    processor = DataProcessor()
+    return processor.clean_surveillance_data(_sessions()), processor.clean_specimens_data(_specimens())
+
+
+def assert_metrics_equal(actual, expected, path='metrics'):
+    """Compare nested metric dictionaries; floats to 1e-9, NaN equal to NaN and None"""
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict), path
+        assert set(map(str, actual)) == set(map(str, expected)), path
+        actual = {str(k): v for k, v in actual.items()}
+        for key, value in expected.items():
+            assert_metrics_equal(actual[str(key)], value, f'{path}.{key}')
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected), path
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            assert_metrics_equal(a, e, f'{path}[{i}]')
+    elif expected is None or (isinstance(expected, float) and math.isnan(expected)):
+        assert actual is None or (isinstance(actual, float) and math.isnan(actual)), path
+    elif isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-12), path
+    else:
+        assert actual == expected, path
@@ -0,0 +1,60 @@
+"""
+Bootstrap intervals: one substream per group
+"""
+import numpy as np
+import pandas as pd
+
+from modules.bootstrap import bootstrap_mean_ci, density_intervals
+
+
+def _houses(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'mosquitoes': rng.poisson(3, n),
+        'anopheles': rng.poisson(1, n),
+        'district': rng.choice(['Kampala', 'Wakiso'], n),
+        'month': rng.choice(['2025-01', '2025-02', None], n),
+    })
+
+
+def _intervals(houses: pd.DataFrame, weights=None) -> dict:
+    return density_intervals(houses['mosquitoes'], houses['anopheles'], houses['district'],
+                             houses['month'], weights=weights)
+
+
+def test_intervals_of_a_group_ignore_other_groups():
+    houses = _houses(200)
+    before = _intervals(houses)
+
+    # A new district and month change the overall intervals only
+    extra = pd.DataFrame({'mosquitoes': [40] * 5, 'anopheles': [9] * 5, 'district': 'Mukono', 'month': '2025-03'})
+    after = _intervals(pd.concat([houses, extra], ignore_index=True))
+
+    assert after['density_by_district_ci']['Kampala'] == before['density_by_district_ci']['Kampala']
+    assert after['density_by_district_ci']['Wakiso'] == before['density_by_district_ci']['Wakiso']
+    assert after['density_by_month_ci']['2025-01'] == before['density_by_month_ci']['2025-01']
+    assert 'Mukono' in after['density_by_district_ci']
+    assert after['avg_mosquitoes_per_house_ci'] != before['avg_mosquitoes_per_house_ci']
+
+
+def test_counted_houses_give_the_same_intervals():
+    houses = _houses(300, seed=1)
+    counted = houses.fillna({'month': '-'}).value_counts().reset_index(name='n')
+    counted['month'] = counted['month'].replace('-', None)
+
+    assert _intervals(counted, weights=counted['n']) == _intervals(houses.sample(frac=1, random_state=2))
+
+
+def test_index_and_multinomial_paths_agree_in_distribution():
+    rng = np.random.default_rng(3)
+    values = rng.normal(10, 2, 400).round(6)
+    distinct, counts = np.unique(values, return_counts=True)
+    # Every value distinct: resampled by index
+    low, high = bootstrap_mean_ci(distinct, counts, 'index', n_resamples=4000)
+    # Few distinct values: multinomial
+    binned, binned_counts = np.unique(values.round(0), return_counts=True)
+    binned_low, binned_high = bootstrap_mean_ci(binned, binned_counts, 'multinomial', n_resamples=4000)
+
+    assert low < values.mean() < high
+    assert abs((high - low) - (binned_high - binned_low)) < 0.1
+    assert np.isnan(bootstrap_mean_ci(np.array([]), np.array([]), 'empty')).all()
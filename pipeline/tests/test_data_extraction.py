@@ -0,0 +1,88 @@
+"""
+Incremental extraction watermarks
+"""
+import io
+
+import pandas as pd
+import pytest
+
+import config
+from modules.data_extraction import DataExtractor, FULL_REFRESH_KEY, concat_batches
+from modules.database import VectorInsightDB
+from modules.schema import apply_schema, csv_dtypes
+
+
+@pytest.fixture
+def extractor(tmp_path):
+    db = VectorInsightDB(tmp_path / 'watermarks.db')
+    yield DataExtractor(api_key='test', db=db)
+    db.close()
+
+
+def _saved(collected, updated) -> pd.DataFrame:
+    return pd.DataFrame({
+        'SessionCollectionDate': pd.to_datetime(collected, utc=True),
+        'SessionUpdatedAt': pd.to_datetime(updated, utc=True),
+        'ImageUpdatedAt': pd.to_datetime(updated, utc=True),
+    })
+
+
+def test_start_date_follows_collection_date_and_upload_lag(extractor, monkeypatch):
+    monkeypatch.setattr(config, 'EXTRACT_START_DATE', '2025-01-01')
+    monkeypatch.setattr(config, 'WATERMARK_OVERLAP_DAYS', 3)
+    monkeypatch.setattr(config, 'UPLOAD_LAG_QUANTILE', 1.0)
+    assert extractor._start_date('surveillance') == '2025-01-01'
+
+    # Newest session collected on 2025-06-30; one was uploaded 20 days after collection
+    df = _saved(['2025-06-01', '2025-06-30'], ['2025-06-21', '2025-07-01'])
+    extractor.update_watermarks(df, df)
+
+    assert extractor._start_date('surveillance') == '2025-06-10'
+    assert extractor._start_date('specimens') == '2025-06-10'
+
+
+def test_full_refresh_is_scheduled(extractor, monkeypatch):
+    monkeypatch.setattr(config, 'FULL_REFRESH_DAYS', 7)
+    assert extractor.full_refresh_due()
+
+    extractor.db.set_watermark(FULL_REFRESH_KEY, (pd.Timestamp.now() - pd.Timedelta(days=2)).isoformat())
+    assert not extractor.full_refresh_due()
+
+    extractor.db.set_watermark(FULL_REFRESH_KEY, (pd.Timestamp.now() - pd.Timedelta(days=8)).isoformat())
+    assert extractor.full_refresh_due()
+
+    monkeypatch.setattr(config, 'FULL_REFRESH_DAYS', 0)
+    assert not extractor.full_refresh_due()
+
+
+def test_full_refresh_is_recorded(extractor):
+    df = _saved(['2025-06-01'], ['2025-06-02'])
+    extractor.update_watermarks(df, df)
+    assert extractor.db.get_watermark(FULL_REFRESH_KEY) is None
+
+    extractor.full_refresh = True
+    extractor.update_watermarks(df, df)
+    assert extractor.db.get_watermark(FULL_REFRESH_KEY) is not None
+
+
+def test_concat_batches_matches_pandas_concat():
+    csv = io.StringIO(
+        "SpecimenID,ImageID,SessionID,Species,CapturedAt,ShouldProcessFurther,Extra\n"
+        "S1,1,101,,2025-01-05T10:00:00Z,true,1\n"
+        "S2,2,101,,2025-01-06T10:00:00Z,,2\n"
+        "S3,3,,Culex,,false,x\n"
+        "S4,4,103,Anopheles gambiae,2025-02-02T08:30:00Z,true,\n"
+    )
+    batches = [
+        apply_schema(batch, 'specimens')
+        for batch in pd.read_csv(csv, chunksize=2, dtype=csv_dtypes('specimens'))
+    ]
+    expected = apply_schema(pd.concat(batches, ignore_index=True), 'specimens')
+    # Arrow gives None rather than NaN for missing strings
+    strings = expected.columns[expected.dtypes == object]
+    expected[strings] = expected[strings].astype(object).where(expected[strings].notna(), None)
+
+    df = concat_batches(iter(batches), 'specimens')
+
+    pd.testing.assert_frame_equal(df, expected)
+    assert concat_batches(iter([]), 'specimens').empty
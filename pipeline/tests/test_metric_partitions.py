@@ -0,0 +1,110 @@
+"""
+The all-time rollup of month partitions against the calculator on all rows
+"""
+import json
+
+import numpy as np
+
+from conftest import assert_metrics_equal
+from modules.database import VectorInsightDB
+from modules.metric_partitions import (
+    calculate_partitions, metrics_code_version, partitions_fingerprint, rollup_metrics, stored_partitions
+)
+from modules.metrics_calculator import MetricsCalculator, flatten_metrics
+
+
+def _stored(metrics: dict) -> dict:
+    """Metric families as stored_partitions() reads them back from monthly_metrics"""
+    families = {}
+    for name, value, metric_json, category in flatten_metrics(metrics):
+        families.setdefault(category, {})[name] = json.loads(metric_json) if metric_json is not None else value
+    return families
+
+
+def _store_partitions(db, surveillance, specimens):
+    """Calculate every month partition and store it, as the pipeline does"""
+    partitions = calculate_partitions(surveillance, specimens)
+    db.replace_metric_partitions(
+        {month: (flatten_metrics(metrics), json.dumps(state)) for month, (metrics, state) in partitions.items()},
+        metrics_code_version()
+    )
+
+
+def _rollup(tmp_path, surveillance, specimens) -> dict:
+    """Partitions stored in a fresh database and rolled up from it"""
+    db = VectorInsightDB(tmp_path / 'metrics.db')
+    db.create_tables()
+    _store_partitions(db, surveillance, specimens)
+    try:
+        return _stored(rollup_metrics(stored_partitions(db)))
+    finally:
+        db.close()
+
+
+def test_fixture_session_spans_two_months(clean_frames):
+    surveillance, specimens = clean_frames
+    session = specimens[specimens['SessionID'] == 103]
+    assert set(surveillance.loc[surveillance['SessionID'] == 103, 'CollectionYearMonth']) == {'2025-01'}
+    assert set(session['CaptureYearMonth'].dropna()) == {'2025-01', '2025-02'}
+    assert session['CaptureYearMonth'].isna().any()
+
+
+def test_rollup_matches_calculator(tmp_path, clean_frames):
+    surveillance, specimens = clean_frames
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = MetricsCalculator(surveillance, specimens).calculate_all_metrics()
+
+    assert_metrics_equal(_rollup(tmp_path, surveillance, specimens), _stored(expected))
+
+
+def test_session_specimens_counted_in_collection_month(clean_frames):
+    surveillance, specimens = clean_frames
+    partitions = calculate_partitions(surveillance, specimens)
+
+    january, _ = partitions['2025-01']
+    # Sessions 101, 102 and 103 hold 4, 1 and 4 specimens (S1 imaged twice)
+    assert january['indoor_density']['total_psc_collections'] == 3
+    assert january['indoor_density']['avg_mosquitoes_per_house'] == 3
+    assert january['indoor_density']['density_by_month'] == {'2025-01': 3}
+    # Species counts stay in the capture month
+    assert january['summary']['total_specimens'] == 7
+
+
+def test_specimen_change_queues_its_session_month(tmp_path, clean_frames):
+    surveillance, specimens = clean_frames
+    db = VectorInsightDB(tmp_path / 'metrics.db')
+    try:
+        db.create_tables()
+        db.insert_surveillance_data(surveillance)
+        db.insert_specimens_data(specimens)
+        _store_partitions(db, surveillance, specimens)
+
+        # S6 belongs to a January session but was imaged in February
+        changed = specimens.assign(Sex=specimens['Sex'].astype(object))
+        changed.loc[changed['SpecimenID'] == 'S6', 'Sex'] = 'Male'
+        db.insert_specimens_data(changed)
+
+        months, rebuild = db.get_stale_metric_months(metrics_code_version())
+        assert months == ['2025-01', '2025-02']
+        assert not rebuild
+    finally:
+        db.close()
+
+
+def test_partitions_fingerprint_follows_stored_partitions(tmp_path, clean_frames):
+    surveillance, specimens = clean_frames
+    db = VectorInsightDB(tmp_path / 'metrics.db')
+    try:
+        db.create_tables()
+        _store_partitions(db, surveillance, specimens)
+        before = partitions_fingerprint(db)
+        assert partitions_fingerprint(db) == before
+
+        # Same frames, but a partition rewritten (e.g. a retried write)
+        metrics, state = calculate_partitions(surveillance, specimens, ['2025-02'])['2025-02']
+        db.replace_metric_partitions(
+            {'2025-02': (flatten_metrics(metrics), json.dumps(state))}, metrics_code_version(), ['2025-02']
+        )
+        assert partitions_fingerprint(db) != before
+    finally:
+        db.close()
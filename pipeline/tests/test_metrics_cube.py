@@ -0,0 +1,82 @@
+"""
+MetricsCube against MetricsCalculator on the same filtered rows
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import assert_metrics_equal
+from modules.database import VectorInsightDB
+from modules.metrics_calculator import MetricsCalculator
+from modules.metrics_cube import MetricsCube
+
+# Filters as the dashboard passes them: (start, end, districts, methods, species)
+FILTERS = [
+    (None, None, None, None, None),
+    ('2025-01-01', '2025-01-31', None, None, None),
+    ('2025-01-06', '2025-02-02', None, None, None),
+    (None, None, ['Wakiso'], None, None),
+    (None, None, None, ['PSC'], ['Anopheles gambiae', 'Culex']),
+    ('2025-01-01', '2025-02-28', ['Kampala'], ['PSC', 'CDC'], None),
+]
+
+
+@pytest.fixture
+def cube(tmp_path, clean_frames):
+    surveillance, specimens = clean_frames
+    db = VectorInsightDB(tmp_path / 'cube.db')
+    db.create_tables()
+    db.insert_surveillance_data(surveillance)
+    db.insert_specimens_data(specimens)
+    db.refresh_aggregates()
+    try:
+        yield MetricsCube.from_database(db)
+    finally:
+        db.close()
+
+
+def _filter(surveillance, specimens, start_date, end_date, districts, methods, species):
+    """Rows kept by the dashboard's filters (dashboard/app.py apply_filters)"""
+    if start_date is not None:
+        start, end = pd.Timestamp(start_date, tz='UTC'), pd.Timestamp(end_date, tz='UTC') + pd.Timedelta(days=1)
+        surveillance = surveillance[surveillance['SessionCollectionDate'].between(start, end, inclusive='left')]
+        specimens = specimens[specimens['CapturedAt'].between(start, end, inclusive='left')]
+    if districts:
+        surveillance = surveillance[surveillance['SiteDistrict'].isin(districts)]
+        specimens = specimens[specimens['SiteDistrict'].isin(districts)]
+    if methods:
+        surveillance = surveillance[surveillance['SessionCollectionMethod'].isin(methods)]
+        specimens = specimens[specimens['SessionCollectionMethod'].isin(methods)]
+    if species:
+        specimens = specimens[specimens['Species'].isin(species)]
+    return surveillance, specimens
+
+
+def _comparable(expected: dict, actual: dict) -> dict:
+    """The calculator's metrics, limited to what the cube answers"""
+    expected = {family: metrics for family, metrics in expected.items() if family in actual}
+    for family, metrics in expected.items():
+        expected[family] = {name: value for name, value in metrics.items() if name in actual[family]}
+    date_range = expected['summary']['date_range']
+    expected['summary']['date_range'] = {
+        end: None if pd.isna(day) else pd.Timestamp(day).strftime('%Y-%m-%d') for end, day in date_range.items()
+    }
+    return expected
+
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_cube_matches_calculator_on_filtered_rows(cube, clean_frames, filters):
+    surveillance, specimens = _filter(*clean_frames, *filters)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = MetricsCalculator(surveillance, specimens).calculate_all_metrics()
+
+    actual = cube.metrics(*filters)
+
+    assert_metrics_equal(actual, _comparable(expected, actual))
+
+
+def test_psc_specimens_counted_in_session_month(cube):
+    density = cube.metrics()['indoor_density']
+    # Session 103 (collected 2025-01-30) holds specimens captured in February
+    assert density['density_by_month']['2025-01'] == 3
+    assert density['density_by_district']['Wakiso'] == 3
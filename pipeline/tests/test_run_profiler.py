@@ -0,0 +1,32 @@
+"""
+Per-stage memory in the run report
+"""
+import json
+import time
+
+import numpy as np
+
+from modules.run_profiler import RunProfiler, current_rss_mb
+
+
+def test_stage_memory_without_tracemalloc(tmp_path):
+    profiler = RunProfiler(run_id='test', output_dir=tmp_path, trace_memory=False, rss_interval=0.01)
+
+    with profiler.stage('allocate'):
+        block = np.ones(64 * 1024 * 1024 // 8)  # 64 MB, touched
+        time.sleep(0.05)  # a few samples while it is held
+        del block
+    with profiler.stage('idle'):
+        pass
+    profiler.write_report()
+    profiler.stop()
+
+    stages = {s['stage']: s for s in json.loads(profiler.report_path.read_text())['stages']}
+    if current_rss_mb() is None:
+        return  # the platform reports no current RSS
+    allocate, idle = stages['allocate'], stages['idle']
+    assert allocate['rss_peak_mb'] - allocate['rss_start_mb'] > 48
+    assert allocate['rss_delta_mb'] == round(allocate['rss_end_mb'] - allocate['rss_start_mb'], 2)
+    assert idle['rss_peak_mb'] - idle['rss_start_mb'] < 16
+    assert idle['lifetime_peak_rss_mb'] >= allocate['rss_peak_mb'] - 1
+    assert 'traced_peak_mb' not in allocate
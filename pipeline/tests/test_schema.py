@@ -0,0 +1,31 @@
+"""
+Parsing VectorCam CSVs into registry dtypes
+"""
+import io
+
+import pandas as pd
+
+from modules.schema import read_vectorcam_csv
+
+SURVEILLANCE_CSV = (
+    "ID,SessionID,SiteID,NumPeopleSleptInHouse,MonthsSinceIrs,SiteIsActive,SessionCollectionDate\n"
+    "1,101,20,4,1.5,true,2025-01-05\n"
+    "2,2.5,N/A,five,abc,yes,2025-01-06\n"
+    "3,103,21,,,FALSE,\n"
+)
+
+
+def test_malformed_cells_become_missing():
+    for engine in ('c', 'pyarrow'):
+        df = read_vectorcam_csv(io.StringIO(SURVEILLANCE_CSV), 'surveillance', engine=engine)
+
+        assert str(df['SessionID'].dtype) == 'Int64'
+        assert df['SessionID'].tolist()[::2] == [101, 103]
+        assert df['SessionID'].isna().tolist() == [False, True, False]
+        assert df['SiteID'].isna().tolist() == [False, True, False]
+        assert df['NumPeopleSleptInHouse'].isna().tolist() == [False, True, True]
+        assert df['MonthsSinceIrs'].isna().tolist() == [False, True, True]
+        assert str(df['SiteIsActive'].dtype) == 'boolean'
+        assert df['SiteIsActive'].tolist()[::2] == [True, False]
+        assert df['SiteIsActive'].isna().tolist() == [False, True, False]
+        assert isinstance(df['SessionCollectionDate'].dtype, pd.DatetimeTZDtype)
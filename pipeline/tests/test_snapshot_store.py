@@ -0,0 +1,38 @@
+"""
+Raw snapshot manifest: as-of lookups and pruning
+"""
+import json
+
+import pandas as pd
+
+from modules.snapshot_store import RawSnapshotStore
+
+
+def _frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({'SessionID': range(n)})
+
+
+def test_unchanged_content_adds_no_entry(tmp_path):
+    store = RawSnapshotStore(tmp_path, history=10)
+    store.put('surveillance', _frame(1), '20250101_000000')
+    store.put('surveillance', _frame(1), '20250102_000000')
+    store.put('surveillance', _frame(2), '20250103_000000')
+
+    manifest = json.loads((tmp_path / 'manifest.json').read_text())
+    assert [e['timestamp'] for e in manifest['snapshots']['surveillance']] == ['20250101_000000', '20250103_000000']
+    assert store.resolve('surveillance', '2025-01-02')['rows'] == 1
+    assert len(store.load('surveillance')) == 2
+
+
+def test_history_is_pruned_with_its_objects(tmp_path):
+    store = RawSnapshotStore(tmp_path, history=2)
+    store.put('specimens', _frame(1), '20250101_000000')
+    for day in range(1, 5):
+        store.put('surveillance', _frame(day), f'202501{day:02d}_000000')
+
+    entries = json.loads((tmp_path / 'manifest.json').read_text())['snapshots']['surveillance']
+    assert [e['rows'] for e in entries] == [3, 4]
+    assert store.resolve('surveillance', '2025-01-02') is None
+    # The 1-row object is still referenced by specimens, the 2-row one is gone
+    objects = {len(pd.read_parquet(path)) for path in (tmp_path / 'objects').glob('*.parquet')}
+    assert objects == {1, 3, 4}